@@ -1,17 +1,48 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, g
+from flask import Flask, Request, render_template, request, jsonify, send_file, g, Response, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
+import queue
+import re
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from mobile_lure_classifier import MobileLureClassifier
+from result_cache import image_digest
 from supabase_client import supabase_service
 from auth import require_auth, require_admin
+import scan_jobs as scan_jobs_module
+from scan_jobs import QueueFullError
+from scan_pipeline import find_stored_image, run_scan, save_results, upload_max_dimension
+from upload_image_cache import FORMATS, UploadImageCache, snap_width
+from vision_resilience import deadline_after
 import config
 import json
 import datetime
+import time
+
+
+class SizeLimitedRequest(Request):
+    """
+    Request bodies are held to MAX_CONTENT_LENGTH (one image), except
+    /api/batch-upload's, which may be BATCH_UPLOAD_MAX_TOTAL_MB. Werkzeug
+    applies the limit while reading the body, so chunked requests without a
+    Content-Length are cut off at it too.
+    """
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'batch_upload':
+            return config.BATCH_UPLOAD_MAX_TOTAL_MB * 1024 * 1024
+        return super().max_content_length
+
 
 app = Flask(__name__)
+app.request_class = SizeLimitedRequest
 app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = config.MAX_IMAGE_SIZE_MB * 1024 * 1024
 
@@ -39,6 +70,7 @@ limiter = Limiter(
     storage_uri='memory://',
 )
 
+
 # ---------------------------------------------------------------------------
 # AI classifier
 # ---------------------------------------------------------------------------
@@ -56,6 +88,17 @@ def load_api_key():
 
 load_api_key()
 
+# ---------------------------------------------------------------------------
+# Background scan jobs (/upload?async=1)
+# ---------------------------------------------------------------------------
+scan_jobs = scan_jobs_module.create_queue()
+
+# Resized renditions of local uploads (/uploads/<filename>?w=&fmt=)
+upload_cache = UploadImageCache.from_config()
+
+# Scans for /api/batch-upload; shared by every batch in the process so concurrent batches can't multiply it
+batch_executor = ThreadPoolExecutor(max_workers=config.BATCH_UPLOAD_CONCURRENCY, thread_name_prefix='batch-scan')
+
 # ---------------------------------------------------------------------------
 # Public endpoints
 # ---------------------------------------------------------------------------
@@ -92,7 +135,21 @@ def keep_alive():
 @limiter.limit('20 per hour')
 @require_auth
 def upload_file():
+    """
+    Classify an uploaded lure photo.
+
+    /upload?async=1 returns 202 with a job id as soon as quota is reserved;
+    the scan then runs on the background job pool (see /api/jobs/<id>).
+    /upload?stream=1 answers with Server-Sent Events as the scan goes (see
+    _stream_scan). Synchronous scans stop retrying the vision API once the
+    request deadline (UPLOAD_DEADLINE_SECONDS, or a shorter X-Request-Timeout)
+    is near.
+    """
+    started = time.monotonic()
     user_id = g.user_id
+    run_async = request.args.get('async') == '1'
+    run_stream = request.args.get('stream') == '1' and not run_async
+    deadline = None if run_async else deadline_after(_request_budget())
 
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
@@ -101,81 +158,474 @@ def upload_file():
     if not file.filename:
         return jsonify({'error': 'No file selected'}), 400
 
+    if run_async:
+        try:
+            scan_jobs.reserve()
+        except QueueFullError:
+            return jsonify({
+                'error': 'queue_full',
+                'message': 'Too many scans in progress. Please try again shortly.',
+            }), 503, {'Retry-After': '5'}
+
+    enqueued = False
     try:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Read the stream once: the classifier and Storage work from these bytes,
+        # the saved copy is only for /uploads and the local JSON record
+        image_bytes = file.read()
+        filepath = _save_upload(image_bytes, filename)
+        received = {'filename': filename, 'bytes': len(image_bytes), 'elapsed_ms': _elapsed_ms(started)}
 
         print(f'[INFO] Upload received for user {user_id}: {filename}')
 
-        if supabase_service.is_enabled():
-            try:
-                quota_check = supabase_service.can_user_scan(user_id)
-                if not quota_check.get('can_scan'):
-                    return jsonify({
-                        'error': 'quota_exceeded',
-                        'message': 'You have used all your free scans this month. Upgrade to PRO for unlimited scans!',
-                        'quota': quota_check,
-                    }), 403
-
-                pending_scan_id = supabase_service.create_pending_scan(user_id, filename)
-                if not pending_scan_id:
-                    print('[WARNING] Failed to create pending scan — using fallback')
-            except Exception as e:
-                print(f'[ERROR] Quota check failed: {e}')
-                return jsonify({
-                    'error': 'quota_check_failed',
-                    'message': 'Unable to verify quota. Please try again later.',
-                }), 503
-        else:
-            return jsonify({
-                'error': 'service_unavailable',
-                'message': 'Quota system temporarily unavailable. Please try again later.',
-            }), 503
+        # Unusable photos are turned away before they cost a quota slot or an API call
+        quality_gate = mobile_classifier.quality_gate if mobile_classifier else None
+        if quality_gate:
+            rejection = quality_gate.check(image_bytes)
+            if rejection:
+                return jsonify(rejection), 422
+
+        pending_scan_id, refusal = _reserve_scan(user_id, filename)
+        if refusal:
+            return refusal
 
-        if not mobile_classifier:
+        # With the Postgres backend the classifier runs in classifier_worker.py, not here
+        remote_workers = run_async and config.SCAN_JOB_BACKEND == 'postgres'
+        if not mobile_classifier and not remote_workers:
             return jsonify({'error': 'Lure classifier not initialised. Check server configuration.'}), 503
 
-        results = mobile_classifier.analyze_lure(filepath)
-        results['image_path'] = filepath
-        results['image_name'] = filename
+        if run_async:
+            job_id = scan_jobs.enqueue(
+                user_id,
+                # quality_checked tells classifier_worker.py the gate already ran here
+                {'image_name': filename, 'pending_scan_id': pending_scan_id, 'quality_checked': bool(quality_gate)},
+                image_bytes,
+                lambda set_stage: _run_scan(user_id, filepath, filename, pending_scan_id, set_stage,
+                                            image_bytes=image_bytes, quality_checked=True),
+            )
+            enqueued = True
+            status_url = f'/api/jobs/{job_id}'
+            print(f'[INFO] Scan job {job_id} queued for user {user_id}')
+            return jsonify({
+                'job_id': job_id,
+                'status': scan_jobs_module.QUEUED,
+                'status_url': status_url,
+                'events_url': f'{status_url}/events',
+            }), 202, {'Location': status_url}
+
+        if run_stream:
+            return _stream_scan(started, received, lambda progress: _run_scan(
+                user_id, filepath, filename, pending_scan_id, deadline=deadline, image_bytes=image_bytes,
+                quality_checked=True, progress=progress))
+
+        results = _run_scan(user_id, filepath, filename, pending_scan_id, deadline=deadline,
+                            image_bytes=image_bytes, quality_checked=True)
+        if results.get('retryable'):
+            # Upstream trouble (circuit open, retries exhausted, deadline hit): tell the client to come back
+            return jsonify(results), 503, {'Retry-After': str(results.get('retry_after', 5))}
+        return jsonify(results)
 
-        if 'error' in results:
-            print(f'[ERROR] Analysis failed: {results["error"]}')
-            results['lure_type'] = 'Analysis Failed'
-            results['confidence'] = 0
-            results['analysis_method'] = 'ChatGPT Vision API (Failed)'
+    except Exception as e:
+        print(f'[ERROR] Upload handler: {e}')
+        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+    finally:
+        if run_async and not enqueued:
+            scan_jobs.release()
+
+
+def _save_upload(image_bytes, filename):
+    """
+    Local copy of an upload, named by its content hash (like its Storage
+    path) so uploads that share a filename can't overwrite each other. A copy
+    already on disk isn't written again; new ones appear atomically.
+    """
+    ext = os.path.splitext(filename)[1].lower() or '.jpg'
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], image_digest(image_bytes) + ext)
+    if not os.path.exists(filepath):
+        partial = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(partial, 'wb') as saved:
+            saved.write(image_bytes)
+        os.replace(partial, filepath)
+    return filepath
+
+
+def _stream_scan(started, received, scan):
+    """
+    Server-Sent Events response for /upload?stream=1. scan(progress) runs on
+    its own thread and every progress event is sent as it happens, stamped
+    with elapsed_ms since the request started:
+      received, compressed, sent (once per attempt), model_streaming,
+      lure_type (the model's answer so far names the type), parsed (the full
+      result, before it is stored), stored
+    and then succeeded or failed with the final result, as /upload returns
+    it. Cache hits skip straight from received to parsed.
+    """
+    events = queue.Queue()
+
+    def progress(event, data=None):
+        events.put((event, dict(data or {}, elapsed_ms=_elapsed_ms(started))))
+
+    def work():
+        try:
+            results = scan(progress)
+        except Exception as e:
+            print(f'[ERROR] Streaming upload: {e}')
+            results = {'error': f'Analysis failed: {str(e)}'}
+        progress(scan_jobs_module.FAILED if 'error' in results else scan_jobs_module.SUCCEEDED, results)
+
+    threading.Thread(target=work, name='upload-stream', daemon=True).start()
+
+    def stream():
+        yield _sse('received', received)
+        while True:
+            try:
+                event, data = events.get(timeout=15)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield _sse(event, data)
+            if event in scan_jobs_module.TERMINAL_STATUSES:
+                return
 
-        json_file = mobile_classifier.save_analysis_to_json(results)
-        results['json_file'] = json_file
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-        if supabase_service.is_enabled():
-            try:
-                if not results.get('lure_type'):
-                    results['lure_type'] = 'Unknown'
 
-                image_url = supabase_service.upload_lure_image(user_id, filepath, filename)
-                if image_url:
-                    results['image_url'] = image_url
+def _sse(event, data):
+    return f'event: {event}\ndata: {app.json.dumps(data)}\n\n'
 
-                if pending_scan_id:
-                    supabase_result = supabase_service.update_scan_with_results(pending_scan_id, results)
-                else:
-                    supabase_result = supabase_service.save_lure_analysis(user_id, results)
 
-                if supabase_result:
-                    results['supabase_id'] = supabase_result.get('id')
+def _elapsed_ms(started):
+    return round((time.monotonic() - started) * 1000)
 
-            except Exception as e:
-                print(f'[WARNING] Supabase save failed: {e}')
-                # Scan already counted via pending record — continue
 
-        print(f'[OK] Analysis complete for user {user_id}')
-        return jsonify(results)
+@app.route('/api/scan-probe', methods=['POST'])
+@limiter.limit('60 per hour')
+@require_auth
+def scan_probe():
+    """
+    Ask whether a photo needs uploading before sending it.
+
+    JSON body: sha256 (hex digest of the bytes the client would upload, so
+    clients that resize should hash afterwards) and, optionally, width,
+    height and filename.
+
+    When the photo is already in this user's Storage and the result cache
+    holds a result for the digest, the scan is recorded (it counts against
+    quota like /upload) and returned as {"status": "hit", "result": ...}.
+    Otherwise the response is an upload ticket, {"status": "upload",
+    "upload": {...}}, which says nothing about the cache: the result cache
+    and near-duplicate index are shared by all users, so answering from
+    them for a photo the caller hasn't stored would reveal other users'
+    scans.
+    """
+    user_id = g.user_id
+    data = request.get_json(silent=True) or {}
+
+    digest = str(data.get('sha256', '')).lower()
+    if not re.fullmatch('[0-9a-f]{64}', digest):
+        return jsonify({'error': 'sha256 must be a hex SHA-256 digest'}), 400
+    try:
+        dimensions = [int(data[side]) for side in ('width', 'height') if data.get(side) is not None]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'width and height must be integers'}), 400
+    if any(side <= 0 for side in dimensions):
+        return jsonify({'error': 'width and height must be positive'}), 400
+
+    if not mobile_classifier:
+        return jsonify({'error': 'Lure classifier not initialised. Check server configuration.'}), 503
+
+    filename = secure_filename(str(data.get('filename') or '')) or f'{digest[:16]}.jpg'
+    # Storage first, so the response time doesn't depend on what others have scanned either
+    image_urls = None
+    if supabase_service.is_enabled():
+        image_urls = find_stored_image(supabase_service, user_id, digest, filename)
+    results = mobile_classifier.probe_cache(digest) if image_urls else None
+
+    if results is not None:
+        pending_scan_id, refusal = _reserve_scan(user_id, filename)
+        if refusal:
+            return refusal
+        results.update(image_path=None, image_name=filename)
+        results = save_results(mobile_classifier, supabase_service, user_id, results, pending_scan_id,
+                               lambda: image_urls)
+        print(f'[INFO] Scan probe hit for user {user_id}: recorded without an upload')
+        return jsonify({'status': 'hit', 'result': results})
+
+    ticket = {'url': '/upload', 'field': 'file'}
+    max_dimension = upload_max_dimension()
+    if max_dimension and dimensions and max(dimensions) > max_dimension:
+        # The server never uses more pixels than this; sending them costs the client airtime
+        ticket['resize_to'] = max_dimension
+    return jsonify({'status': 'upload', 'upload': ticket})
+
+
+def _reserve_scan(user_id, filename):
+    """
+    Check the user's quota and create the pending scan row that counts
+    against it: (pending_scan_id, None), or (None, error response)
+    """
+    quota_check, refusal = _check_quota(user_id)
+    if refusal:
+        return None, refusal
+    try:
+        pending_scan_id = supabase_service.create_pending_scan(user_id, filename)
+    except Exception as e:
+        print(f'[ERROR] Quota check failed: {e}')
+        return None, _quota_check_failed()
+    if not pending_scan_id:
+        print('[WARNING] Failed to create pending scan — using fallback')
+    return pending_scan_id, None
+
 
+def _check_quota(user_id):
+    """(can_user_scan result, None) when the user may scan, or (None, error response)"""
+    if not supabase_service.is_enabled():
+        return None, (jsonify({
+            'error': 'service_unavailable',
+            'message': 'Quota system temporarily unavailable. Please try again later.',
+        }), 503)
+    try:
+        quota_check = supabase_service.can_user_scan(user_id)
     except Exception as e:
-        print(f'[ERROR] Upload handler: {e}')
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+        print(f'[ERROR] Quota check failed: {e}')
+        return None, _quota_check_failed()
+    if not quota_check.get('can_scan'):
+        return None, (jsonify({
+            'error': 'quota_exceeded',
+            'message': 'You have used all your free scans this month. Upgrade to PRO for unlimited scans!',
+            'quota': quota_check,
+        }), 403)
+    return quota_check, None
+
+
+def _quota_check_failed():
+    return jsonify({
+        'error': 'quota_check_failed',
+        'message': 'Unable to verify quota. Please try again later.',
+    }), 503
+
+
+@app.route('/api/batch-upload', methods=['POST'])
+@limiter.limit('10 per hour')
+@require_auth
+def batch_upload():
+    """
+    Classify many lure photos (multipart field "files") in one request.
+
+    Quota is checked once and the whole batch's pending scans are created in
+    one insert; photos past the user's remaining free scans are skipped, and
+    photos the quality gate turns away cost nothing. Each file is spooled to
+    temporary storage (failing if over MAX_IMAGE_SIZE_MB) and read back one
+    at a time, so the batch is never all in memory. Scans run on
+    batch_executor (BATCH_UPLOAD_CONCURRENCY at a time) and the response is
+    NDJSON, one line per file as soon as its scan finishes:
+      {"type": "batch", "files": n, "accepted": k, "quota": {...}}
+      {"type": "file", "index": i, "filename": ..., "status": "ok" | "failed"
+       | "retake_photo" | "quota_exceeded", "result": {...}}
+      {"type": "done", "ok": ..., "failed": ..., ...}
+    """
+    user_id = g.user_id
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > config.BATCH_UPLOAD_MAX_FILES:
+        return jsonify({'error': f'At most {config.BATCH_UPLOAD_MAX_FILES} files per batch'}), 400
+    if not mobile_classifier:
+        return jsonify({'error': 'Lure classifier not initialised. Check server configuration.'}), 503
+
+    quota_check, refusal = _check_quota(user_id)
+    if refusal:
+        return refusal
+
+    print(f'[INFO] Batch upload received for user {user_id}: {len(files)} files')
+    quality_gate = mobile_classifier.quality_gate
+    unlimited = quota_check.get('is_pro') or quota_check.get('unlimited')
+    remaining = len(files) if unlimited else quota_check.get('remaining', 0)
+    lines, accepted, names = [], [], set()
+    for index, file in enumerate(files):
+        filename = secure_filename(file.filename) or 'upload.jpg'
+        if filename in names:
+            stem, ext = os.path.splitext(filename)
+            filename = f'{stem}_{index}{ext}'
+        names.add(filename)
+
+        spool = _spool_upload(file.stream, config.MAX_IMAGE_SIZE_MB * 1024 * 1024)
+        if spool is None:
+            lines.append(_batch_line(index, filename, 'failed', {'error': 'File too large'}))
+            continue
+        rejection = quality_gate.check(spool.read()) if quality_gate else None
+        if rejection:
+            lines.append(_batch_line(index, filename, 'retake_photo', rejection))
+        elif len(accepted) >= remaining:
+            lines.append(_batch_line(index, filename, 'quota_exceeded', {'error': 'quota_exceeded'}))
+        else:
+            spool.seek(0)
+            accepted.append((index, filename, spool))
+            continue
+        spool.close()
+
+    pending_scan_ids = supabase_service.create_pending_scans(user_id, [filename for _, filename, _ in accepted])
+    futures = {}
+    for (index, filename, spool), pending_scan_id in zip(accepted, pending_scan_ids):
+        future = batch_executor.submit(_scan_spooled, user_id, spool, filename, pending_scan_id)
+        futures[future] = (index, filename)
+
+    def stream():
+        counts = Counter(line['status'] for line in lines)
+        yield _ndjson({'type': 'batch', 'files': len(files), 'accepted': len(accepted), 'quota': quota_check})
+        for line in lines:
+            yield _ndjson(line)
+        for future in as_completed(futures):
+            index, filename = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f'[ERROR] Batch scan of {filename}: {e}')
+                results = {'error': f'Analysis failed: {str(e)}'}
+            status = 'failed' if 'error' in results else 'ok'
+            counts[status] += 1
+            yield _ndjson(_batch_line(index, filename, status, results))
+        yield _ndjson(dict(counts, type='done'))
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+
+def _spool_upload(stream, limit):
+    """
+    Copy an uploaded file into temporary storage of our own (in memory only
+    while small), or None when it is over limit bytes. The request's file
+    objects are closed when the view returns, before the batch's scans run.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=512 * 1024)
+    size = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            spool.close()
+            return None
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _scan_spooled(user_id, spool, filename, pending_scan_id):
+    """Batch scan of a spooled upload: its bytes are only read in once the scan starts"""
+    with spool:
+        image_bytes = spool.read()
+    return _run_scan(user_id, _save_upload(image_bytes, filename), filename, pending_scan_id,
+                     image_bytes=image_bytes, quality_checked=True)
+
+
+def _batch_line(index, filename, status, result):
+    return {'type': 'file', 'index': index, 'filename': filename, 'status': status, 'result': result}
+
+
+def _ndjson(line):
+    return app.json.dumps(line) + '\n'
+
+
+def _run_scan(user_id, filepath, filename, pending_scan_id, set_stage=None, deadline=None, image_bytes=None,
+              quality_checked=False, progress=None):
+    """Classify a saved upload and persist the outcome (sync and local async paths)."""
+    return run_scan(mobile_classifier, supabase_service, user_id, filepath, filename, pending_scan_id,
+                    set_stage, deadline, image_bytes, quality_checked, progress)
+
+
+def _request_budget():
+    """Seconds a synchronous scan may take: the server cap or the client's X-Request-Timeout, if shorter"""
+    budget = config.UPLOAD_DEADLINE_SECONDS
+    try:
+        client_timeout = float(request.headers.get('X-Request-Timeout', ''))
+    except ValueError:
+        return budget
+    return min(budget, client_timeout) if client_timeout > 0 else budget
+
+
+def _job_view(job):
+    """Public fields of a scan job (drops owner and internal metadata)."""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+    }
+
+
+def _get_user_job(job_id):
+    job = scan_jobs.store.get(job_id)
+    if not job or job['user_id'] != g.user_id:
+        return None
+    return job
+
+
+@app.route('/api/jobs/<job_id>')
+@limiter.limit('1200 per hour')
+@require_auth
+def get_scan_job(job_id):
+    job = _get_user_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_view(job))
+
+
+@app.route('/api/jobs/<job_id>/events')
+@limiter.limit('100 per hour')
+@require_auth
+def scan_job_events(job_id):
+    """
+    Server-Sent Events stream of a scan job: one event per status/stage
+    change, ending with the succeeded/failed event carrying the result (or
+    "gone" if the job disappears while the stream is open).
+    """
+    if not _get_user_job(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        last_marker = None
+        last_sent = time.time()
+        deadline = time.time() + config.SCAN_JOB_EVENTS_TIMEOUT_SECONDS
+
+        while True:
+            job = scan_jobs.store.get(job_id)
+            if job is None:
+                # Purged (or lost) while the stream was open
+                yield 'event: gone\ndata: {"error": "Job not found"}\n\n'
+                return
+            view = _job_view(job)
+            marker = (view['status'], view['stage'])
+            if marker != last_marker:
+                yield f"event: {view['status']}\ndata: {json.dumps(view)}\n\n"
+                last_marker = marker
+                last_sent = time.time()
+
+            if view['status'] in scan_jobs_module.TERMINAL_STATUSES:
+                return
+            if time.time() > deadline:
+                yield 'event: timeout\ndata: {}\n\n'
+                return
+            if time.time() - last_sent > 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                last_sent = time.time()
+
+            time.sleep(config.SCAN_JOB_POLL_SECONDS)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.route('/estimate-cost', methods=['POST'])
@@ -192,16 +642,15 @@ def estimate_cost():
     if not file.filename:
         return jsonify({'error': 'No file selected'}), 400
 
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    detail = request.args.get('detail')
+    if detail not in (None, 'low', 'high'):
+        return jsonify({'error': 'detail must be "low" or "high"'}), 400
 
-    try:
-        cost_estimate = mobile_classifier.estimate_api_cost(filepath)
-        return jsonify(cost_estimate)
-    finally:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    # Only the image header is needed, so the upload is read straight from the request stream
+    cost_estimate = mobile_classifier.estimate_api_cost(file.stream, detail)
+    if 'error' in cost_estimate:
+        return jsonify(cost_estimate), 400
+    return jsonify(cost_estimate)
 
 
 @app.route('/api/supabase/tackle-box')
@@ -297,6 +746,20 @@ def subscription_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/classifier-stats')
+@require_admin
+def classifier_stats():
+    """Admin-only endpoint — cache and upstream counters for this worker."""
+    if not mobile_classifier:
+        return jsonify({'error': 'Lure classifier not initialised.'}), 503
+
+    stats = mobile_classifier.get_stats()
+    stats['scan_jobs'] = scan_jobs.stats()
+    stats['upload_cache'] = upload_cache.stats()
+    stats['storage'] = supabase_service.storage_stats()
+    return jsonify(stats)
+
+
 # ---------------------------------------------------------------------------
 # Static / legacy endpoints
 # ---------------------------------------------------------------------------
@@ -451,11 +914,38 @@ def bulk_delete_lures():
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    try:
-        return send_from_directory(config.UPLOAD_FOLDER, filename)
-    except Exception:
+    """
+    A local upload, as stored or, with ?w=<width> and/or ?fmt=jpeg|webp|png,
+    resized and re-encoded through upload_cache (the width snaps up to one of
+    upload_image_cache.WIDTHS). Responses carry ETag and Last-Modified,
+    answer conditional requests with 304 and honour Range.
+    """
+    source = safe_join(config.UPLOAD_FOLDER, filename)
+    if source is None or not os.path.isfile(source):
         return jsonify({'error': 'Image not found'}), 404
 
+    width, fmt = request.args.get('w'), request.args.get('fmt')
+    if width is None and fmt is None:
+        return send_file(source, conditional=True, max_age=config.UPLOAD_CACHE_MAX_AGE_SECONDS)
+
+    try:
+        width = int(width) if width is not None else None
+    except ValueError:
+        width = 0
+    if width is not None and width <= 0:
+        return jsonify({'error': 'w must be a positive integer'}), 400
+    fmt = (fmt or 'jpeg').lower()
+    if fmt not in FORMATS:
+        return jsonify({'error': f'fmt must be one of: {", ".join(FORMATS)}'}), 400
+
+    try:
+        path, mimetype, etag = upload_cache.get(source, snap_width(width) if width else None, fmt)
+        return send_file(path, mimetype=mimetype, conditional=True, etag=etag,
+                         last_modified=os.path.getmtime(source), max_age=config.UPLOAD_CACHE_MAX_AGE_SECONDS)
+    except OSError as e:
+        print(f'[ERROR] Could not serve resized upload {filename}: {e}')
+        return jsonify({'error': 'Image could not be resized'}), 422
+
 
 if __name__ == '__main__':
     app.run(debug=config.FLASK_DEBUG, host=config.FLASK_HOST, port=config.FLASK_PORT)
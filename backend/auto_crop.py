@@ -0,0 +1,163 @@
+"""
+Saliency-based auto-crop for lure photos.
+
+Most lure photos show a small lure on a large table, carpet or hand, so
+most of the 512 px tiles we pay for are background. Before compression,
+find_crop_box looks for the lure on a small draft-decoded copy:
+
+  - The image is split into blocks; each block gets an edge density (mean
+    gradient magnitude) and a colour distance from the background colour.
+  - The background is modelled from the blocks along the image border (a
+    lure rarely touches all four edges): each feature becomes a robust
+    z-score against the border blocks' median and spread.
+  - Blocks standing well out in colour, or in edges with some colour
+    difference too, are the lure; the box is the range holding all but a
+    sliver of them, plus a margin. Lines of salient blocks running from
+    edge to edge are background structure and are dropped first.
+
+No box is returned when the salient area is too small to trust or too large
+to save anything.
+"""
+
+import io
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import config
+from token_cost import high_detail_size, image_tokens, optimal_dimensions, tile_count
+
+ANALYSIS_SIZE = 256
+BLOCK = 4
+# Robust z-score a block needs on either feature to count as lure
+SALIENCY_Z = 4.0
+# Fraction of salient blocks allowed outside the box on each side (stray specks, glare)
+TRIM = 0.02
+
+Box = Tuple[int, int, int, int]
+
+
+def find_crop_box(image_bytes: bytes, margin: float = None, min_area: float = None,
+                  max_area: float = None) -> Optional[Box]:
+    """
+    (left, top, right, bottom) of the lure in original-image pixels, margin
+    included, or None when the photo shouldn't be cropped
+    """
+    margin = config.AUTO_CROP_MARGIN if margin is None else margin
+    min_area = config.AUTO_CROP_MIN_AREA if min_area is None else min_area
+    max_area = config.AUTO_CROP_MAX_AREA if max_area is None else max_area
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        width, height = img.size
+        if img.format == 'JPEG':
+            img.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        small = img.convert('RGB')
+        small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+
+    mask = salient_blocks(pixels)
+    if mask is None or not mask.any():
+        return None
+    rows, cols = _trimmed_range(mask.sum(axis=1)), _trimmed_range(mask.sum(axis=0))
+
+    # Block grid -> original pixels
+    scale_x, scale_y = width / pixels.shape[1], height / pixels.shape[0]
+    left, right = cols[0] * BLOCK * scale_x, (cols[1] + 1) * BLOCK * scale_x
+    top, bottom = rows[0] * BLOCK * scale_y, (rows[1] + 1) * BLOCK * scale_y
+
+    area = (right - left) * (bottom - top) / (width * height)
+    if area < min_area:
+        return None
+
+    pad_x, pad_y = (right - left) * margin, (bottom - top) * margin
+    box = (
+        max(0, int(left - pad_x)), max(0, int(top - pad_y)),
+        min(width, int(np.ceil(right + pad_x))), min(height, int(np.ceil(bottom + pad_y))),
+    )
+    if (box[2] - box[0]) * (box[3] - box[1]) > max_area * width * height:
+        return None
+    return box
+
+
+def salient_blocks(pixels: np.ndarray, block: int = BLOCK) -> Optional[np.ndarray]:
+    """
+    Boolean grid of lure-like block x block blocks in an RGB float array, or
+    None for images too small to judge
+    """
+    rows, cols = pixels.shape[0] // block, pixels.shape[1] // block
+    if rows < 4 or cols < 4:
+        return None
+    pixels = pixels[:rows * block, :cols * block]
+
+    gray = pixels.mean(axis=2)
+    gradient = np.zeros_like(gray)
+    gradient[:, 1:] += np.abs(np.diff(gray, axis=1))
+    gradient[1:, :] += np.abs(np.diff(gray, axis=0))
+    edges = _block_mean(gradient, rows, cols, block)
+    colours = _block_mean(pixels, rows, cols, block)
+
+    border = np.zeros((rows, cols), dtype=bool)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    background = np.median(colours[border], axis=0)
+    distance = np.linalg.norm(colours - background, axis=-1)
+
+    # Edges alone also fire on wood grain and carpet: they only count where the colour differs too
+    colour_z = _robust_z(distance, border)
+    mask = (colour_z > SALIENCY_Z) | ((_robust_z(edges, border) > SALIENCY_Z) & (colour_z > SALIENCY_Z / 2))
+    # Anything running from one edge to the opposite one (floorboards, table edges, grain) is background
+    mask[:, mask[0] & mask[-1]] = False
+    mask[mask[:, 0] & mask[:, -1], :] = False
+    return mask
+
+
+def _block_mean(values: np.ndarray, rows: int, cols: int, block: int) -> np.ndarray:
+    shape = (rows, block, cols, block) + values.shape[2:]
+    return values.reshape(shape).mean(axis=(1, 3))
+
+
+def _robust_z(values: np.ndarray, border: np.ndarray) -> np.ndarray:
+    reference = values[border]
+    median = np.median(reference)
+    spread = 1.4826 * np.median(np.abs(reference - median))
+    # Floor the spread so a perfectly flat background doesn't turn sensor noise into lure
+    return (values - median) / max(spread, 2.0)
+
+
+def _trimmed_range(counts: np.ndarray) -> Tuple[int, int]:
+    """First and last index holding all but TRIM of the mass at each end"""
+    cumulative = np.cumsum(counts) / counts.sum()
+    return int(np.searchsorted(cumulative, TRIM, side='right')), int(np.searchsorted(cumulative, 1 - TRIM))
+
+
+def crop_dimensions(size: Tuple[int, int], box: Box, max_dimension: int, detail: Optional[str]) -> Tuple[int, int]:
+    """
+    Dimensions to send the crop at. For high detail that is the scale the
+    whole image would have been sent at, so the lure keeps its resolution
+    while the crop can only cover fewer tiles; enlarging it to
+    max_dimension instead could cover more tiles than the whole photo.
+    A low-detail image costs the same at any size, so the crop fills it.
+    """
+    crop = (box[2] - box[0], box[3] - box[1])
+    if detail == 'low':
+        return optimal_dimensions(*crop, max_dimension, detail)
+    scale = optimal_dimensions(*size, max_dimension, detail)[0] / size[0]
+    scaled = (max(1, math.ceil(crop[0] * scale)), max(1, math.ceil(crop[1] * scale)))
+    return optimal_dimensions(*scaled, max_dimension, detail)
+
+
+def crop_savings(size: Tuple[int, int], box: Box, max_dimension: int, detail: Optional[str],
+                 pricing: Dict) -> Dict:
+    """What cropping to box changes for one request: tiles and image tokens before and after"""
+    before = optimal_dimensions(*size, max_dimension, detail)
+    after = crop_dimensions(size, box, max_dimension, detail)
+    tiles = [0 if detail == 'low' else tile_count(*high_detail_size(*s)) for s in (before, after)]
+    tokens = [image_tokens(*s, detail, pricing) for s in (before, after)]
+    return {
+        "box": list(box),
+        "original_dimensions": list(size),
+        "tiles_before": tiles[0],
+        "tiles_after": tiles[1],
+        "image_tokens_saved": tokens[0] - tokens[1],
+    }
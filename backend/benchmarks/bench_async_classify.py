@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Sync analyze_lure vs analyze_lure_async against a local fake OpenAI endpoint.
+
+The fake endpoint sleeps --latency seconds per request to stand in for the
+vision API round trip. The sync path is measured the way gunicorn runs it
+(one request per worker; --workers threads stand in for workers); the async
+path runs every scan concurrently on one event loop in one process.
+
+Usage:
+    cd backend
+    python benchmarks/bench_async_classify.py [--scans 40] [--latency 1.0] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from PIL import Image
+
+import config
+from fake_openai import FakeOpenAIServer
+
+
+def make_images(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'lure_{i}.jpg')
+        Image.new('RGB', (1600, 1200), (i % 255, 90, 170)).save(path, 'JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+
+def report(label, scans, elapsed):
+    print(f"  {label:<28} {elapsed:6.2f} s   {scans / elapsed:6.2f} scans/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, FakeOpenAIServer(latency=args.latency) as server:
+        config.OPENAI_API_BASE = server.base_url
+        config.UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+
+        from mobile_lure_classifier import MobileLureClassifier
+        classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+        paths = make_images(directory, args.scans)
+
+        print(f"\n{args.scans} scans, {args.latency:.1f} s injected upstream latency")
+
+        started = time.perf_counter()
+        for path in paths:
+            classifier.analyze_lure(path)
+        report("sync, 1 worker", args.scans, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(classifier.analyze_lure, paths))
+        report(f"sync, {args.workers} workers", args.scans, time.perf_counter() - started)
+
+        async def run_async():
+            try:
+                return await asyncio.gather(*(classifier.analyze_lure_async(p) for p in paths))
+            finally:
+                await classifier.async_http.aclose()
+
+        started = time.perf_counter()
+        results = asyncio.run(run_async())
+        report("async, 1 process", args.scans, time.perf_counter() - started)
+
+        failures = [r for r in results if 'error' in r]
+        if failures:
+            print(f"  ({len(failures)} async scans failed: {failures[0]['error']})")
+
+
+if __name__ == "__main__":
+    main()
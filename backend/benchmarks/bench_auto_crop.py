@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Vision tokens saved by auto-crop, and what finding the crop costs.
+
+Renders 12 MP table-top scenes with a lure covering a range of fractions of
+the frame, then reports for each: the crop box, the tiles and image tokens
+the high-detail request is billed before and after cropping, and the time
+find_crop_box takes (a draft decode plus block statistics).
+
+Usage:
+    cd backend
+    python benchmarks/bench_auto_crop.py [--model gpt-4o] [--max-dimension 1200]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import config
+from auto_crop import crop_savings, find_crop_box
+
+SIZE = (4032, 3024)
+LURE_FRACTIONS = (0.02, 0.05, 0.1, 0.2, 0.35, 0.6)
+
+
+def scene(fraction, seed=0):
+    """A lure covering about `fraction` of a noisy wooden-table photo"""
+    rng = np.random.default_rng(seed)
+    width, height = SIZE
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    grain = 6 * np.sin(x * 40 + rng.normal(0, 0.3)) + 3 * np.sin(x * 170)
+    base = np.stack([150 + grain, 110 + grain * 0.8, 70 + grain * 0.5], axis=-1)[None, :, :]
+    pixels = np.clip(base + rng.normal(0, 5, (height, width, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+
+    lure_w, lure_h = int(width * np.sqrt(fraction * 4 / 3)), int(height * np.sqrt(fraction * 3 / 4))
+    left, top = (width - lure_w) // 2 + 300, (height - lure_h) // 2 - 200
+    left, top = max(0, min(left, width - lure_w)), max(0, min(top, height - lure_h))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((left, top, left + lure_w, top + lure_h), fill=(220, 60, 30))
+    for stripe in range(left + 30, left + lure_w - 30, 45):
+        draw.line((stripe, top + lure_h // 4, stripe, top + 3 * lure_h // 4), fill=(250, 240, 230), width=10)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--max-dimension", type=int, default=config.MAX_IMAGE_DIMENSION)
+    args = parser.parse_args()
+    pricing = config.MODEL_PRICING[args.model]
+
+    print(f"\n{SIZE[0]}x{SIZE[1]} scenes, {args.model}, high detail, max dimension {args.max_dimension}")
+    print(f"  {'lure area':>9}  {'crop box':<26} {'tiles':>7}  {'tokens saved':>12}  {'find time':>9}")
+    for fraction in LURE_FRACTIONS:
+        image = scene(fraction)
+        find_crop_box(image)  # warm up
+        started = time.perf_counter()
+        box = find_crop_box(image)
+        elapsed = time.perf_counter() - started
+        if box is None:
+            print(f"  {fraction:>9.0%}  {'(not cropped)':<26} {'':>7}  {0:>12}  {elapsed * 1000:7.1f}ms")
+            continue
+        savings = crop_savings(SIZE, box, args.max_dimension, None, pricing)
+        tiles = f"{savings['tiles_before']}->{savings['tiles_after']}"
+        print(f"  {fraction:>9.0%}  {str(box):<26} {tiles:>7}  {savings['image_tokens_saved']:>12}  "
+              f"{elapsed * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
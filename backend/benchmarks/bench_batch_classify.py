@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Per-lure latency and prompt tokens of analyze_lure_batch vs one analyze_lure
+call per lure, against a local fake OpenAI endpoint.
+
+The fake endpoint answers after --base-ms plus --ms-per-token for every
+output token (--answer-tokens per lure), so a batch answer takes longer than
+a single one, as generation time does upstream. Prompt tokens are counted
+from the request bodies actually sent: text at ~4 characters per token plus
+each image's billed tokens (token_cost.image_tokens). Only the text prompt
+is shared, so the token saving depends on how --model bills images.
+
+Usage:
+    cd backend
+    python benchmarks/bench_batch_classify.py [--lures 6] [--batch 6] [--base-ms 600] [--model gpt-4o]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from PIL import Image
+
+import config
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+from token_cost import MESSAGE_OVERHEAD_TOKENS, TokenCostModel, image_tokens
+
+
+def photo(seed):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (seed * 37 % 255, 90, 170)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def prompt_tokens(request, pricing):
+    """Estimated input tokens of a captured request body"""
+    body = json.loads(request['body'])
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    parts = [part for message in body['messages']
+             for part in ([{'type': 'text', 'text': message['content']}] if isinstance(message['content'], str)
+                          else message['content'])]
+    for part in parts:
+        if part['type'] == 'text':
+            tokens += math.ceil(len(part['text']) / 4)
+        else:
+            data = base64.b64decode(part['image_url']['url'].split(',', 1)[1])
+            size = Image.open(io.BytesIO(data)).size
+            tokens += image_tokens(*size, part['image_url'].get('detail') or 'high', pricing)
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lures", type=int, default=6)
+    parser.add_argument("--batch", type=int, default=6)
+    parser.add_argument("--base-ms", type=float, default=600)
+    parser.add_argument("--ms-per-token", type=float, default=4)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--model", default=config.CHATGPT_MODEL)
+    args = parser.parse_args()
+
+    config.BATCH_MAX_IMAGES = args.batch
+    config.CHATGPT_MODEL = args.model
+    images = [photo(seed) for seed in range(args.lures)]
+    groups = [min(args.batch, args.lures - start) for start in range(0, args.lures, args.batch)]
+
+    def delay(lures):
+        return (args.base_ms + args.ms_per_token * args.answer_tokens * lures) / 1000
+
+    single_script = [(200, completion(DEFAULT_ANALYSIS), {}, delay(1)) for _ in images]
+    batch_script = [
+        (200, completion([dict(DEFAULT_ANALYSIS, image=number) for number in range(1, size + 1)]), {}, delay(size))
+        for size in groups
+    ]
+
+    timings, tokens = {}, {}
+    with tempfile.TemporaryDirectory() as directory:
+        config.UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+        from mobile_lure_classifier import MobileLureClassifier
+        pricing = TokenCostModel.from_config('').pricing_for()
+
+        for label, script in (("single", single_script), ("batch", batch_script)):
+            with FakeOpenAIServer(script=script) as server:
+                config.OPENAI_API_BASE = server.base_url
+                classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+                paths = [f'lure_{i}.jpg' for i in range(args.lures)]
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    started = time.perf_counter()
+                    if label == "single":
+                        results = [classifier.analyze_lure(path, image_bytes=image) for path, image in zip(paths, images)]
+                    else:
+                        results = classifier.analyze_lure_batch(paths, images=images)
+                    timings[label] = time.perf_counter() - started
+                assert all('error' not in result for result in results), results
+                tokens[label] = (len(server.requests), sum(prompt_tokens(r, pricing) for r in server.requests))
+
+    print(f"\n{args.lures} lures, batches of {args.batch}, {args.model}; upstream {args.base_ms:.0f} ms + "
+          f"{args.ms_per_token:g} ms/token x {args.answer_tokens} tokens per lure")
+    for label in ("single", "batch"):
+        requests_sent, prompt = tokens[label]
+        print(f"  {label:<7} {requests_sent:3d} requests   {timings[label] / args.lures * 1000:7.1f} ms/lure   "
+              f"{prompt / args.lures:7.0f} prompt tokens/lure")
+    print(f"  batch saves {1 - timings['batch'] / timings['single']:.0%} of per-lure latency and "
+          f"{1 - tokens['batch'][1] / tokens['single'][1]:.0%} of prompt tokens")
+
+
+if __name__ == "__main__":
+    main()
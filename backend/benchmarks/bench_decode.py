@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Decode cost of image compression on 12 MP phone photos.
+
+Runs the compressor over the same JPEGs with full-resolution decoding (the
+previous behaviour), with JPEG draft decoding, and with draft decoding under
+a tight decode memory budget, each at --threads concurrent scans. Every
+configuration runs in a fresh interpreter so its peak RSS (VmHWM, above the
+interpreter's baseline after loading the inputs) is its own.
+
+Usage:
+    cd backend
+    python benchmarks/bench_decode.py [--images 12] [--threads 4] [--budget-mb 48]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image
+
+
+def photo_bytes(seed, size=(4032, 3024)):
+    """A phone-like JPEG: smooth gradients plus sensor noise"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x * 200 + y * 30, y * 180 + 40 * np.sin(x * 9), (1 - x) * 150 + y * 60], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def high_water_kib():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run(paths, threads, draft, budget_mb, results):
+    import contextlib
+    import image_offload
+    import mobile_lure_classifier
+    from decode_budget import DecodeBudget
+
+    if not draft:
+        image_offload.draft = lambda img, target: None
+    classifier = mobile_lure_classifier.MobileLureClassifier(
+        openai_api_key='bench-key', result_cache=False, image_offload=None,
+        decode_budget=DecodeBudget((budget_mb or 1 << 20) * 1024 * 1024),
+    )
+    images = []
+    for path in paths:
+        with open(path, 'rb') as image_file:
+            images.append(image_file.read())
+    baseline = high_water_kib()
+
+    def compress(image):
+        started = time.perf_counter()
+        classifier._compress_image_for_api(image)
+        return time.perf_counter() - started
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            latencies = list(pool.map(compress, images))
+        elapsed = time.perf_counter() - started
+
+    results.put({
+        'latency': float(np.median(latencies)),
+        'throughput': len(images) / elapsed,
+        'peak_mib': (high_water_kib() - baseline) / 1024,
+        'waits': classifier.get_stats()['decode_budget']['waits'],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--budget-mb", type=int, default=48)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for seed in range(args.images):
+            paths.append(os.path.join(directory, f'photo_{seed}.jpg'))
+            with open(paths[-1], 'wb') as image_file:
+                image_file.write(photo_bytes(seed))
+
+        print(f"\n{args.images} images, 4032x3024, {args.threads} concurrent scans")
+        for label, draft, budget_mb in (('full decode', False, None),
+                                        ('draft', True, None),
+                                        (f'draft, {args.budget_mb} MB budget', True, args.budget_mb)):
+            results = ctx.Queue()
+            process = ctx.Process(target=run, args=(paths, args.threads, draft, budget_mb, results))
+            process.start()
+            result = results.get()
+            process.join()
+            print(f"  {label:<24} {result['latency'] * 1000:7.1f} ms/image median   "
+                  f"{result['throughput']:5.2f} images/s   peak RSS +{result['peak_mib']:6.1f} MiB   "
+                  f"budget waits {result['waits']}")
+
+
+if __name__ == "__main__":
+    main()
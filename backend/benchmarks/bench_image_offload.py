@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Scan image-work throughput with and without the image offload pool.
+
+Runs a batch of 12 MP photos through the CPU-bound part of a scan
+(perceptual hash + compression for the API) from --threads request threads,
+first on the request threads themselves, then through ImageOffload pools of
+each --workers size. Without the pool, the threads share one GIL; with it,
+throughput should scale with the cores available (this host: reported below).
+
+Usage:
+    cd backend
+    python benchmarks/bench_image_offload.py [--images 24] [--threads 8] [--workers 1 2 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image
+
+from image_offload import ImageOffload
+from mobile_lure_classifier import MobileLureClassifier
+from near_duplicate import NearDuplicateIndex
+
+
+def photo_bytes(seed, size=(4032, 3024)):
+    """A phone-like JPEG: smooth gradients plus sensor noise"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x * 200 + y * 30, y * 180 + 40 * np.sin(x * 9), (1 - x) * 150 + y * 60], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+@contextlib.contextmanager
+def silenced():
+    """Send stdout to /dev/null at the fd level, so pool processes' progress prints go too"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def throughput(classifier, images, threads):
+    def scan(image):
+        classifier._perceptual_hash(image)
+        classifier._compress_image_for_api(image)
+
+    with silenced():
+        scan(images[0])  # start the pool processes outside the timing
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(scan, images))
+    return len(images) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    images = [photo_bytes(seed) for seed in range(args.images)]
+    print(f"\n{args.images} images, 4032x3024, {args.threads} request threads, {cores} core(s) available")
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, 'near_duplicates.sqlite3'), 4)
+        configurations = [('inline', None)] + [(f'{n} worker(s)', ImageOffload(n, 0)) for n in args.workers]
+        baseline = None
+        for label, offload in configurations:
+            classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False, image_offload=offload)
+            classifier.near_duplicate_index = index
+            rate = throughput(classifier, images, args.threads)
+            baseline = baseline or rate
+            print(f"  {label:<14} {rate:6.2f} scans/s   x{rate / baseline:4.2f}")
+            if offload:
+                offload.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Upload-to-request-body cost of the image pipeline on 12 MP phone photos.
+
+Compares the previous disk-based path (save the upload, reopen it to hash
+and compress, write the compressed JPEG up to three times, read it back,
+base64 into a str and let requests serialize the payload dict) with the
+in-memory path MobileLureClassifier uses now (bytes from the upload stream,
+JPEG into BytesIO, base64 from a memoryview, pre-serialized body).
+
+Reports wall time per image, the tracemalloc peak (Python-heap buffers:
+file contents, JPEG, base64 and body copies; Pillow's decoded raster is
+allocated in C and is the same for both) and bytes written to disk. Both
+paths still save the original once, for /uploads.
+
+Usage:
+    cd backend
+    python benchmarks/bench_image_pipeline.py [--images 8] [--size 4032 3024]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image
+
+import config
+from mobile_lure_classifier import MobileLureClassifier
+from near_duplicate import perceptual_hash
+from result_cache import image_digest
+from token_cost import optimal_dimensions
+
+
+def photo_bytes(seed, size):
+    """A phone-like JPEG: smooth gradients plus sensor noise, so it compresses like a real photo"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x * 200 + y * 30, y * 180 + 40 * np.sin(x * 9), (1 - x) * 150 + y * 60], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def legacy_body(classifier, upload, directory, written):
+    """The pre-change path, step for step"""
+    path = os.path.join(directory, 'upload.jpg')
+    with open(path, 'wb') as saved:  # file.save()
+        written[0] += saved.write(upload.read())
+
+    with open(path, 'rb') as image_file:  # result cache key
+        image_digest(image_file.read())
+    perceptual_hash(path)
+
+    compressed_path = os.path.join(directory, 'compressed_upload.jpg')
+    with Image.open(path) as img:
+        img = img.convert('RGB') if img.mode != 'RGB' else img
+        size = optimal_dimensions(*img.size, config.MAX_IMAGE_DIMENSION)
+        if size != img.size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        for quality in (95, 85):
+            img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
+            written[0] += os.path.getsize(compressed_path)
+            if os.path.getsize(compressed_path) / 1024 <= config.TARGET_COMPRESSION_KB:
+                break
+
+    with open(compressed_path, 'rb') as image_file:
+        encoded = base64.b64encode(image_file.read()).decode('utf-8')
+    # requests' json= does json.dumps(payload).encode()
+    return json.dumps(classifier._build_payload(encoded)).encode()
+
+
+def in_memory_body(classifier, upload, directory, written):
+    """What /upload and analyze_lure do now"""
+    image_bytes = upload.read()
+    with open(os.path.join(directory, 'upload.jpg'), 'wb') as saved:  # the copy /uploads serves
+        written[0] += saved.write(image_bytes)
+    image_digest(image_bytes)
+    perceptual_hash(io.BytesIO(image_bytes))
+    jpeg = classifier._compress_image_for_api(image_bytes)
+    return classifier._build_body(classifier._encode_image(jpeg))
+
+
+def measure(images, run):
+    """(median seconds per image, largest traced allocation peak in bytes)"""
+    times, peaks = [], []
+    for image in images:
+        upload = io.BytesIO(image)  # stands in for the werkzeug upload stream
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            tracemalloc.start()
+            started = time.perf_counter()
+            run(upload)
+            times.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return float(np.median(times)), max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--size", type=int, nargs=2, default=[4032, 3024])
+    args = parser.parse_args()
+
+    images = [photo_bytes(seed, tuple(args.size)) for seed in range(args.images)]
+    print(f"\n{args.images} images, {args.size[0]}x{args.size[1]}, "
+          f"{np.mean([len(image) for image in images]) / 2**20:.1f} MiB average upload")
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.UPLOAD_FOLDER = directory
+        classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+        written = [0]
+        for label, run in (('disk', lambda upload: legacy_body(classifier, upload, directory, written)),
+                           ('in-memory', lambda upload: in_memory_body(classifier, upload, directory, written))):
+            written[0] = 0
+            seconds, peak = measure(images, run)
+            print(f"  {label:<10} {seconds * 1000:8.1f} ms/image   peak {peak / 2**20:6.1f} MiB traced"
+                  f"   disk writes {written[0] / len(images) / 2**10:7.0f} KiB/image")
+
+
+if __name__ == "__main__":
+    main()
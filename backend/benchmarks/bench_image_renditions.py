@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Storage size, egress and upload time of display renditions vs originals.
+
+Renders 12 MP phone-like photos, then reports what a stored scan weighs as
+the original and as the thumb/medium renditions, what a tackle-box list of
+--list lures downloads either way, the time to make the renditions, and the
+time to store a scan against a Storage bucket with --latency-ms per request
+(existence checks and uploads run in parallel), and the time to store the
+same photo again (content-addressed paths: nothing is rendered or uploaded).
+
+Usage:
+    cd backend
+    python benchmarks/bench_image_renditions.py [--images 6] [--list 50] [--latency-ms 120]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+import config
+from bench_image_offload import photo_bytes
+from image_renditions import make_renditions
+from scan_pipeline import store_image
+from supabase_client import SupabaseService
+
+
+class SlowBucket:
+    """A Storage bucket where every request takes latency seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def upload(self, path, data, file_options=None):
+        time.sleep(self.latency)
+
+    def exists(self, path):
+        time.sleep(self.latency)
+        return False
+
+    def get_public_url(self, path):
+        return f'https://storage.test/{path}'
+
+
+def slow_service(latency):
+    bucket = SlowBucket(latency)
+
+    class Storage:
+        def from_(self, name):
+            return bucket
+
+    class Client:
+        storage = Storage()
+
+    service = SupabaseService.__new__(SupabaseService)
+    service.client, service.enabled = Client(), True
+    service._init_storage_index()
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=6)
+    parser.add_argument("--list", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=120)
+    args = parser.parse_args()
+
+    images = [photo_bytes(seed) for seed in range(args.images)]
+    sizes, render_times, store_times, repeat_times = [], [], [], []
+    service = slow_service(args.latency_ms / 1000)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for image in images:
+            started = time.perf_counter()
+            renditions = make_renditions(image)
+            render_times.append(time.perf_counter() - started)
+            sizes.append((len(image), len(renditions['thumb']), len(renditions['medium'])))
+
+            started = time.perf_counter()
+            store_image(service, 'user', 'unused.jpg', 'lure.jpg', image)
+            store_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            store_image(service, 'user', 'unused.jpg', 'lure.jpg', image)
+            repeat_times.append(time.perf_counter() - started)
+
+    original, thumb, medium = (float(np.mean(column)) / 1024 for column in zip(*sizes))
+    print(f"\n{args.images} images, 4032x3024; thumb {config.IMAGE_THUMB_SIZE}px, medium {config.IMAGE_MEDIUM_SIZE}px, "
+          f"quality {config.IMAGE_RENDITION_QUALITY}")
+    print(f"  stored per scan      original {original:8.1f} KB   renditions {thumb + medium:7.1f} KB "
+          f"(thumb {thumb:.1f} + medium {medium:.1f})")
+    print(f"  {args.list}-lure list egress originals {original * args.list / 1024:8.1f} MB   "
+          f"thumbs {thumb * args.list / 1024:7.2f} MB   x{original / thumb:.0f} less")
+    print(f"  make renditions      {np.median(render_times) * 1000:.1f} ms median")
+    print(f"  store scan           {np.median(store_times) * 1000:.1f} ms median "
+          f"({args.latency_ms:.0f} ms per request: existence check, rendering, upload)")
+    print(f"  store same photo     {np.median(repeat_times) * 1000:.1f} ms median "
+          f"({service.storage_stats()['skipped_known']} uploads skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+JPEG encodes per image: the old save/measure/re-save loop vs JPEGEncoder.
+
+The old loop encoded at quality 95, then at 85 if that was over
+TARGET_COMPRESSION_KB, then resized to 800 px and encoded a third time.
+JPEGEncoder encodes at 95 and, if needed, once more at a predicted quality.
+Both run over the same corpus of 1024x768 images (gradients with 0-40
+sigma noise and blocky textures) at several size targets.
+
+Usage:
+    cd backend
+    python benchmarks/bench_jpeg_quality.py [--images 24] [--targets 500 250 120]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image
+
+from jpeg_quality import JPEGEncoder, encode_jpeg
+from token_cost import fit_within
+
+
+def corpus(count, size=(1024, 768)):
+    rng = np.random.default_rng(0)
+    width, height = size
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x * 200 + y * 30, y * 180 + 40 * np.sin(x * 9), (1 - x) * 150 + y * 60], axis=-1)
+    images = []
+    for i in range(count):
+        if i % 3 == 2:
+            blocks = rng.integers(0, 255, (height // 8, width // 8, 3)).astype(np.uint8)
+            images.append(Image.fromarray(blocks).resize(size, Image.Resampling.BICUBIC))
+        else:
+            noise = rng.normal(0, 40 * i / count, (height, width, 3))
+            images.append(Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8)))
+    return images
+
+
+def legacy(img, max_bytes):
+    """The previous loop, with its 800 px fallback dimensions fixed"""
+    encodes, quality = 1, 95
+    data = encode_jpeg(img, quality)
+    if len(data) > max_bytes:
+        quality = 85
+        data = encode_jpeg(img, quality)
+        encodes += 1
+    if len(data) > max_bytes and max(img.size) > 800:
+        data = encode_jpeg(img.resize(fit_within(*img.size, 800), Image.Resampling.LANCZOS), quality)
+        encodes += 1
+    return data, encodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--targets", type=int, nargs="+", default=[500, 250, 120])
+    args = parser.parse_args()
+
+    images = corpus(args.images)
+    print(f"\n{args.images} images, 1024x768")
+    for target_kb in args.targets:
+        max_bytes = target_kb * 1024
+        print(f"  target {target_kb} KB")
+
+        started = time.perf_counter()
+        results = [legacy(img, max_bytes) for img in images]
+        elapsed = time.perf_counter() - started
+        print(f"    old loop     {sum(e for _, e in results) / len(images):4.2f} encodes/image   "
+              f"{elapsed / len(images) * 1000:6.1f} ms/image   "
+              f"over target {sum(len(d) > max_bytes for d, _ in results)}")
+
+        encoder = JPEGEncoder()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            sizes = [len(encoder.encode(img, max_bytes)) for img in images]
+            elapsed = time.perf_counter() - started
+        stats = encoder.stats()
+        print(f"    JPEGEncoder  {stats['encodes_per_image']:4.2f} encodes/image   "
+              f"{elapsed / len(images) * 1000:6.1f} ms/image   "
+              f"over target {sum(size > max_bytes for size in sizes)}   "
+              f"fallback resizes {stats['fallback_resizes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Lookup latency of the near-duplicate BK-tree at 100k and 1M hashes.
+
+Builds the in-memory tree the same way NearDuplicateIndex does (row ids as
+values) from random 64-bit hashes, then times nearest-neighbour queries for
+planted near-duplicates and for random misses.
+
+Usage:
+    cd backend
+    python benchmarks/bench_near_duplicate.py [--sizes 100000 1000000] [--distance 4]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from near_duplicate import BKTree
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench(size, distance, queries, rng):
+    hashes = [rng.getrandbits(64) for _ in range(size)]
+
+    started = time.perf_counter()
+    tree = BKTree()
+    for row_id, hash_value in enumerate(hashes):
+        tree.add(hash_value, row_id)
+    build_seconds = time.perf_counter() - started
+
+    def flip(hash_value, bits):
+        for bit in rng.sample(range(64), bits):
+            hash_value ^= 1 << bit
+        return hash_value
+
+    hits = [flip(rng.choice(hashes), rng.randint(0, distance)) for _ in range(queries)]
+    misses = [rng.getrandbits(64) for _ in range(queries)]
+
+    results = {}
+    for label, batch in (("near-duplicate", hits), ("miss", misses)):
+        samples, found = [], 0
+        for query in batch:
+            t0 = time.perf_counter()
+            matches = tree.search(query, distance)
+            samples.append((time.perf_counter() - t0) * 1000)
+            found += bool(matches)
+        results[label] = (samples, found)
+
+    print(f"\n{size:,} hashes  (build {build_seconds:.1f}s, max distance {distance})")
+    for label, (samples, found) in results.items():
+        print(f"  {label:<15} p50 {statistics.median(samples):7.2f} ms   "
+              f"p95 {percentile(samples, 95):7.2f} ms   found {found}/{len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--distance", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for size in args.sizes:
+        bench(size, args.distance, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
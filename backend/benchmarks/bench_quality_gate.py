@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Latency and verdicts of the photo quality gate on 12 MP photos.
+
+Renders a good table-top photo and blurred, dark, overexposed and empty
+variants of it, then times QualityGate.check on each with the thresholds
+from config. The time is what a rejected photo costs instead of a vision
+API call (seconds) and a quota slot.
+
+Usage:
+    cd backend
+    python benchmarks/bench_quality_gate.py [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+import config
+from image_quality import QualityGate
+
+SIZE = (4032, 3024)
+
+
+def photo(lure=True, blur=0, brightness=1.0):
+    rng = np.random.default_rng(0)
+    width, height = SIZE
+    pixels = np.clip(np.array([150, 110, 70]) + rng.normal(0, 5, (height, width, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+    if lure:
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((1500, 1100, 2600, 1900), fill=(220, 60, 30))
+        for x in range(1540, 2560, 45):
+            draw.line((x, 1300, x, 1700), fill=(250, 240, 230), width=10)
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    gate = QualityGate(config.QUALITY_MIN_SHARPNESS, config.QUALITY_MIN_BRIGHTNESS, config.QUALITY_MAX_BRIGHTNESS,
+                       config.QUALITY_MAX_CLIPPED_FRACTION, config.QUALITY_MIN_OBJECT_AREA,
+                       config.QUALITY_MIN_CONTRAST)
+    cases = [
+        ('good', photo()),
+        ('slight blur (sigma 6 px)', photo(blur=6)),
+        ('out of focus (sigma 16 px)', photo(blur=16)),
+        ('dark', photo(brightness=0.12)),
+        ('overexposed', photo(brightness=2.4)),
+        ('no lure', photo(lure=False)),
+    ]
+
+    print(f"\n{SIZE[0]}x{SIZE[1]} JPEGs, median of {args.repeat} checks")
+    for label, image in cases:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rejection = gate.check(image)
+            timings.append(time.perf_counter() - started)
+        verdict = ', '.join(rejection['reasons']) if rejection else 'pass'
+        print(f"  {label:<28} {np.median(timings) * 1000:6.1f} ms   {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Output size and parse time of a model answer with the old free-form prompt
+vs the strict response schema.
+
+Builds one realistic answer per lure database type (its first visual
+features and target species, a one-sentence reasoning). The old prompt's
+answers came back pretty-printed inside a markdown fence, with full field
+names; the schema's answers are plain JSON with one-letter names. Tokens
+are estimated at ~4 characters each; indentation tokenizes more cheaply
+than that, so the saving is somewhat overstated (avg_completion_tokens in
+/api/classifier-stats has the real figure).
+
+Usage:
+    cd backend
+    python benchmarks/bench_structured_output.py [--repeat 2000]
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from structured_output import compact, parse_analysis
+
+
+def answers(lure_database):
+    for lure_type, info in lure_database.items():
+        yield {
+            "lure_type": lure_type,
+            "confidence": 88,
+            "visual_features": info["visual_features"][:3],
+            "reasoning": f"The {', '.join(info['visual_features'][:2])} identify this as a {lure_type}.",
+            "target_species": info["target_species"][:3],
+        }
+
+
+def old_parse(content):
+    """The free-form path: strip a markdown fence, then json.loads"""
+    if content.startswith('```json'):
+        content = content.replace('```json', '').replace('```', '').strip()
+    elif content.startswith('```'):
+        content = content.replace('```', '').strip()
+    return json.loads(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from mobile_lure_classifier import MobileLureClassifier
+        classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+    samples = list(answers(classifier.lure_database))
+
+    old = [f"```json\n{json.dumps(answer, indent=4)}\n```" for answer in samples]
+    new = [json.dumps(compact(answer)) for answer in samples]
+    old_chars, new_chars = (sum(map(len, texts)) / len(samples) for texts in (old, new))
+
+    timings = {}
+    for label, texts, parse in (("old", old, old_parse),
+                                ("schema", new, lambda text: parse_analysis(text, classifier.lure_types))):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                parse(text)
+        timings[label] = (time.perf_counter() - started) / (args.repeat * len(texts))
+
+    print(f"\n{len(samples)} answers, one per lure database type")
+    print(f"  old prompt  {old_chars:6.0f} chars  ~{math.ceil(old_chars / 4):4d} tokens/answer   "
+          f"parse {timings['old'] * 1e6:6.1f} us")
+    print(f"  schema      {new_chars:6.0f} chars  ~{math.ceil(new_chars / 4):4d} tokens/answer   "
+          f"parse {timings['schema'] * 1e6:6.1f} us (validated)")
+    print(f"  answers {1 - new_chars / old_chars:.0%} shorter")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Cost of serving local uploads to a tackle-box list through /uploads.
+
+Saves --images 12 MP JPEGs as uploads, then fetches each through the Flask
+test client four ways: the original, a first ?w=256&fmt=webp request (render
++ cache write), a repeat of it (cache hit) and a revalidation with
+If-None-Match (304). Reports bytes sent and median latency per request.
+
+Usage:
+    cd backend
+    python benchmarks/bench_upload_cache.py [--images 8]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+import config
+from bench_image_offload import photo_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        config.UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+        config.UPLOAD_CACHE_DIR = os.path.join(directory, 'renditions')
+        os.makedirs(config.UPLOAD_FOLDER)
+        for seed in range(args.images):
+            with open(os.path.join(config.UPLOAD_FOLDER, f'lure_{seed}.jpg'), 'wb') as upload:
+                upload.write(photo_bytes(seed))
+
+        import app as app_module
+        from upload_image_cache import UploadImageCache
+        app_module.upload_cache = UploadImageCache.from_config()
+        client = app_module.app.test_client()
+
+        rows = {}
+
+        def fetch(label, url, headers=None):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers or {})
+            elapsed = time.perf_counter() - started
+            rows.setdefault(label, []).append((elapsed, len(response.data), response.status_code))
+            return response
+
+        for seed in range(args.images):
+            name = f'lure_{seed}.jpg'
+            fetch('original', f'/uploads/{name}')
+            fetch('w=256 webp, first request', f'/uploads/{name}?w=256&fmt=webp')
+            etag = fetch('w=256 webp, cached', f'/uploads/{name}?w=256&fmt=webp').headers['ETag']
+            fetch('w=256 webp, If-None-Match', f'/uploads/{name}?w=256&fmt=webp', {'If-None-Match': etag})
+
+    print(f"\n{args.images} uploads, 4032x3024 JPEG")
+    for label, samples in rows.items():
+        elapsed, sizes, statuses = zip(*samples)
+        print(f"  {label:<28} {np.median(elapsed) * 1000:7.1f} ms   {np.mean(sizes) / 1024:8.1f} KB   "
+              f"HTTP {statuses[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+When a client waiting on a scan first learns the lure type: at the end of a
+plain /upload scan vs from the stages /upload?stream=1 reports.
+
+Runs scan_pipeline.run_scan against a local fake OpenAI endpoint that
+answers after --first-token-ms and then streams the answer in 10 chunks
+over --generate-ms (a non-streamed answer arrives after both), and a fake
+Supabase where storing the image and updating the scan row each take
+--storage-ms.
+
+Usage:
+    cd backend
+    python benchmarks/bench_upload_stream.py [--scans 5] [--first-token-ms 800] [--generate-ms 1500]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+import numpy as np
+from PIL import Image
+
+import config
+from fake_openai import FakeOpenAIServer
+from scan_pipeline import run_scan
+
+
+class SlowSupabase:
+    """Supabase where the Storage upload and the row update take latency seconds each"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def is_enabled(self):
+        return True
+
+    def find_lure_renditions(self, user_id, digest, names, file_name=None):
+        return None
+
+    def upload_lure_renditions(self, user_id, digest, renditions, original=None, file_name=None):
+        time.sleep(self.latency)
+        return {'image_url': f'https://storage.test/{user_id}/{digest}/medium.jpg'}
+
+    def update_scan_with_results(self, scan_id, analysis_data):
+        time.sleep(self.latency)
+        return {'id': scan_id}
+
+
+def photo(seed):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (seed * 37 % 255, 90, 170)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=800)
+    parser.add_argument("--generate-ms", type=float, default=1500)
+    parser.add_argument("--storage-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    images = [photo(seed) for seed in range(args.scans)]
+    supabase = SlowSupabase(args.storage_ms / 1000)
+    plain, streamed = [], {"sent": [], "model_streaming": [], "lure_type": [], "parsed": [], "stored": []}
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+        config.RESULTS_FOLDER = os.path.join(directory, 'results')
+        from mobile_lure_classifier import MobileLureClassifier
+
+        # Non-streamed answers arrive whole, after the whole generation time
+        latency = (args.first_token_ms + args.generate_ms) / 1000
+        with FakeOpenAIServer(latency=latency) as server:
+            config.OPENAI_API_BASE = server.base_url
+            classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                for image in images:
+                    started = time.perf_counter()
+                    run_scan(classifier, supabase, 'user', 'lure.jpg', 'lure.jpg', 'scan', image_bytes=image,
+                             quality_checked=True)
+                    plain.append(time.perf_counter() - started)
+
+        with FakeOpenAIServer(latency=args.first_token_ms / 1000, stream_delay=args.generate_ms / 10000) as server:
+            config.OPENAI_API_BASE = server.base_url
+            classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                for image in images:
+                    started = time.perf_counter()
+                    seen = {}
+
+                    def progress(event, data):
+                        seen.setdefault(event, time.perf_counter() - started)
+
+                    run_scan(classifier, supabase, 'user', 'lure.jpg', 'lure.jpg', 'scan', image_bytes=image,
+                             quality_checked=True, progress=progress)
+                    for event, times in streamed.items():
+                        times.append(seen[event])
+
+    print(f"\n{args.scans} scans; upstream first token {args.first_token_ms:.0f} ms, generation "
+          f"{args.generate_ms:.0f} ms; Storage upload and row update {args.storage_ms:.0f} ms each")
+    print(f"  plain /upload          lure type after {np.median(plain) * 1000:7.0f} ms median (the whole response)")
+    print("  /upload?stream=1")
+    for event, times in streamed.items():
+        print(f"    {event:<16}     {np.median(times) * 1000:7.0f} ms median")
+    print(f"  lure type shown {1 - np.median(streamed['lure_type']) / np.median(plain):.0%} sooner")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Classifier worker fleet throughput against a Postgres job table.
+
+Queues --scans jobs in public.scan_jobs, then starts N worker processes
+(one claim loop each, the way separate classifier_worker.py dynos would
+run) and times how long the fleet takes to drain the queue. Every job
+runs the real MobileLureClassifier against a local fake OpenAI endpoint
+that sleeps --latency seconds per request.
+
+Usage:
+    cd backend
+    python benchmarks/bench_worker_fleet.py --dsn postgresql://... [--scans 64] [--latency 0.25] [--workers 1 4 16]
+
+The scan_jobs table is created from database/supabase_scan_jobs.sql and
+truncated before each run, so point --dsn at a disposable database.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+import psycopg
+from PIL import Image
+
+import config
+from fake_openai import FakeOpenAIServer
+
+MIGRATION = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'supabase_scan_jobs.sql')
+USER_ID = '00000000-0000-0000-0000-000000000001'
+
+
+class NullSupabase:
+    def is_enabled(self):
+        return False
+
+
+def jpeg_bytes(i):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (i % 255, 90, 170)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def run_worker(dsn, ready, go):
+    from classifier_worker import ClassifierWorker, make_processor
+    from mobile_lure_classifier import MobileLureClassifier
+    from pg_job_store import PostgresJobStore
+
+    classifier = MobileLureClassifier(openai_api_key='bench-key', result_cache=False)
+    store = PostgresJobStore(dsn)
+    worker = ClassifierWorker(store, make_processor(classifier, NullSupabase()),
+                              concurrency=1, poll_interval=0.05, sweep_interval=3600)
+    ready.release()
+    go.wait()
+    worker.start()
+    worker.wait()
+
+
+def drain(dsn, workers, scans, images):
+    from pg_job_store import PostgresJobStore
+
+    store = PostgresJobStore(dsn)
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute('TRUNCATE public.scan_jobs')
+    for i in range(scans):
+        store.create(USER_ID, {'image_name': f'lure_{i}.jpg'}, image_bytes=images[i], image_name=f'lure_{i}.jpg')
+
+    ctx = multiprocessing.get_context('fork')
+    ready, go = ctx.Semaphore(0), ctx.Event()
+    processes = [ctx.Process(target=run_worker, args=(dsn, ready, go), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    started = time.perf_counter()
+    go.set()
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        while conn.execute(
+            "SELECT count(*) FROM public.scan_jobs WHERE status NOT IN ('succeeded', 'failed')"
+        ).fetchone()[0]:
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - started
+        failed = conn.execute("SELECT count(*) FROM public.scan_jobs WHERE status = 'failed'").fetchone()[0]
+
+    for process in processes:
+        process.terminate()
+        process.join()
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("TEST_DATABASE_URL"))
+    parser.add_argument("--scans", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("--dsn (or TEST_DATABASE_URL) is required")
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn, open(MIGRATION) as migration:
+        conn.execute(migration.read())
+
+    images = [jpeg_bytes(i) for i in range(args.scans)]
+    with tempfile.TemporaryDirectory() as directory, FakeOpenAIServer(latency=args.latency) as server:
+        config.OPENAI_API_BASE = server.base_url
+        config.UPLOAD_FOLDER = os.path.join(directory, 'uploads')
+        config.RESULTS_FOLDER = os.path.join(directory, 'results')
+
+        print(f"\n{args.scans} scans, {args.latency:.2f} s injected upstream latency")
+        baseline = None
+        for workers in args.workers:
+            elapsed, failed = drain(args.dsn, workers, args.scans, images)
+            baseline = baseline or elapsed * workers
+            print(f"  {workers:>3} worker(s)   {elapsed:6.2f} s   {args.scans / elapsed:6.2f} scans/s"
+                  f"   scaling {baseline / elapsed / workers:5.0%}   failed {failed}")
+
+
+if __name__ == "__main__":
+    main()
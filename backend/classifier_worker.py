@@ -0,0 +1,228 @@
+"""
+Classifier worker: processes scan jobs queued in Postgres by the web tier.
+
+Run any number of these, on any number of nodes, next to the web dynos:
+
+    SCAN_JOB_BACKEND=postgres DATABASE_URL=... python classifier_worker.py --concurrency 4
+
+Each thread claims the oldest queued job with FOR UPDATE SKIP LOCKED, runs
+the same scan pipeline as /upload (classification + Supabase persistence)
+and records the result, which /api/jobs/<id> then serves. Jobs left running
+by a worker that died are requeued after SCAN_JOB_STALE_SECONDS; a worker
+that was only slow finds its claim gone at its next update and drops the job.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from werkzeug.utils import secure_filename
+
+import config
+from scan_jobs import SUCCEEDED, FAILED
+
+
+class LostClaimError(Exception):
+    """Raised when a job was requeued (and maybe claimed elsewhere) while this worker ran it"""
+
+
+class ClassifierWorker:
+    def __init__(self, store, process: Callable[[Dict, Callable[[str], None]], Dict],
+                 concurrency: int = 4, poll_interval: float = 1.0, sweep_interval: float = 60,
+                 worker_id: Optional[str] = None):
+        """
+        store: pg_job_store.PostgresJobStore
+        process: process(job, set_stage) -> result, for a job returned by store.claim()
+        concurrency: jobs processed at once by this process
+        poll_interval: seconds to wait after finding the queue empty
+        sweep_interval: seconds between stale-claim sweeps
+        """
+        self.store = store
+        self.process = process
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"claimed": 0, "succeeded": 0, "failed": 0, "requeued": 0, "lost_claims": 0,
+                       "store_errors": 0}
+
+    def start(self):
+        """Start the worker threads and the stale-claim sweeper"""
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"classifier-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        sweeper = threading.Thread(target=self._sweep_loop, name="classifier-worker-sweep", daemon=True)
+        sweeper.start()
+        self._threads.append(sweeper)
+
+    def request_stop(self):
+        """Stop claiming new jobs (safe to call from a signal handler)"""
+        self._stop.set()
+
+    def stop(self, timeout: float = None):
+        """Stop claiming new jobs and wait for in-progress ones to finish"""
+        self.request_stop()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wait(self):
+        """Block until stop() is called (e.g. from a signal handler)"""
+        while not self._stop.is_set():
+            self._stop.wait(1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["worker_id"] = self.worker_id
+        stats["concurrency"] = self.concurrency
+        return stats
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(self.worker_id)
+            except Exception as e:
+                print(f"[ERROR] Could not claim scan job: {e}")
+                self._count("store_errors")
+                self._stop.wait(self.poll_interval)
+                continue
+
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self._count("claimed")
+            self._run(job)
+
+    def _run(self, job: Dict):
+        job_id = job["id"]
+
+        def update(**fields):
+            if not self.store.update(job_id, worker_id=self.worker_id, attempt=job.get("attempts"), **fields):
+                raise LostClaimError(job_id)
+
+        try:
+            result = self.process(job, lambda stage: update(stage=stage))
+            if result.get("error"):
+                update(status=FAILED, stage=FAILED, result=result, error=result["error"])
+                self._count("failed")
+            else:
+                update(status=SUCCEEDED, stage=SUCCEEDED, result=result)
+                self._count("succeeded")
+        except LostClaimError:
+            print(f"[WARNING] Scan job {job_id} was requeued while running - dropping it")
+            self._count("lost_claims")
+        except Exception as e:
+            print(f"[ERROR] Scan job {job_id} failed: {e}")
+            self._count("failed")
+            try:
+                update(status=FAILED, stage=FAILED, error=str(e))
+            except LostClaimError:
+                self._count("lost_claims")
+            except Exception as store_error:
+                print(f"[ERROR] Could not record failure for job {job_id}: {store_error}")
+                self._count("store_errors")
+
+    def _sweep_loop(self):
+        while not self._stop.is_set():
+            try:
+                requeued = self.store.requeue_stale()
+                if requeued:
+                    print(f"[WARNING] Requeued {requeued} stale scan job(s)")
+                    with self._lock:
+                        self._stats["requeued"] += requeued
+                self.store.purge(config.SCAN_JOB_RETENTION_SECONDS)
+            except Exception as e:
+                print(f"[ERROR] Stale job sweep failed: {e}")
+                self._count("store_errors")
+            self._stop.wait(self.sweep_interval)
+
+
+def make_processor(classifier, supabase_service):
+    """
+    process(job, set_stage) for ClassifierWorker: runs the shared scan
+    pipeline on the queued image's bytes. Nothing is written to disk; the
+    result's image_path is only a label. The quality gate is skipped for
+    jobs the web tier already ran it on (meta "quality_checked").
+    """
+    from scan_pipeline import run_scan
+
+    def process(job: Dict, set_stage: Callable[[str], None]) -> Dict:
+        if not job.get("image_data"):
+            raise ValueError("job has no image data")
+
+        filename = secure_filename(job.get("image_name") or "upload.jpg")
+        label = f"{job['id']}_{filename}"
+        return run_scan(classifier, supabase_service, job["user_id"], label, filename,
+                        job["meta"].get("pending_scan_id"), set_stage, image_bytes=job["image_data"],
+                        quality_checked=bool(job["meta"].get("quality_checked")))
+
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process scan jobs queued in Postgres")
+    parser.add_argument("--concurrency", type=int, default=config.WORKER_CONCURRENCY,
+                        help="jobs processed at once by this process")
+    parser.add_argument("--poll-interval", type=float, default=config.WORKER_POLL_SECONDS,
+                        help="seconds to wait when the queue is empty")
+    args = parser.parse_args()
+
+    if not config.DATABASE_URL:
+        print("[ERROR] DATABASE_URL is not set")
+        raise SystemExit(1)
+    if not config.OPENAI_API_KEY:
+        print("[ERROR] OPENAI_API_KEY is not set")
+        raise SystemExit(1)
+
+    from mobile_lure_classifier import MobileLureClassifier
+    from pg_job_store import PostgresJobStore
+    from supabase_client import supabase_service
+
+    store = PostgresJobStore(
+        config.DATABASE_URL,
+        stale_seconds=config.SCAN_JOB_STALE_SECONDS,
+        max_attempts=config.SCAN_JOB_MAX_ATTEMPTS,
+    )
+    classifier = MobileLureClassifier(openai_api_key=config.OPENAI_API_KEY)
+    worker = ClassifierWorker(
+        store,
+        make_processor(classifier, supabase_service),
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        sweep_interval=config.WORKER_SWEEP_SECONDS,
+    )
+
+    def shutdown(signum, frame):
+        print(f"[INFO] Signal {signum} received — finishing in-progress jobs")
+        worker.request_stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    print(f"[OK] Classifier worker {worker.worker_id} started ({args.concurrency} threads)")
+    started = time.time()
+    worker.start()
+    worker.wait()
+    worker.stop()
+    print(f"[INFO] Classifier worker stopped after {time.time() - started:.0f}s: {worker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # Configuration file for Mobile Lure Classifier
 # Loads configuration from environment variables for security
 
+import json
 import os
 from dotenv import load_dotenv
 
@@ -19,15 +20,154 @@ FLASK_DEBUG = os.getenv("FLASK_DEBUG", "False").lower() == "true"
 MAX_IMAGE_SIZE_MB = int(os.getenv("MAX_IMAGE_SIZE_MB", "16"))
 TARGET_COMPRESSION_KB = int(os.getenv("TARGET_COMPRESSION_KB", "500"))
 MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "1200"))
+# Decode memory (rasters being decoded, converted and resized) all scans in one worker may hold at once;
+# scans past it wait for a running decode to finish
+DECODE_MEMORY_BUDGET_MB = int(os.getenv("DECODE_MEMORY_BUDGET_MB", "256"))
+# Process pool for compression and perceptual hashing (image_offload.py): 0 = run on the request
+# thread, "auto" = one process per available core. Each gunicorn worker gets its own pool.
+_image_offload_workers = os.getenv("IMAGE_OFFLOAD_WORKERS", "0").lower()
+IMAGE_OFFLOAD_WORKERS = (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+) if _image_offload_workers == "auto" else int(_image_offload_workers)
+# Images up to this many pixels are processed inline; the hop to a pool process costs more
+IMAGE_OFFLOAD_INLINE_MAX_PIXELS = int(os.getenv("IMAGE_OFFLOAD_INLINE_MAX_PIXELS", "1000000"))
+
+# Auto-Crop (auto_crop.py)
+# Crop to the lure (found by edge-density / colour-contrast saliency) before resizing, so fewer
+# 512px tiles of background are billed. Margin is a fraction of the box; areas are fractions of the photo.
+AUTO_CROP_ENABLED = os.getenv("AUTO_CROP_ENABLED", "False").lower() == "true"
+AUTO_CROP_MARGIN = float(os.getenv("AUTO_CROP_MARGIN", "0.12"))
+AUTO_CROP_MIN_AREA = float(os.getenv("AUTO_CROP_MIN_AREA", "0.01"))  # smaller boxes are likely noise
+AUTO_CROP_MAX_AREA = float(os.getenv("AUTO_CROP_MAX_AREA", "0.6"))  # larger boxes save too little
+
+# Photo Quality Gate (image_quality.py)
+# Blurry, dark, blown-out or empty photos get a "retake photo" response before any API call or quota use.
+# Figures are measured on a <=512px copy: sharpness is Laplacian variance, brightness and contrast 0-255 luminance.
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "False").lower() == "true"
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "100"))
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "225"))
+QUALITY_MAX_CLIPPED_FRACTION = float(os.getenv("QUALITY_MAX_CLIPPED_FRACTION", "0.5"))  # pixels at black/white
+QUALITY_MIN_OBJECT_AREA = float(os.getenv("QUALITY_MIN_OBJECT_AREA", "0.002"))  # salient share of the frame
+QUALITY_MIN_CONTRAST = float(os.getenv("QUALITY_MIN_CONTRAST", "4"))  # luminance std-dev of an empty frame
+
+# Image Renditions (image_renditions.py)
+# Scans store a list thumbnail and a detail-screen image in Supabase Storage rather than the original upload
+IMAGE_THUMB_SIZE = int(os.getenv("IMAGE_THUMB_SIZE", "256"))  # longest side, px
+IMAGE_MEDIUM_SIZE = int(os.getenv("IMAGE_MEDIUM_SIZE", "1024"))
+IMAGE_RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", "82"))
+STORE_ORIGINAL_IMAGES = os.getenv("STORE_ORIGINAL_IMAGES", "False").lower() == "true"
+
+# Resized Upload Cache (upload_image_cache.py)
+# /uploads/<filename>?w=&fmt= renders on first request and keeps the result in a size-bounded LRU directory
+UPLOAD_CACHE_DIR = os.getenv("UPLOAD_CACHE_DIR", "cache/uploads")
+UPLOAD_CACHE_MAX_MB = int(os.getenv("UPLOAD_CACHE_MAX_MB", "256"))
+UPLOAD_CACHE_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_CACHE_MAX_AGE_SECONDS", str(24 * 3600)))  # Cache-Control
 
 # Analysis Configuration
 CHATGPT_MODEL = os.getenv("CHATGPT_MODEL", "gpt-4o-mini")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "500"))
 
+# Adaptive Detail Routing
+# "adaptive": send a small low-detail image first and re-query at high detail only when
+# confidence is below the threshold or the answer is a general lure category; "off": single pass
+DETAIL_ROUTING = os.getenv("DETAIL_ROUTING", "off").lower()
+LOW_DETAIL_MAX_DIMENSION = int(os.getenv("LOW_DETAIL_MAX_DIMENSION", "512"))
+ESCALATION_CONFIDENCE_THRESHOLD = float(os.getenv("ESCALATION_CONFIDENCE_THRESHOLD", "70"))
+
+# Batch Classification (MobileLureClassifier.analyze_lure_batch)
+# Up to this many photos share one vision request (one prompt, one round trip)
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "6"))
+
+# Vision Token Pricing (token_cost.py)
+# USD per 1M tokens; a high-detail image costs image_base_tokens + image_tile_tokens per 512px tile,
+# a low-detail image image_base_tokens. Dated model snapshots match by longest prefix.
+# Add or override models with MODEL_PRICING_JSON='{"model": {...}}'
+MODEL_PRICING = {
+    "gpt-4o-mini": {"input_per_million": 0.15, "output_per_million": 0.60,
+                    "image_base_tokens": 2833, "image_tile_tokens": 5667},
+    "gpt-4o": {"input_per_million": 2.50, "output_per_million": 10.00,
+               "image_base_tokens": 85, "image_tile_tokens": 170},
+    "gpt-4.1": {"input_per_million": 2.00, "output_per_million": 8.00,
+                "image_base_tokens": 85, "image_tile_tokens": 170},
+    "gpt-4-turbo": {"input_per_million": 10.00, "output_per_million": 30.00,
+                    "image_base_tokens": 85, "image_tile_tokens": 170},
+}
+MODEL_PRICING.update(json.loads(os.getenv("MODEL_PRICING_JSON") or "{}"))
+# Shrink a high-detail image by up to this fraction when that saves a row/column of 512px tiles
+TILE_SNAP_TOLERANCE = float(os.getenv("TILE_SNAP_TOLERANCE", "0.1"))
+
+# OpenAI HTTP Client Configuration
+# Keep-alive connection pool shared by every scan in a worker; timeouts stop a stuck upstream pinning it
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+OPENAI_READ_TIMEOUT_SECONDS = float(os.getenv("OPENAI_READ_TIMEOUT_SECONDS", "60"))
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "10"))
+
+# Vision API Resilience Configuration
+# Retries for 429/5xx/timeouts with jittered exponential backoff (Retry-After wins when present)
+VISION_RETRY_MAX_ATTEMPTS = int(os.getenv("VISION_RETRY_MAX_ATTEMPTS", "3"))  # including the first try
+VISION_RETRY_BASE_SECONDS = float(os.getenv("VISION_RETRY_BASE_SECONDS", "0.5"))
+VISION_RETRY_MAX_SECONDS = float(os.getenv("VISION_RETRY_MAX_SECONDS", "8"))
+VISION_RETRY_AFTER_MAX_SECONDS = float(os.getenv("VISION_RETRY_AFTER_MAX_SECONDS", "30"))  # longer Retry-After = give up
+# Per-worker circuit breaker: opens when the failure rate over the window crosses the threshold
+VISION_BREAKER_FAILURE_RATE = float(os.getenv("VISION_BREAKER_FAILURE_RATE", "0.5"))
+VISION_BREAKER_MIN_REQUESTS = int(os.getenv("VISION_BREAKER_MIN_REQUESTS", "10"))
+VISION_BREAKER_WINDOW_SECONDS = float(os.getenv("VISION_BREAKER_WINDOW_SECONDS", "60"))
+VISION_BREAKER_OPEN_SECONDS = float(os.getenv("VISION_BREAKER_OPEN_SECONDS", "30"))
+# Overall budget for a synchronous /upload (keep below gunicorn's worker timeout, 30s by default);
+# clients can ask for less with an X-Request-Timeout header (seconds)
+UPLOAD_DEADLINE_SECONDS = float(os.getenv("UPLOAD_DEADLINE_SECONDS", "25"))
+
 # File Storage Configuration
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 RESULTS_FOLDER = os.getenv("RESULTS_FOLDER", "analysis_results")
 
+# Async Scan Job Configuration (/upload?async=1)
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "4"))  # concurrent scans per gunicorn worker
+SCAN_JOB_MAX_QUEUED = int(os.getenv("SCAN_JOB_MAX_QUEUED", "32"))  # running + waiting before 503
+SCAN_JOB_DB_PATH = os.getenv("SCAN_JOB_DB_PATH", "cache/scan_jobs.sqlite3")
+SCAN_JOB_RETENTION_SECONDS = int(os.getenv("SCAN_JOB_RETENTION_SECONDS", "86400"))
+SCAN_JOB_STALE_SECONDS = int(os.getenv("SCAN_JOB_STALE_SECONDS", "600"))
+SCAN_JOB_EVENTS_TIMEOUT_SECONDS = int(os.getenv("SCAN_JOB_EVENTS_TIMEOUT_SECONDS", "120"))
+SCAN_JOB_POLL_SECONDS = float(os.getenv("SCAN_JOB_POLL_SECONDS", "0.5"))
+# "local" runs jobs in the web process; "postgres" queues them in public.scan_jobs for classifier_worker.py
+SCAN_JOB_BACKEND = os.getenv("SCAN_JOB_BACKEND", "local").lower()
+SCAN_JOB_MAX_ATTEMPTS = int(os.getenv("SCAN_JOB_MAX_ATTEMPTS", "3"))  # claims before a stale job is failed
+DATABASE_URL = os.getenv("DATABASE_URL", "")  # Supabase: Settings -> Database -> Connection string
+
+# Batch Upload Configuration (/api/batch-upload)
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "50"))  # each up to MAX_IMAGE_SIZE_MB
+BATCH_UPLOAD_MAX_TOTAL_MB = int(os.getenv("BATCH_UPLOAD_MAX_TOTAL_MB", "100"))  # whole request body
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))  # scans running at once, all batches
+
+# Classifier Worker Configuration (classifier_worker.py, SCAN_JOB_BACKEND=postgres)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))  # jobs processed concurrently per worker process
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1.0"))  # idle wait between claim attempts
+WORKER_SWEEP_SECONDS = int(os.getenv("WORKER_SWEEP_SECONDS", "60"))  # how often stale claims are requeued
+
+# Result Cache Configuration
+# Classification results keyed by image hash: per-worker LRU + SQLite file shared by all workers
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "True").lower() == "true"
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "cache/results.sqlite3")
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "512"))
+
+# Near-Duplicate Index Configuration
+# Re-photographed lures reuse a cached result when their perceptual hashes differ by at most N bits (of 64)
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "True").lower() == "true"
+NEAR_DUPLICATE_ALGORITHM = os.getenv("NEAR_DUPLICATE_ALGORITHM", "dhash")  # dhash or phash
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "4"))
+NEAR_DUPLICATE_INDEX_PATH = os.getenv("NEAR_DUPLICATE_INDEX_PATH", "cache/near_duplicates.sqlite3")
+
+# Single-Flight Configuration
+# Concurrent requests for the same image share one API call, within and across gunicorn workers
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+SINGLE_FLIGHT_LOCK_PATH = os.getenv("SINGLE_FLIGHT_LOCK_PATH", "cache/inflight.sqlite3")
+SINGLE_FLIGHT_LEASE_SECONDS = int(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "120"))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "0.25"))
+
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
@@ -0,0 +1,85 @@
+"""
+Memory budget for image decoding.
+
+A 12 MP phone photo is ~36 MB as an RGB raster, several times that while
+it is converted and resized, and every scan thread in a worker can be
+decoding at once. Each compression reserves an estimate of the memory its
+decode will touch before decoding; when the worker's reservations would
+exceed the budget, the scan waits for earlier decodes to finish instead of
+pushing RSS up. An image larger than the whole budget still runs, alone.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import config
+
+
+def decode_bytes(decoded_size: Tuple[int, int], mode: str, output_size: Tuple[int, int]) -> int:
+    """
+    Estimated peak bytes for decoding at decoded_size (after any JPEG draft
+    scaling), converting to RGB and resizing to output_size
+    """
+    width, height = decoded_size
+    total = width * height * len(mode)  # "RGB" -> 3, "RGBA"/"CMYK" -> 4, "L" -> 1
+    if mode != "RGB":
+        total += width * height * 3
+    if output_size != decoded_size:
+        # Pillow resizes in two passes; the first leaves an output-width, full-height raster
+        total += output_size[0] * height * 3
+    return total + output_size[0] * output_size[1] * 3
+
+
+class DecodeBudget:
+    def __init__(self, budget_bytes: int):
+        """budget_bytes: decode memory all threads in this process may hold at once"""
+        self.budget_bytes = budget_bytes
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "reservations": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "oversized": 0,
+            "peak_bytes": 0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "DecodeBudget":
+        """Build a budget from config values"""
+        return cls(config.DECODE_MEMORY_BUDGET_MB * 1024 * 1024)
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        """Hold nbytes of the budget for the duration of the block, waiting for room if needed"""
+        with self._condition:
+            if not self._fits(nbytes):
+                self._stats["waits"] += 1
+                started = time.monotonic()
+                self._condition.wait_for(lambda: self._fits(nbytes))
+                self._stats["wait_seconds"] += time.monotonic() - started
+            if nbytes > self.budget_bytes:
+                self._stats["oversized"] += 1
+            self._in_use += nbytes
+            self._stats["reservations"] += 1
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._in_use)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= nbytes
+                self._condition.notify_all()
+
+    def _fits(self, nbytes: int) -> bool:
+        # An oversized image gets the whole budget to itself rather than waiting forever
+        return self._in_use + nbytes <= self.budget_bytes or self._in_use == 0
+
+    def stats(self) -> Dict:
+        with self._condition:
+            stats = dict(self._stats)
+            stats["in_use_bytes"] = self._in_use
+        stats["budget_bytes"] = self.budget_bytes
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
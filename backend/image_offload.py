@@ -0,0 +1,232 @@
+"""
+CPU-bound image work for a scan, and an optional process pool to run it in.
+
+Decoding, resizing and JPEG-encoding an upload (compress_image) and
+perceptual hashing hold the GIL for most of their run time, so on the
+request thread they serialize every scan in a threaded worker and stall the
+event loop of an async one. With IMAGE_OFFLOAD_WORKERS set, MobileLureClassifier
+sends that work to a ProcessPoolExecutor sized to the machine's cores.
+Tasks take and return bytes (nothing touches disk), and images of at most
+IMAGE_OFFLOAD_INLINE_MAX_PIXELS run inline, where the hop to another
+process would cost more than the work.
+
+The pool uses the forkserver start method: forking a web worker that is
+running request threads can copy a held lock into the child.
+"""
+
+import contextlib
+import io
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+import config
+from auto_crop import Box, crop_dimensions
+from decode_budget import DecodeBudget, decode_bytes
+from jpeg_quality import JPEGEncoder
+from near_duplicate import perceptual_hash
+from token_cost import optimal_dimensions
+
+
+# ============================================================================
+# IMAGE WORK (runs inline or in a pool process)
+# ============================================================================
+
+def compress_image(image_bytes: bytes, max_dimension: int, detail: Optional[str], max_bytes: int,
+                   encoder: JPEGEncoder, decode_budget: DecodeBudget = None, crop: Box = None):
+    """
+    Resize and JPEG-encode an image for the vision API, entirely in memory.
+    Dimensions come from the token cost model: never more pixels than the API
+    bills for, snapped to the fewest 512px tiles. JPEGs are decoded at reduced
+    scale (see draft); the decode holds its memory in decode_budget.
+    crop: (left, top, right, bottom) in original pixels to send instead of the whole image.
+    Returns the JPEG bytes, or image_bytes if the image can't be processed.
+    """
+    try:
+        # Open image with PIL (only the header is read here)
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            original_size = img.size
+            with _decode_slot(img, max_dimension, detail, decode_budget, crop) as (new_width, new_height):
+                if crop:
+                    # The draft decode may be scaled down: map the box onto it
+                    scale_x, scale_y = img.size[0] / original_size[0], img.size[1] / original_size[1]
+                    img = img.crop((round(crop[0] * scale_x), round(crop[1] * scale_y),
+                                    round(crop[2] * scale_x), round(crop[3] * scale_y)))
+                return _resize_and_encode(img, new_width, new_height, max_bytes, encoder)
+
+    except Exception as e:
+        print(f"[ERROR] Image compression failed: {str(e)}")
+        return image_bytes  # Send the original if compression fails
+
+
+def _resize_and_encode(img, new_width: int, new_height: int, max_bytes: int, encoder: JPEGEncoder):
+    # Convert to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if (new_width, new_height) != img.size:
+        # Resize image (from the draft-scaled decode, at most ~2x the target)
+        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        print(f"Resized to: {new_width}x{new_height}")
+
+    # One encode when the image fits at quality 95, two at most otherwise
+    compressed = encoder.encode(img, max_bytes)
+
+    print(f"[OK] Image compressed successfully: {len(compressed) / 1024:.1f} KB")
+    return compressed
+
+
+@contextlib.contextmanager
+def _decode_slot(img, max_dimension: int, detail: Optional[str], decode_budget: Optional[DecodeBudget],
+                 crop: Box = None):
+    """
+    Pick the output size for an opened (not yet decoded) image, or for the
+    crop box in it, switch JPEGs to draft decoding and hold the decode's
+    memory in decode_budget. Yields (width, height) to resize to.
+    """
+    original_width, original_height = img.size
+    print(f"Original image: {original_width}x{original_height}")
+
+    # Calculate target dimensions (maintain aspect ratio)
+    if crop:
+        source_width, source_height = crop[2] - crop[0], crop[3] - crop[1]
+        target = crop_dimensions(img.size, crop, max_dimension, detail)
+        print(f"Auto-crop to: {source_width}x{source_height} at ({crop[0]}, {crop[1]})")
+    else:
+        source_width, source_height = img.size
+        target = optimal_dimensions(original_width, original_height, max_dimension, detail)
+    # The draft must keep the crop at least target-sized, so scale the target up to the whole image
+    draft(img, (math.ceil(target[0] * original_width / source_width),
+                math.ceil(target[1] * original_height / source_height)))
+    if decode_budget is None:
+        yield target
+        return
+    with decode_budget.reserve(decode_bytes(img.size, img.mode, target)):
+        yield target
+
+
+def draft(img, target: Tuple[int, int]):
+    """
+    Let the JPEG decoder scale by 1/2, 1/4 or 1/8 in the DCT domain, to the
+    smallest scale still at least target, so the full-resolution raster is
+    never built. A no-op for other formats.
+    """
+    if img.format != 'JPEG':
+        return
+    full_size = img.size
+    img.draft('RGB', target)
+    if img.size != full_size:
+        print(f"Draft decode at: {img.size[0]}x{img.size[1]}")
+
+
+def _compress_task(image_bytes: bytes, max_dimension: int, detail: Optional[str], max_bytes: int,
+                   crop: Optional[Box]):
+    """compress_image in a pool process: (JPEG bytes, that encode's JPEGEncoder counters)"""
+    # One task per process at a time, so the pool size already bounds decode memory
+    encoder = JPEGEncoder()
+    compressed = compress_image(image_bytes, max_dimension, detail, max_bytes, encoder, crop=crop)
+    return bytes(compressed), encoder.counters()
+
+
+def _hash_task(image_bytes: bytes, algorithm: str) -> int:
+    return perceptual_hash(io.BytesIO(image_bytes), algorithm)
+
+
+# ============================================================================
+# PROCESS POOL
+# ============================================================================
+
+def _pixels(image_bytes: bytes) -> int:
+    """Pixel count from the image header (0 if it can't be read)"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size[0] * img.size[1]
+    except Exception:
+        return 0
+
+
+class ImageOffload:
+    def __init__(self, workers: int, inline_max_pixels: int = 1_000_000):
+        """
+        workers: pool processes (started on first use)
+        inline_max_pixels: images this small run on the calling thread
+        """
+        self.workers = workers
+        self.inline_max_pixels = inline_max_pixels
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"offloaded": 0, "inline": 0, "pool_errors": 0}
+
+    @classmethod
+    def from_config(cls) -> Optional["ImageOffload"]:
+        """The configured pool, or None when IMAGE_OFFLOAD_WORKERS is 0"""
+        if config.IMAGE_OFFLOAD_WORKERS <= 0:
+            return None
+        return cls(config.IMAGE_OFFLOAD_WORKERS, config.IMAGE_OFFLOAD_INLINE_MAX_PIXELS)
+
+    def compress(self, image_bytes: bytes, max_dimension: int, detail: Optional[str], max_bytes: int,
+                 encoder: JPEGEncoder, decode_budget: DecodeBudget = None, crop: Box = None):
+        """compress_image, in the pool unless the image is small; counters land in encoder"""
+        def inline():
+            # The shared encoder records inline encodes itself
+            return compress_image(image_bytes, max_dimension, detail, max_bytes, encoder, decode_budget, crop), None
+
+        compressed, counters = self._run(inline, _compress_task, image_bytes, max_dimension, detail, max_bytes,
+                                         crop)
+        if counters:
+            encoder.merge(counters)
+        return compressed
+
+    def perceptual_hash(self, image_bytes: bytes, algorithm: str) -> int:
+        """Perceptual hash of an image, in the pool unless the image is small"""
+        return self._run(lambda: _hash_task(image_bytes, algorithm), _hash_task, image_bytes, algorithm)
+
+    def _run(self, inline: Callable, task: Callable, image_bytes: bytes, *args):
+        if _pixels(image_bytes) <= self.inline_max_pixels:
+            self._count("inline")
+            return inline()
+        try:
+            result = self._pool().submit(task, image_bytes, *args).result()
+        except BrokenProcessPool as e:
+            # A pool process died (OOM kill, segfault): start a fresh pool next time
+            print(f"[WARNING] Image offload pool failed, running inline: {str(e)}")
+            self._count("pool_errors")
+            self._reset()
+            return inline()
+        self._count("offloaded")
+        return result
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver"),
+                )
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
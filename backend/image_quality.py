@@ -0,0 +1,168 @@
+"""
+Local photo-quality gate, run before a scan spends an API call or a quota slot.
+
+Checks a draft-decoded copy of at most ANALYSIS_SIZE px with NumPy, in a few
+tens of milliseconds:
+
+  - Sharpness: variance of the Laplacian, over the salient (lure) blocks when
+    there are any so a plain background doesn't read as blur.
+  - Exposure: mean luminance, and the share of pixels crushed to black or
+    blown to white.
+  - Object presence: the share of salient blocks (auto_crop.salient_blocks).
+    A photo fails only when nothing stands out and the frame is nearly
+    uniform too, so a lure filling the whole frame still passes.
+
+A failing photo gets a structured "retake photo" response (retake_response)
+instead of a classification.
+"""
+
+import io
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+import config
+from auto_crop import salient_blocks
+
+ANALYSIS_SIZE = 512
+# Salient blocks are judged on the same 64-block-wide grid auto-crop uses at 256 px
+BLOCK = 8
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+REASONS = ("blurry", "too_dark", "overexposed", "no_lure")
+MESSAGES = {
+    "blurry": "the photo is blurry",
+    "too_dark": "the photo is too dark",
+    "overexposed": "the photo is overexposed",
+    "no_lure": "no lure was found in the photo",
+}
+TIPS = {
+    "blurry": "Hold the phone steady and tap the lure to focus before taking the photo.",
+    "too_dark": "Move to a brighter spot or turn on more light.",
+    "overexposed": "Avoid direct sunlight and flash glare on the lure.",
+    "no_lure": "Fill most of the frame with the lure, on a plain background.",
+}
+
+
+def measure(image_bytes: bytes) -> Dict:
+    """Sharpness, exposure and object-presence figures for an image"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if img.format == 'JPEG':
+            img.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        small = img.convert('RGB')
+        small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    mask = salient_blocks(pixels, BLOCK)
+    laplacian = np.zeros_like(gray)
+    laplacian[1:-1, 1:-1] = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                             - 4 * gray[1:-1, 1:-1])
+    region = laplacian[1:-1, 1:-1]
+    if mask is not None and mask.any():
+        # Block grid -> pixel mask over the area the grid covers
+        pixel_mask = np.kron(mask, np.ones((BLOCK, BLOCK), dtype=bool))
+        region = laplacian[:pixel_mask.shape[0], :pixel_mask.shape[1]][pixel_mask]
+
+    return {
+        "sharpness": round(float(region.var()), 1),
+        "brightness": round(float(gray.mean()), 1),
+        "dark_fraction": round(float((gray <= DARK_LEVEL).mean()), 3),
+        "bright_fraction": round(float((gray >= BRIGHT_LEVEL).mean()), 3),
+        "contrast": round(float(gray.std()), 1),
+        "object_fraction": round(float(mask.mean()), 3) if mask is not None else 0.0,
+    }
+
+
+def retake_response(reasons: List[str], metrics: Dict) -> Dict:
+    """The result returned instead of a classification for a photo that failed the gate"""
+    problems = [MESSAGES[reason] for reason in reasons]
+    return {
+        "error": "retake_photo",
+        "retake_photo": True,
+        "reasons": reasons,
+        "message": f"Please retake the photo: {', and '.join(problems)}.",
+        "tips": [TIPS[reason] for reason in reasons],
+        "quality": metrics,
+    }
+
+
+class QualityGate:
+    def __init__(self, min_sharpness: float, min_brightness: float, max_brightness: float,
+                 max_clipped_fraction: float, min_object_area: float, min_contrast: float):
+        """
+        min_sharpness: Laplacian variance below which a photo is blurry.
+        min_brightness / max_brightness: mean luminance bounds (0-255).
+        max_clipped_fraction: share of pixels allowed at black (too dark) or white (overexposed).
+        min_object_area / min_contrast: a photo with fewer salient blocks than
+        min_object_area and less luminance spread than min_contrast has no lure.
+        """
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped_fraction = max_clipped_fraction
+        self.min_object_area = min_object_area
+        self.min_contrast = min_contrast
+        self._lock = threading.Lock()
+        self._stats = {"checked": 0, "passed": 0, "rejected": 0, "errors": 0, "check_seconds": 0.0}
+        self._rejections = {reason: 0 for reason in REASONS}
+
+    @classmethod
+    def from_config(cls) -> Optional["QualityGate"]:
+        """Build a gate from config values; None when QUALITY_GATE_ENABLED is off"""
+        if not config.QUALITY_GATE_ENABLED:
+            return None
+        return cls(config.QUALITY_MIN_SHARPNESS, config.QUALITY_MIN_BRIGHTNESS, config.QUALITY_MAX_BRIGHTNESS,
+                   config.QUALITY_MAX_CLIPPED_FRACTION, config.QUALITY_MIN_OBJECT_AREA,
+                   config.QUALITY_MIN_CONTRAST)
+
+    def reasons(self, metrics: Dict) -> List[str]:
+        """Why a photo with these figures fails the gate (empty when it passes)"""
+        reasons = []
+        if metrics["brightness"] < self.min_brightness or metrics["dark_fraction"] > self.max_clipped_fraction:
+            reasons.append("too_dark")
+        elif metrics["brightness"] > self.max_brightness or metrics["bright_fraction"] > self.max_clipped_fraction:
+            reasons.append("overexposed")
+        no_lure = metrics["object_fraction"] < self.min_object_area and metrics["contrast"] < self.min_contrast
+        # Crushed, blown-out and empty frames have little Laplacian energy whatever their focus
+        if not reasons and not no_lure and metrics["sharpness"] < self.min_sharpness:
+            reasons.append("blurry")
+        if no_lure:
+            reasons.append("no_lure")
+        return reasons
+
+    def check(self, image_bytes: bytes) -> Optional[Dict]:
+        """
+        A retake_response for a photo that fails the gate, or None to go ahead
+        with the scan. Photos that can't be measured go ahead too: the scan
+        reports what is wrong with them.
+        """
+        started = time.perf_counter()
+        try:
+            metrics = measure(image_bytes)
+        except Exception as e:
+            print(f"[WARNING] Photo quality check failed: {str(e)}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+        reasons = self.reasons(metrics)
+        with self._lock:
+            self._stats["checked"] += 1
+            self._stats["rejected" if reasons else "passed"] += 1
+            self._stats["check_seconds"] += time.perf_counter() - started
+            for reason in reasons:
+                self._rejections[reason] += 1
+        if not reasons:
+            return None
+        print(f"[INFO] Photo rejected before scanning: {', '.join(reasons)}")
+        return retake_response(reasons, metrics)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats, rejections=dict(self._rejections))
+        stats["check_seconds"] = round(stats["check_seconds"], 3)
+        return stats
@@ -0,0 +1,68 @@
+"""
+Display renditions of a scanned photo, stored instead of the original.
+
+The tackle box only ever shows a lure photo as a list thumbnail or on the
+detail screen, so storing (and serving) the 12 MP original wastes storage
+egress and list-render time. make_renditions decodes the upload once, at the
+smallest JPEG draft scale that still covers the largest rendition, and
+encodes each rendition from the one before it, largest first.
+
+Storage paths are keyed by the upload's content hash (result_cache.image_digest),
+not its filename: the same photo always lands on the same objects, so it is
+stored once, and two different photos called image.jpg never overwrite each
+other.
+"""
+
+import io
+import os
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+import config
+from token_cost import fit_within
+
+# Rendition name -> lure_analyses column holding its public URL
+URL_COLUMNS = {"thumb": "image_thumb_url", "medium": "image_medium_url"}
+
+
+def rendition_sizes() -> Dict[str, int]:
+    """Longest side in pixels of each rendition, from config"""
+    return {"thumb": config.IMAGE_THUMB_SIZE, "medium": config.IMAGE_MEDIUM_SIZE}
+
+
+def rendition_path(user_id: str, digest: str, name: str) -> str:
+    """Storage path of a rendition of the upload with this content digest"""
+    return f"{user_id}/{digest}/{name}.jpg"
+
+
+def original_path(user_id: str, digest: str, file_name: str) -> str:
+    """Storage path of the original upload, keeping its file extension"""
+    return f"{user_id}/{digest}{os.path.splitext(file_name)[1].lower()}"
+
+
+def make_renditions(image_bytes: bytes, sizes: Dict[str, int] = None, quality: int = None) -> Dict[str, bytes]:
+    """
+    JPEG bytes of each rendition (name -> bytes, largest first), upright per
+    the photo's EXIF orientation
+    """
+    sizes = sizes or rendition_sizes()
+    quality = quality or config.IMAGE_RENDITION_QUALITY
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        largest = max(sizes.values())
+        if img.format == 'JPEG':
+            img.draft('RGB', fit_within(*img.size, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        renditions = {}
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            target = fit_within(*img.size, size)
+            if target != img.size:
+                img = img.resize(target, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+            renditions[name] = buffer.getvalue()
+            print(f"Rendition {name}: {img.size[0]}x{img.size[1]}, {len(renditions[name]) / 1024:.1f} KB")
+    return renditions
@@ -0,0 +1,111 @@
+"""
+JPEG quality selection for the image sent to the vision API.
+
+The first encode is at REFERENCE_QUALITY. If that is over the size target,
+the quality for the second encode is read off SIZE_RATIOS: the size of an
+image at quality q relative to its size at the reference quality. The table
+is the upper envelope measured over photos, noisy and flat renders and
+textures (1024x768, optimize=True), so the predicted quality lands under the
+target rather than needing a third try. Only when even the lowest quality in
+the table can't fit is the image shrunk to FALLBACK_MAX_DIMENSION.
+"""
+
+import io
+import threading
+import time
+from typing import Dict, Optional
+
+from PIL import Image
+
+from token_cost import fit_within
+
+REFERENCE_QUALITY = 95
+SIZE_RATIOS = ((90, 0.75), (85, 0.62), (80, 0.54), (75, 0.48), (70, 0.45), (60, 0.40), (50, 0.36), (40, 0.32))
+MIN_QUALITY = SIZE_RATIOS[-1][0]
+FALLBACK_MAX_DIMENSION = 800
+# Aim a little under the target: the table is an envelope, not a bound
+TARGET_MARGIN = 0.95
+
+
+def predict_quality(reference_size: int, max_bytes: int) -> Optional[int]:
+    """Highest quality predicted to fit max_bytes, given the size at REFERENCE_QUALITY, or None"""
+    for quality, ratio in SIZE_RATIOS:
+        if reference_size * ratio <= max_bytes * TARGET_MARGIN:
+            return quality
+    return None
+
+
+def encode_jpeg(img: Image.Image, quality: int) -> memoryview:
+    """JPEG-encode img into memory; the view avoids copying the buffer out"""
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getbuffer()
+
+
+class JPEGEncoder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "images": 0,
+            "encodes": 0,
+            "single_encode": 0,
+            "two_encodes": 0,
+            "fallback_resizes": 0,
+            "over_target": 0,
+            "encode_seconds": 0.0,
+        }
+
+    def encode(self, img: Image.Image, max_bytes: int) -> memoryview:
+        """JPEG bytes for an RGB image, at the highest quality predicted to fit max_bytes"""
+        started = time.perf_counter()
+        encodes = 1
+        data = encode_jpeg(img, REFERENCE_QUALITY)
+        print(f"Compressed size: {len(data) / 1024:.1f} KB (quality {REFERENCE_QUALITY})")
+
+        reference_size = len(data)
+        resized = False
+        if reference_size > max_bytes:
+            quality = predict_quality(reference_size, max_bytes)
+            if quality is None:
+                # Too detailed for any acceptable quality at this size: shrink, then predict again
+                width, height = fit_within(*img.size, FALLBACK_MAX_DIMENSION)
+                if (width, height) != img.size:
+                    scale = width * height / (img.size[0] * img.size[1])
+                    img = img.resize((width, height), Image.Resampling.LANCZOS)
+                    reference_size *= scale
+                    resized = True
+                quality = predict_quality(reference_size, max_bytes) or MIN_QUALITY
+                print(f"Resized to: {width}x{height}")
+            data = encode_jpeg(img, quality)
+            encodes += 1
+            print(f"Compressed size: {len(data) / 1024:.1f} KB (quality {quality})")
+
+        self._record(encodes, resized, len(data) > max_bytes, time.perf_counter() - started)
+        return data
+
+    def _record(self, encodes: int, resized: bool, over_target: bool, seconds: float):
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["encodes"] += encodes
+            self._stats["single_encode" if encodes == 1 else "two_encodes"] += 1
+            self._stats["fallback_resizes"] += resized
+            self._stats["over_target"] += over_target
+            self._stats["encode_seconds"] += seconds
+
+    def counters(self) -> Dict:
+        """Raw counters, for merging into another encoder's"""
+        with self._lock:
+            return dict(self._stats)
+
+    def merge(self, counters: Dict):
+        """Add counters recorded by an encoder in another process"""
+        with self._lock:
+            for name, value in counters.items():
+                self._stats[name] += value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["encode_seconds"] = round(stats["encode_seconds"], 3)
+        stats["encodes_per_image"] = round(stats["encodes"] / stats["images"], 3) if stats["images"] else None
+        return stats
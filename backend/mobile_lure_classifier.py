@@ -4,20 +4,175 @@ Mobile-Optimized Lure Classifier: ChatGPT Vision + Comprehensive Fishing Databas
 Designed for mobile apps with API-first architecture
 """
 
+import asyncio
+import io
 import json
 import os
+import re
+import threading
+import time
+import httpx
 import requests
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 import base64
 from PIL import Image
 import datetime
 import config
+from result_cache import ResultCache, image_digest, cache_key
+from near_duplicate import NearDuplicateIndex
+from single_flight import SingleFlight, InFlightTimeoutError
+from vision_http import VisionHTTPClient, AsyncVisionHTTPClient
+from token_cost import TokenCostModel
+from decode_budget import DecodeBudget
+from jpeg_quality import JPEGEncoder
+from image_offload import ImageOffload, compress_image
+from auto_crop import crop_savings, find_crop_box
+from image_quality import QualityGate
+from structured_output import (
+    AnalysisFormatError, FIELDS, IMAGE_FIELD, BATCH_FIELD, parse_analysis, parse_batch, response_format, result_format,
+)
+from vision_resilience import VisionResilience, CircuitOpenError, DeadlineExceededError, RETRYABLE_STATUSES
+
+# Types the model falls back to when it can't see enough to pick a variant
+GENERAL_LURE_TYPES = {
+    "Unknown", "Spinnerbait", "Crankbait", "Jerkbait", "Topwater", "Soft Plastic Worm", "Swimbait",
+}
+
+# Compact field names (see structured_output), enforced by the response schema
+RESULT_FORMAT = result_format()
+
+SPECIFICITY_RULES = """IMPORTANT: Always choose the MOST SPECIFIC lure type that matches. For example:
+- If you see TWO spinning blades, choose "Double Blade Spinnerbait" NOT just "Spinnerbait"
+- If you see a square diving bill, choose "Squarebill Crankbait" NOT just "Crankbait"
+- If you see a paddle tail, choose "Paddle Tail Swimbait" NOT just "Swimbait"
+- If you see a curly tail, choose "Curly Tail Worm" NOT just "Soft Plastic Worm"
+- Only use general types (like "Spinnerbait", "Crankbait") if you cannot determine a more specific variant"""
+
+ANSWER_GUIDE = """Provide, for each lure image:
+1. Lure type - MUST be the most specific match from the list above (exact name including spaces and capitalization)
+2. Confidence level (0-100%)
+3. Key visual features you observe that support this specific classification
+4. Why you think it's this specific type (not a general category)
+5. Target fish species this lure would attract"""
+
+# The user message of a single-image request, ahead of the image
+IMAGE_PROMPT = "Classify the fishing lure in this image."
+
+
+def system_prompt(lure_database: Dict) -> str:
+    """
+    Instructions for every request, sent as the system message. Built once
+    per classifier from the lure database and never varied per request:
+    upstream prompt caching only reuses a byte-identical prefix.
+    """
+    lure_types = "\n".join(
+        f"- {name}{' (general)' if name in GENERAL_LURE_TYPES else ''}: {', '.join(info['visual_features'])}"
+        for name, info in lure_database.items()
+    )
+    return f"""You are an expert fishing tackle analyst. Analyze fishing lure images and provide a detailed classification.
+
+{SPECIFICITY_RULES}
+
+Available lure types, each with the visual features that identify it (use the most specific match):
+{lure_types}
+- Unknown: not a fishing lure, or too unclear to tell
+
+{ANSWER_GUIDE}
+
+Respond in JSON format:
+{RESULT_FORMAT}"""
+
+
+def batch_prompt(count: int) -> str:
+    """User message text for classifying count labelled images in one request"""
+    return f"""You are shown {count} fishing lure images, each preceded by its label ("Image 1", "Image 2", ...).
+Classify every image on its own. Respond with an object whose "{BATCH_FIELD}" array has one object per image,
+in label order. Each object has "{IMAGE_FIELD}" (the number from the image's label) plus the fields above."""
+
+# Stands in for base64 images while a request body is serialized (see _splice_images)
+IMAGE_PLACEHOLDER = "\x00image\x00"
+
+# Streaming mode, with a final chunk carrying token usage
+STREAM_OPTIONS = {"stream": True, "stream_options": {"include_usage": True}}
+
+# The lure type in a partly streamed answer, once its closing quote has arrived
+PARTIAL_LURE_TYPE = re.compile(r'"%s"\s*:\s*"([^"\\]+)"' % FIELDS["lure_type"])
+
+
+class TruncatedStreamError(Exception):
+    """A streamed answer carried a chunk that isn't valid JSON (cut off or garbled in transit)"""
+
+
+def cached_tokens(usage: Optional[Dict]) -> Optional[int]:
+    """Prompt tokens a response's usage block says came from upstream's prompt cache (None if not reported)"""
+    details = (usage or {}).get("prompt_tokens_details") or {}
+    return details.get("cached_tokens")
+
 
 class MobileLureClassifier:
-    def __init__(self, openai_api_key: str = None):
+    def __init__(self, openai_api_key: str = None, result_cache: ResultCache = None,
+                 near_duplicate_index: NearDuplicateIndex = None, single_flight: SingleFlight = None,
+                 http_client: VisionHTTPClient = None, resilience: VisionResilience = None,
+                 detail_routing: str = None, decode_budget: DecodeBudget = None,
+                 image_offload: ImageOffload = None, auto_crop: bool = None,
+                 quality_gate: QualityGate = None):
+        """
+        detail_routing: "off" sends one full-size image; "adaptive" sends a small
+        low-detail image first and re-queries at high detail only when the answer
+        is weak (see _escalation_reason). Defaults to config.DETAIL_ROUTING.
+        decode_budget: caps decode memory across this worker's concurrent scans.
+        image_offload: process pool for compression and hashing (default: from
+        config.IMAGE_OFFLOAD_WORKERS; None there runs them on the calling thread).
+        auto_crop: crop to the lure before resizing (default: config.AUTO_CROP_ENABLED).
+        quality_gate: rejects unusable photos before the API call (default: from
+        config.QUALITY_GATE_ENABLED).
+        """
         self.openai_api_key = openai_api_key
+        self.detail_routing = detail_routing or config.DETAIL_ROUTING
+        self._routing_lock = threading.Lock()
+        self._routing_stats = {
+            "low_detail_passes": 0, "accepted_low_detail": 0, "escalated": 0,
+            "escalated_low_confidence": 0, "escalated_general_type": 0, "escalated_low_pass_failed": 0,
+            "escalation_failed": 0,
+        }
+        self.http = http_client or VisionHTTPClient.from_config()
+        self.resilience = resilience or VisionResilience.from_config()
+        self.decode_budget = decode_budget or DecodeBudget.from_config()
+        self.jpeg_encoder = JPEGEncoder()
+        self.image_offload = image_offload or ImageOffload.from_config()
+        self.auto_crop = config.AUTO_CROP_ENABLED if auto_crop is None else auto_crop
+        self._crop_lock = threading.Lock()
+        self._crop_stats = {"cropped": 0, "not_cropped": 0, "errors": 0, "tiles_saved": 0, "image_tokens_saved": 0}
+        self.quality_gate = quality_gate or QualityGate.from_config()
+        self._probe_lock = threading.Lock()
+        self._probe_stats = {"exact": 0, "near_duplicate": 0, "misses": 0}
+        self._batch_lock = threading.Lock()
+        self._batch_stats = {"requests": 0, "images": 0, "fallbacks": 0, "seconds": 0.0,
+                             "prompt_tokens": 0, "completion_tokens": 0}
+        self._parse_lock = threading.Lock()
+        self._prompt_cache_lock = threading.Lock()
+        self._parse_stats = {"answers": 0, "parse_failures": 0, "completion_tokens": 0, "answers_with_usage": 0}
+        self._prompt_cache_stats = {"responses": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        self.async_http = AsyncVisionHTTPClient.from_config()
         self.lure_database = self._initialize_lure_database()
+        self.system_prompt = system_prompt(self.lure_database)
+        self.cost_model = TokenCostModel.from_config(self.system_prompt + IMAGE_PROMPT)
+        # The response schema's lure_type enum: every database type, or "Unknown"
+        self.lure_types = list(self.lure_database) + ["Unknown"]
+        self.response_format = response_format(self.lure_types)
+        self.batch_response_format = response_format(self.lure_types, batch=True)
         self.analysis_history = []
+        if result_cache is None and config.RESULT_CACHE_ENABLED:
+            result_cache = ResultCache.from_config()
+        self.result_cache = result_cache
+        # Near-duplicate matches resolve to result cache entries, so the index needs the cache
+        if near_duplicate_index is None and result_cache and config.NEAR_DUPLICATE_ENABLED:
+            near_duplicate_index = NearDuplicateIndex.from_config()
+        self.near_duplicate_index = near_duplicate_index if result_cache else None
+        # Followers in other workers pick up the leader's answer from the result cache
+        if single_flight is None and result_cache and config.SINGLE_FLIGHT_ENABLED:
+            single_flight = SingleFlight.from_config()
+        self.single_flight = single_flight if result_cache else None
         
     def _initialize_lure_database(self) -> Dict:
         """Initialize comprehensive database of fishing lure characteristics with expanded subcategories"""
@@ -725,151 +880,994 @@ class MobileLureClassifier:
             }
         }
     
-    def analyze_lure(self, image_path: str) -> Dict:
+    def analyze_lure(self, image_path: str, deadline: float = None, image_bytes: bytes = None,
+                     quality_checked: bool = False, progress: Callable[[str, Dict], None] = None) -> Dict:
         """
-        Analyze lure image using ChatGPT Vision API and return comprehensive results
+        Analyze lure image using ChatGPT Vision API and return comprehensive results.
+        Images that normalize to the same API payload (re-encodes, other EXIF)
+        are served from the result cache, and re-photographed lures from their
+        nearest perceptual-hash neighbour, without calling the API.
+        Blurry, dark or empty photos get a "retake photo" result from the quality gate.
+        deadline: time.monotonic() value the API call (retries included) must finish by.
+        image_bytes: the upload, when the caller already has it in memory; the
+        file is then never read and image_path only labels the result.
+        quality_checked: the caller already ran self.quality_gate on the image.
+        progress(event, data): reports "compressed", "sent", "model_streaming"
+        and "lure_type" as the API call gets there; the call then uses the
+        API's streaming mode, so the lure type is reported as soon as the model
+        has written it. Cache hits and coalesced calls report nothing.
         """
         if not self.openai_api_key:
             return {"error": "OpenAI API key not provided"}
         
+        if image_bytes is None:
+            try:
+                image_bytes = self._read_image(image_path)
+            except OSError as e:
+                return {"error": f"Analysis failed: {str(e)}"}
+        
+        key = self._result_cache_key(image_bytes)
+        if key:
+            cached = self._cached_result(key, image_path)
+            if cached is not None:
+                print("[INFO] Result cache hit - skipping ChatGPT Vision API call")
+                return cached
+        
+        rejection = None if quality_checked else self._check_quality(image_bytes, image_path)
+        if rejection:
+            return rejection
+        
+        if not key or not self.single_flight:
+            return self._analyze_and_remember(key, image_path, deadline, image_bytes, progress)
+        
+        # Concurrent requests for the same image share one upstream call
         try:
-            # Compress image for API efficiency
-            print("[INFO] Compressing image for API...")
-            compressed_path = self._compress_image_for_api(image_path)
-            
-            # Encode compressed image to base64
-            with open(compressed_path, "rb") as image_file:
-                encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            print(f"[INFO] Compressed image size: {len(encoded_image)} characters (base64)")
-            
-            # ChatGPT Vision API request
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.openai_api_key}"
-            }
+            results, shared = self.single_flight.do(
+                key,
+                lambda: self._analyze_and_remember(key, image_path, deadline, image_bytes, progress),
+                lookup=lambda: self._cached_result(key, image_path),
+                deadline=deadline,
+            )
+        except InFlightTimeoutError:
+            print("[WARNING] Deadline passed waiting for an in-flight analysis of the same image")
+            return {"error": "The same image is still being analysed", "retryable": True}
+        if shared:
+            print("[INFO] Coalesced with an in-flight analysis of the same image")
+            results = dict(results, image_path=image_path, coalesced=True)
+        return results
+    
+    def _analyze_and_remember(self, key, image_path: str, deadline: float = None,
+                              image_bytes: bytes = None, progress: Callable[[str, Dict], None] = None) -> Dict:
+        """
+        Normalized-image cache lookup and near-duplicate check, then the API
+        call, then store the outcome in the caches. key is the upload's own
+        key (see _result_cache_key); the result is stored under the normalized
+        image's key with key as an alias.
+        """
+        reused, first_pass, normalized_key, perceptual_hash = self._before_api_call(key, image_path, image_bytes)
+        if reused is not None:
+            return reused
+        
+        results = self._analyze_uncached(image_path, deadline, image_bytes, progress, first_pass=first_pass)
+        if key:
+            self._remember_result(normalized_key, results, perceptual_hash, alias=key)
+        return results
+    
+    def _before_api_call(self, key, image_path: str, image_bytes: bytes):
+        """
+        The cache steps of _analyze_and_remember ahead of the API call, shared
+        with the async path: (reused result or None, first pass, normalized
+        key, perceptual hash). Without key (no result cache) nothing is reused.
+        """
+        if not key:
+            return None, None, None, None
+        
+        first_pass = self._first_pass(image_bytes)
+        normalized_key = self._normalized_cache_key(first_pass)
+        cached = self._cached_alias(normalized_key, key, image_path)
+        if cached is not None:
+            print("[INFO] Result cache hit on the normalized image - skipping ChatGPT Vision API call")
+            return cached, first_pass, normalized_key, None
+        
+        perceptual_hash = self._perceptual_hash(image_bytes)
+        if perceptual_hash is not None:
+            near_duplicate = self._near_duplicate_result(perceptual_hash, image_path)
+            if near_duplicate:
+                return near_duplicate, first_pass, normalized_key, perceptual_hash
+        return None, first_pass, normalized_key, perceptual_hash
+    
+    def _remember_result(self, key: str, results: Dict, perceptual_hash=None, alias: str = None):
+        """
+        Store an analysis outcome in the result cache (and near-duplicate
+        index) under the normalized image's key, and under alias (the raw
+        upload's key) when it differs
+        """
+        keys = [key] if alias in (None, key) else [key, alias]
+        if "error" in results:
+            # Transient upstream trouble says nothing about this image
+            if not results.get("retryable"):
+                for each in keys:
+                    self.result_cache.set(each, {"error": results["error"]}, negative=True)
+            return
+        
+        entry = {
+            "lure_type": results["lure_type"],
+            "confidence": results["confidence"],
+            "chatgpt_analysis": results["chatgpt_analysis"],
+            "lure_details": results["lure_details"],
+            "analysis_method": results["analysis_method"],
+        }
+        for each in keys:
+            self.result_cache.set(each, entry)
+        if perceptual_hash is not None:
+            self.near_duplicate_index.add(perceptual_hash, key)
+    
+    def _cached_alias(self, normalized_key: str, alias: str, image_path: str):
+        """
+        Result stored under the normalized image's key, or None on a miss.
+        A successful one is copied to alias so the next identical upload
+        skips normalizing.
+        """
+        cached = self.result_cache.get(normalized_key)
+        if cached is None:
+            return None
+        if "error" not in cached and alias != normalized_key:
+            self.result_cache.set(alias, cached)
+        return self._result_from_cache(cached, image_path)
+    
+    def _cached_result(self, key: str, image_path: str):
+        """Result for key from the result cache, or None on a miss"""
+        cached = self.result_cache.get(key)
+        if cached is None:
+            return None
+        return self._result_from_cache(cached, image_path)
+    
+    @staticmethod
+    def _read_image(image_path: str) -> bytes:
+        with open(image_path, "rb") as image_file:
+            return image_file.read()
+    
+    def _result_cache_key(self, image_bytes: bytes):
+        """
+        Cache key of the upload's own bytes, or None when caching is off. It
+        only finds byte-identical repeats (and answers /api/scan-probe, whose
+        clients hash what they upload); results are keyed by the normalized
+        image (_normalized_cache_key), with this key as an alias.
+        """
+        if not self.result_cache:
+            return None
+        return cache_key(image_digest(image_bytes))
+    
+    @staticmethod
+    def _normalized_cache_key(first_pass) -> str:
+        """Cache key of the JPEG the first API request sends (see _first_pass)"""
+        return cache_key(image_digest(first_pass[1]))
+    
+    def _first_pass(self, image_bytes: bytes):
+        """
+        (crop box, JPEG) of the image's first API request: the low-detail
+        pass with adaptive routing, else the only one. Re-encodes and EXIF
+        differences of one photo normalize to the same JPEG.
+        """
+        crop = self._crop_box(image_bytes)
+        detail = "low" if self.detail_routing == "adaptive" else None
+        return crop, self._compress_image_for_api(image_bytes, detail=detail, crop=crop)
+    
+    def _perceptual_hash(self, image_bytes: bytes):
+        """Perceptual hash for the near-duplicate index, or None when it's off"""
+        if not self.near_duplicate_index:
+            return None
+        try:
+            if self.image_offload:
+                return self.image_offload.perceptual_hash(image_bytes, self.near_duplicate_index.algorithm)
+            return self.near_duplicate_index.hash_image(io.BytesIO(image_bytes))
+        except Exception as e:
+            print(f"[WARNING] Perceptual hash failed: {str(e)}")
+            return None
+    
+    def _near_duplicate_result(self, perceptual_hash: int, image_path: str):
+        """
+        Reuse the result of a previously analysed, visually near-identical
+        image: the closest neighbour under this model whose result is still
+        cached. Neighbours whose result has expired or been evicted are
+        dropped from the index.
+        """
+        for match in self.near_duplicate_index.find(perceptual_hash, config.CHATGPT_MODEL):
+            cached = self.result_cache.get(match["cache_key"])
+            if cached is None:
+                self.near_duplicate_index.remove(match["id"])
+                continue
+            if "error" in cached:
+                continue
             
-            payload = {
-                "model": config.CHATGPT_MODEL,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """Analyze this fishing lure image and provide a detailed classification.
-
-IMPORTANT: Always choose the MOST SPECIFIC lure type that matches. For example:
-- If you see TWO spinning blades, choose "Double Blade Spinnerbait" NOT just "Spinnerbait"
-- If you see a square diving bill, choose "Squarebill Crankbait" NOT just "Crankbait"
-- If you see a paddle tail, choose "Paddle Tail Swimbait" NOT just "Swimbait"
-- If you see a curly tail, choose "Curly Tail Worm" NOT just "Soft Plastic Worm"
-- Only use general types (like "Spinnerbait", "Crankbait") if you cannot determine a more specific variant
-
-Available lure types (use the most specific match):
-Spinnerbaits: Single Blade Spinnerbait, Double Blade Spinnerbait, Inline Spinner, Spinnerbait (general)
-Crankbaits: Deep Diving Crankbait, Shallow Crankbait, Squarebill Crankbait, Lipless Crankbait, Medium Diving Crankbait, Crankbait (general)
-Jerkbaits: Suspending Jerkbait, Floating Jerkbait, Sinking Jerkbait, Jerkbait (general)
-Topwater: Topwater Popper, Walking Bait, Buzzbait, Prop Bait, Frog, Topwater (general)
-Worms: Straight Tail Worm, Curly Tail Worm, Ribbon Tail Worm, Finesse Worm, Senko Stick Bait, Soft Plastic Worm (general)
-Swimbaits: Paddle Tail Swimbait, Curly Tail Swimbait, Hard Body Swimbait, Swimbait (general)
-Other: Jig, Chatterbait, Tube, Grub, Minnow, Spoon, Creature Bait, Crawfish Imitation
-
-Provide:
-1. Lure type - MUST be the most specific match from the list above (exact name including spaces and capitalization)
-2. Confidence level (0-100%)
-3. Key visual features you observe that support this specific classification
-4. Why you think it's this specific type (not a general category)
-5. Target fish species this lure would attract
-                                
-Respond in JSON format:
-{
-    "lure_type": "exact type name from list above",
-    "confidence": percentage,
-    "visual_features": ["feature1", "feature2"],
-    "reasoning": "explanation why this specific type not general category",
-    "target_species": ["species1", "species2"]
-}"""
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{encoded_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": config.MAX_TOKENS
-            }
+            print(f"[INFO] Near-duplicate match (distance {match['distance']}) - skipping ChatGPT Vision API call")
+            results = self._result_from_cache(cached, image_path)
+            results["near_duplicate"] = True
+            results["near_duplicate_distance"] = match["distance"]
+            return results
+        return None
+    
+    def probe_cache(self, digest: str, perceptual_hash: int = None) -> Optional[Dict]:
+        """
+        Cached result for an image known only by its SHA-256 digest (and,
+        optionally, its perceptual hash), for clients deciding whether to
+        upload it at all. Near-duplicate matches are marked as such; cached
+        failures count as misses.
+        """
+        results = None
+        if self.result_cache:
+            cached = self.result_cache.get(cache_key(digest))
+            if cached is not None and "error" not in cached:
+                results = self._result_from_cache(cached, None)
+        if results is None and perceptual_hash is not None and self.near_duplicate_index:
+            results = self._near_duplicate_result(perceptual_hash, None)
+        
+        outcome = "misses" if results is None else "near_duplicate" if results.get("near_duplicate") else "exact"
+        with self._probe_lock:
+            self._probe_stats[outcome] += 1
+        return results
+    
+    def _result_from_cache(self, cached: Dict, image_path: str) -> Dict:
+        """Rebuild an analyze_lure result from a cached entry"""
+        if "error" in cached:
+            return {"error": cached["error"], "cached": True}
+        
+        results = dict(cached)
+        results.update({
+            "success": True,
+            "image_path": image_path,
+            "cached": True,
+            "analysis_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        return results
+    
+    def get_stats(self) -> Dict:
+        """Runtime counters for monitoring"""
+        return {
+            "result_cache": self.result_cache.stats() if self.result_cache else None,
+            "near_duplicate_index": self.near_duplicate_index.stats() if self.near_duplicate_index else None,
+            "single_flight": self.single_flight.stats() if self.single_flight else None,
+            "http": self.http.stats(),
+            "http_async": self.async_http.stats(),
+            "resilience": self.resilience.stats(),
+            "detail_routing": self._detail_routing_stats(),
+            "decode_budget": self.decode_budget.stats(),
+            "jpeg_encoder": self.jpeg_encoder.stats(),
+            "image_offload": self.image_offload.stats() if self.image_offload else None,
+            "auto_crop": self._auto_crop_stats(),
+            "quality_gate": self.quality_gate.stats() if self.quality_gate else None,
+            "probe": self._probe_counts(),
+            "batch": self._batch_counts(),
+            "structured_output": self._parse_counts(),
+            "prompt_cache": self._prompt_cache_counts(),
+        }
+    
+    def _probe_counts(self) -> Dict:
+        with self._probe_lock:
+            return dict(self._probe_stats)
+    
+    def _analyze_uncached(self, image_path: str, deadline: float = None, image_bytes: bytes = None,
+                          progress: Callable[[str, Dict], None] = None, first_pass=None) -> Dict:
+        """
+        Run the ChatGPT Vision API analysis for an image, routed through a
+        low-detail first pass when detail_routing is "adaptive".
+        first_pass: the image's _first_pass, when the caller already made it.
+        """
+        if image_bytes is None:
+            image_bytes = self._read_image(image_path)
+        crop, jpeg = first_pass or (self._crop_box(image_bytes), None)
+        if self.detail_routing != "adaptive":
+            return self._query_vision(image_path, image_bytes, deadline, crop=crop, progress=progress, jpeg=jpeg)
+        
+        low = self._query_vision(image_path, image_bytes, deadline, detail="low", crop=crop, progress=progress,
+                                 jpeg=jpeg)
+        reason = self._escalation_reason(low)
+        if reason is None:
+            return self._routed_result(low, None)
+        
+        print(f"[INFO] Escalating to high detail ({reason})")
+        high = self._query_vision(image_path, image_bytes, deadline, detail="high", crop=crop, progress=progress)
+        return self._routed_result(low, high, reason)
+    
+    def _query_vision(self, image_path: str, image_bytes: bytes, deadline: float = None,
+                      detail: str = None, crop=None, progress: Callable[[str, Dict], None] = None,
+                      jpeg: bytes = None) -> Dict:
+        """
+        One ChatGPT Vision API request for an image, with retries and the
+        circuit breaker from self.resilience. detail="low" sends a small image;
+        crop (from _crop_box) sends only that part of it. With progress (see
+        analyze_lure) the answer is streamed. jpeg: the image already
+        compressed for this detail and crop.
+        Everything happens in memory: no temp files on the way to the API.
+        """
+        try:
+            if jpeg is None:
+                # Compress image for API efficiency
+                print("[INFO] Compressing image for API...")
+                jpeg = self._compress_image_for_api(image_bytes, detail=detail, crop=crop)
+            encoded = self._encode_image(jpeg)
+            if progress:
+                progress("compressed", {"bytes": len(jpeg), "detail": detail})
             
             print("[INFO] Sending request to ChatGPT Vision API...")
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
+            headers = self._api_headers()
+            response = text = None
+            if progress:
+                body = self._build_body(encoded, detail, stream=True)
+                response = self.resilience.call(self._streaming_sender(headers, body, detail, progress), deadline)
+                try:
+                    text = self._read_stream(response, progress, deadline, detail)
+                except TruncatedStreamError as e:
+                    # Says nothing about the image: ask again for the whole answer at once
+                    print(f"[WARNING] {e} - retrying without streaming")
+            if text is None:
+                body = self._build_body(encoded, detail)
+                response = self.resilience.call(
+                    lambda budget: self.http.post("/chat/completions", headers, budget=budget, data=body),
+                    deadline,
+                )
+                text = response.text
             
             print(f"DEBUG: ChatGPT API response status: {response.status_code}")
-            print(f"DEBUG: ChatGPT API response: {response.text}")
+            print(f"DEBUG: ChatGPT API response: {text}")
             
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
+            results = self._parse_api_response(response.status_code, text, image_path)
+            self._observe_usage(results, jpeg, detail)
+            self._record_crop(results, image_bytes, crop, detail)
+            return results
                 
-                # Try to parse JSON response (handle markdown code blocks)
+        except Exception as e:
+            return self._request_failure(e)
+    
+    def _streaming_sender(self, headers: Dict, body: bytes, detail: str, progress: Callable[[str, Dict], None]):
+        """send(budget) for self.resilience.call that posts a streaming request and reports each attempt"""
+        attempts = [0]
+        
+        def send(budget):
+            attempts[0] += 1
+            progress("sent", {"attempt": attempts[0], "detail": detail})
+            response = self.http.post("/chat/completions", headers, budget=budget, data=body, stream=True)
+            if response.status_code != 200:
+                # Read the (short) error body so the connection goes back to the pool
+                response.content
+            return response
+        
+        return send
+    
+    def _read_stream(self, response: requests.Response, progress: Callable[[str, Dict], None],
+                     deadline: float = None, detail: str = None) -> str:
+        """
+        The body of a streamed response, reassembled into the body a
+        non-streamed request would have got. Reports "model_streaming" at the
+        first token and "lure_type" as soon as the answer contains it.
+        """
+        if response.status_code != 200:
+            return response.text
+        
+        content, usage, lure_type = "", None, None
+        with response:
+            for line in response.iter_lines():
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DeadlineExceededError()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
                 try:
-                    # Remove markdown code blocks if present
-                    if content.startswith('```json'):
-                        content = content.replace('```json', '').replace('```', '').strip()
-                    elif content.startswith('```'):
-                        content = content.replace('```', '').strip()
-                    
-                    chatgpt_analysis = json.loads(content)
-                    
-                    # Get lure type and confidence
-                    lure_type = chatgpt_analysis.get("lure_type", "Unknown")
-                    confidence = chatgpt_analysis.get("confidence", 0)
-                    
-                    # Post-process: Upgrade generic types to specific ones based on visual features
-                    lure_type = self._upgrade_lure_type_specificity(lure_type, chatgpt_analysis)
-                    
-                    # Get detailed lure information from database
-                    lure_info = self.get_lure_info(lure_type)
-                    
-                    # Store in history
-                    self.analysis_history.append({
-                        "timestamp": datetime.datetime.now().isoformat(),
-                        "image_path": image_path,
-                        "lure_type": lure_type,
-                        "confidence": confidence,
-                        "analysis": chatgpt_analysis
-                    })
-                    
-                    # Return comprehensive results
-                    return {
-                        "success": True,
-                        "image_path": image_path,
-                        "lure_type": lure_type,
-                        "confidence": confidence,
-                        "chatgpt_analysis": chatgpt_analysis,
-                        "lure_details": lure_info,
-                        "analysis_method": "ChatGPT Vision API",
-                        "analysis_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    }
-                    
-                except json.JSONDecodeError:
-                    print(f"[WARNING] JSON parsing failed, raw response: {content}")
-                    return {"error": f"Failed to parse ChatGPT response: {content}"}
-            else:
-                return {"error": f"API request failed: {response.status_code} - {response.text}"}
-                
+                    chunk = json.loads(data)
+                except ValueError:
+                    raise TruncatedStreamError(f"Malformed chunk in streamed answer: {data[:80]!r}")
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if not delta:
+                        continue
+                    if not content:
+                        progress("model_streaming", {"detail": detail})
+                    content += delta
+                if lure_type is None and content:
+                    match = PARTIAL_LURE_TYPE.search(content)
+                    if match:
+                        lure_type = match.group(1)
+                        progress("lure_type", {"lure_type": lure_type, "detail": detail})
+        
+        return json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
+    
+    def _request_failure(self, error: Exception) -> Dict:
+        """Result for an exception raised while calling the API on the sync client"""
+        if isinstance(error, CircuitOpenError):
+            return self._circuit_open_result(error)
+        if isinstance(error, DeadlineExceededError):
+            return {"error": "Analysis deadline exceeded", "retryable": True}
+        if isinstance(error, requests.Timeout):
+            return {"error": "API request timed out", "retryable": True}
+        if isinstance(error, requests.ConnectionError):
+            return {"error": f"Analysis failed: {str(error)}", "retryable": True}
+        return {"error": f"Analysis failed: {str(error)}"}
+    
+    def analyze_lure_batch(self, image_paths: List[str], deadline: float = None,
+                           images: List[bytes] = None) -> List[Dict]:
+        """
+        Classify several lure photos (a tackle tray) in as few API requests as
+        possible, one analyze_lure-style result per photo, in order.
+        Photos the result cache knows are answered from it and unusable ones
+        get the quality gate's result; the rest go up to BATCH_MAX_IMAGES at a
+        time as labelled images in one request, sharing its prompt and round
+        trip. A photo the batch answer leaves out is retried on its own. With
+        adaptive detail routing the batch is the low-detail pass and weak
+        answers are escalated one photo at a time.
+        images: the photos' bytes, when the caller already has them in memory.
+        """
+        if not self.openai_api_key:
+            return [{"error": "OpenAI API key not provided"} for _ in image_paths]
+        
+        results: List[Optional[Dict]] = [None] * len(image_paths)
+        pending = []
+        for index, image_path in enumerate(image_paths):
+            try:
+                image_bytes = images[index] if images is not None else self._read_image(image_path)
+            except OSError as e:
+                results[index] = {"error": f"Analysis failed: {str(e)}"}
+                continue
+            key = self._result_cache_key(image_bytes)
+            cached = self._cached_result(key, image_path) if key else None
+            results[index] = cached or self._check_quality(image_bytes, image_path)
+            if results[index] is not None:
+                continue
+            first_pass = self._first_pass(image_bytes)
+            if key:
+                results[index] = self._cached_alias(self._normalized_cache_key(first_pass), key, image_path)
+            if results[index] is None:
+                pending.append((index, key, image_bytes, first_pass))
+        
+        size = max(1, config.BATCH_MAX_IMAGES)
+        for start in range(0, len(pending), size):
+            group = pending[start:start + size]
+            paths = [image_paths[index] for index, _, _, _ in group]
+            analysed = self._analyze_group(paths, [image_bytes for _, _, image_bytes, _ in group], deadline,
+                                           [first_pass for _, _, _, first_pass in group])
+            for (index, key, _, first_pass), result in zip(group, analysed):
+                if key:
+                    self._remember_result(self._normalized_cache_key(first_pass), result, alias=key)
+                results[index] = result
+        return results
+    
+    def _analyze_group(self, image_paths: List[str], images: List[bytes], deadline: float = None,
+                       first_passes: List = None) -> List[Dict]:
+        """One batch request for the group, then single-image fallbacks and escalations"""
+        first_passes = first_passes or [self._first_pass(image_bytes) for image_bytes in images]
+        if len(images) == 1:
+            return [self._analyze_uncached(image_paths[0], deadline, images[0], first_pass=first_passes[0])]
+        
+        crops = [crop for crop, _ in first_passes]
+        detail = "low" if self.detail_routing == "adaptive" else None
+        answers = self._query_vision_batch(image_paths, images, deadline, detail, crops,
+                                           [jpeg for _, jpeg in first_passes])
+        
+        results = []
+        for image_path, image_bytes, (crop, jpeg), answer in zip(image_paths, images, first_passes, answers):
+            if answer is None:
+                with self._batch_lock:
+                    self._batch_stats["fallbacks"] += 1
+                answer = self._query_vision(image_path, image_bytes, deadline, detail=detail, crop=crop, jpeg=jpeg)
+            if detail == "low":
+                reason = self._escalation_reason(answer)
+                high = None
+                if reason is not None:
+                    print(f"[INFO] Escalating {image_path} to high detail ({reason})")
+                    high = self._query_vision(image_path, image_bytes, deadline, detail="high", crop=crop)
+                answer = self._routed_result(answer, high, reason)
+            results.append(answer)
+        return results
+    
+    def _query_vision_batch(self, image_paths: List[str], images: List[bytes], deadline: float = None,
+                            detail: str = None, crops: List = None, jpegs: List[bytes] = None) -> List[Optional[Dict]]:
+        """
+        One ChatGPT Vision API request for several images (see _query_vision).
+        A failed request fails every image; an image the answer leaves out is None.
+        """
+        crops = crops or [None] * len(images)
+        started = time.perf_counter()
+        try:
+            jpegs = jpegs or [self._compress_image_for_api(image_bytes, detail=detail, crop=crop)
+                              for image_bytes, crop in zip(images, crops)]
+            body = self._build_batch_body([self._encode_image(jpeg) for jpeg in jpegs], detail)
+            
+            print(f"[INFO] Sending {len(jpegs)} images to ChatGPT Vision API in one request...")
+            headers = self._api_headers()
+            response = self.resilience.call(
+                lambda budget: self.http.post("/chat/completions", headers, budget=budget, data=body),
+                deadline,
+            )
+            results = self._parse_batch_response(response.status_code, response.text, image_paths)
+        except Exception as e:
+            failure = self._request_failure(e)
+            return [dict(failure) for _ in image_paths]
+        
+        for result, image_bytes, crop in zip(results, images, crops):
+            if result is not None:
+                self._record_crop(result, image_bytes, crop, detail)
+        self._record_batch(response, len(images), time.perf_counter() - started)
+        return results
+    
+    def _record_batch(self, response: requests.Response, count: int, seconds: float):
+        usage = {}
+        if response.status_code == 200:
+            usage = response.json().get("usage") or {}
+        with self._batch_lock:
+            self._batch_stats["requests"] += 1
+            self._batch_stats["images"] += count
+            self._batch_stats["seconds"] += seconds
+            self._batch_stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self._batch_stats["completion_tokens"] += usage.get("completion_tokens", 0)
+    
+    def _batch_counts(self) -> Dict:
+        with self._batch_lock:
+            stats = dict(self._batch_stats)
+        images = stats["images"]
+        stats["max_images"] = config.BATCH_MAX_IMAGES
+        stats["seconds_per_image"] = round(stats.pop("seconds") / images, 3) if images else None
+        stats["prompt_tokens_per_image"] = round(stats["prompt_tokens"] / images) if images else None
+        return stats
+    
+    async def analyze_lure_async(self, image_path: str, deadline: float = None, image_bytes: bytes = None,
+                                 quality_checked: bool = False) -> Dict:
+        """
+        Coroutine version of analyze_lure for asyncio servers and batch jobs.
+        
+        The API round trip is awaited on a non-blocking HTTP client, so many
+        classifications can be in flight in one process. Compression and the
+        cache and near-duplicate lookups run in the default executor. Like
+        analyze_lure, concurrent calls for the same image share one upstream
+        call (SingleFlight.do_async). Parsing and lure type post-processing
+        are shared with the sync path.
+        """
+        if not self.openai_api_key:
+            return {"error": "OpenAI API key not provided"}
+        
+        loop = asyncio.get_running_loop()
+        if image_bytes is None:
+            try:
+                image_bytes = await loop.run_in_executor(None, self._read_image, image_path)
+            except OSError as e:
+                return {"error": f"Analysis failed: {str(e)}"}
+        
+        key = self._result_cache_key(image_bytes)
+        if key:
+            cached = await loop.run_in_executor(None, self._cached_result, key, image_path)
+            if cached is not None:
+                print("[INFO] Result cache hit - skipping ChatGPT Vision API call")
+                return cached
+        
+        if not quality_checked:
+            rejection = await loop.run_in_executor(None, self._check_quality, image_bytes, image_path)
+            if rejection:
+                return rejection
+        
+        if not key or not self.single_flight:
+            return await self._analyze_and_remember_async(key, image_path, deadline, image_bytes)
+        
+        try:
+            results, shared = await self.single_flight.do_async(
+                key,
+                lambda: self._analyze_and_remember_async(key, image_path, deadline, image_bytes),
+                lookup=lambda: self._cached_result(key, image_path),
+                deadline=deadline,
+            )
+        except InFlightTimeoutError:
+            print("[WARNING] Deadline passed waiting for an in-flight analysis of the same image")
+            return {"error": "The same image is still being analysed", "retryable": True}
+        if shared:
+            print("[INFO] Coalesced with an in-flight analysis of the same image")
+            results = dict(results, image_path=image_path, coalesced=True)
+        return results
+    
+    async def _analyze_and_remember_async(self, key, image_path: str, deadline: float = None,
+                                          image_bytes: bytes = None) -> Dict:
+        """_analyze_and_remember with the API calls awaited on the async client"""
+        loop = asyncio.get_running_loop()
+        reused, first_pass, normalized_key, perceptual_hash = await loop.run_in_executor(
+            None, self._before_api_call, key, image_path, image_bytes
+        )
+        if reused is not None:
+            return reused
+        
+        crop, jpeg = first_pass or await loop.run_in_executor(None, self._first_pass, image_bytes)
+        if self.detail_routing != "adaptive":
+            results = await self._query_vision_async(image_path, image_bytes, deadline, crop=crop, jpeg=jpeg)
+        else:
+            low = await self._query_vision_async(image_path, image_bytes, deadline, detail="low", crop=crop,
+                                                 jpeg=jpeg)
+            reason = self._escalation_reason(low)
+            high = None
+            if reason is not None:
+                print(f"[INFO] Escalating to high detail ({reason})")
+                high = await self._query_vision_async(image_path, image_bytes, deadline, detail="high", crop=crop)
+            results = self._routed_result(low, high, reason)
+        
+        if key:
+            await loop.run_in_executor(None, self._remember_result, normalized_key, results, perceptual_hash, key)
+        return results
+    
+    async def _query_vision_async(self, image_path: str, image_bytes: bytes, deadline: float = None,
+                                  detail: str = None, crop=None, jpeg: bytes = None) -> Dict:
+        """_query_vision on the async HTTP client"""
+        loop = asyncio.get_running_loop()
+        try:
+            if jpeg is None:
+                jpeg = await loop.run_in_executor(
+                    None, lambda: self._compress_image_for_api(image_bytes, detail=detail, crop=crop)
+                )
+            body = self._build_body(self._encode_image(jpeg), detail)
+            
+            headers = self._api_headers()
+            response = await self.resilience.call_async(
+                lambda budget: self.async_http.post("/chat/completions", headers, budget=budget, content=body),
+                deadline,
+            )
+            results = self._parse_api_response(response.status_code, response.text, image_path)
+            self._observe_usage(results, jpeg, detail)
+            self._record_crop(results, image_bytes, crop, detail)
+        except CircuitOpenError as e:
+            results = self._circuit_open_result(e)
+        except DeadlineExceededError:
+            results = {"error": "Analysis deadline exceeded", "retryable": True}
+        except httpx.TimeoutException:
+            results = {"error": "API request timed out", "retryable": True}
+        except httpx.TransportError as e:
+            results = {"error": f"Analysis failed: {str(e)}", "retryable": True}
+        except Exception as e:
+            results = {"error": f"Analysis failed: {str(e)}"}
+        return results
+    
+    def _check_quality(self, image_bytes: bytes, image_path: str) -> Optional[Dict]:
+        """The quality gate's "retake photo" result for an unusable photo, else None"""
+        if not self.quality_gate:
+            return None
+        rejection = self.quality_gate.check(image_bytes)
+        return dict(rejection, image_path=image_path) if rejection else None
+    
+    def _crop_box(self, image_bytes: bytes):
+        """Lure bounding box to crop to (see auto_crop.find_crop_box), or None"""
+        if not self.auto_crop:
+            return None
+        try:
+            box = find_crop_box(image_bytes)
         except Exception as e:
-            return {"error": f"Analysis failed: {str(e)}"}
-        finally:
-            # Clean up compressed image
-            if 'compressed_path' in locals():
-                self._cleanup_compressed_image(compressed_path)
+            print(f"[WARNING] Auto-crop failed, sending the whole image: {str(e)}")
+            with self._crop_lock:
+                self._crop_stats["errors"] += 1
+            return None
+        with self._crop_lock:
+            self._crop_stats["cropped" if box else "not_cropped"] += 1
+        return box
+    
+    def _record_crop(self, results: Dict, image_bytes: bytes, crop, detail: str = None):
+        """Add the crop box and the tiles/tokens it saved to a successful result"""
+        if not crop or "error" in results:
+            return
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                size = img.size
+            savings = crop_savings(size, crop, self._max_dimension(detail), detail, self.cost_model.pricing_for())
+        except Exception as e:
+            print(f"[WARNING] Could not compute auto-crop savings: {str(e)}")
+            return
+        results["auto_crop"] = savings
+        with self._crop_lock:
+            self._crop_stats["tiles_saved"] += savings["tiles_before"] - savings["tiles_after"]
+            self._crop_stats["image_tokens_saved"] += savings["image_tokens_saved"]
+    
+    def _auto_crop_stats(self) -> Dict:
+        with self._crop_lock:
+            stats = dict(self._crop_stats)
+        stats["enabled"] = self.auto_crop
+        return stats
+    
+    def _max_dimension(self, detail: str = None) -> int:
+        return config.LOW_DETAIL_MAX_DIMENSION if detail == "low" else config.MAX_IMAGE_DIMENSION
+    
+    def _observe_usage(self, results: Dict, jpeg: bytes, detail: str = None):
+        """Calibrate the cost model's prompt token count from a response's usage block"""
+        usage = results.get("token_usage")
+        if not usage:
+            return
+        try:
+            with Image.open(io.BytesIO(jpeg)) as sent:
+                sent_size = sent.size
+        except Exception:
+            return
+        self.cost_model.observe(config.CHATGPT_MODEL, detail, sent_size, usage)
+    
+    def _escalation_reason(self, results: Dict):
+        """Why a low-detail answer isn't good enough, or None to accept it"""
+        if "error" in results:
+            # Upstream trouble won't be fixed by a bigger image
+            return None if results.get("retryable") else "low_pass_failed"
+        if results["lure_type"] in GENERAL_LURE_TYPES:
+            return "general_type"
+        if self._confidence_value(results.get("confidence")) < config.ESCALATION_CONFIDENCE_THRESHOLD:
+            return "low_confidence"
+        return None
+    
+    def _routed_result(self, low: Dict, high: Dict = None, reason: str = None) -> Dict:
+        """Pick the answer to return after the low-detail pass and an optional escalation"""
+        with self._routing_lock:
+            self._routing_stats["low_detail_passes"] += 1
+            if high is None:
+                self._routing_stats["accepted_low_detail"] += 1
+            else:
+                self._routing_stats["escalated"] += 1
+                self._routing_stats[f"escalated_{reason}"] += 1
+                if "error" in high:
+                    self._routing_stats["escalation_failed"] += 1
+        
+        if high is None:
+            results, detail = low, "low"
+        elif "error" in high and "error" not in low:
+            # A weak answer beats no answer
+            results, detail = low, "low"
+        else:
+            results, detail = high, "high"
+        
+        if "error" not in results:
+            results["detail"] = detail
+            results["escalated"] = high is not None
+        return results
+    
+    def _detail_routing_stats(self) -> Dict:
+        with self._routing_lock:
+            stats = dict(self._routing_stats)
+        stats["mode"] = self.detail_routing
+        stats["confidence_threshold"] = config.ESCALATION_CONFIDENCE_THRESHOLD
+        passes = stats["low_detail_passes"]
+        stats["escalation_rate"] = round(stats["escalated"] / passes, 4) if passes else 0.0
+        return stats
+    
+    @staticmethod
+    def _confidence_value(confidence) -> float:
+        """Model confidence as a number (it sometimes answers "85%")"""
+        try:
+            return float(str(confidence).rstrip("%"))
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def _circuit_open_result(self, error: CircuitOpenError) -> Dict:
+        print(f"[WARNING] Skipping ChatGPT Vision API call: {error}")
+        return {
+            "error": "Vision API temporarily unavailable",
+            "retryable": True,
+            "retry_after": max(1, round(error.retry_after)),
+        }
+    
+    def _encode_image(self, jpeg) -> bytes:
+        """Base64-encode the compressed image (bytes or a memoryview) for the data URL"""
+        encoded_image = base64.b64encode(jpeg)
+        
+        print(f"[INFO] Compressed image size: {len(encoded_image)} characters (base64)")
+        return encoded_image
+    
+    def _build_body(self, encoded_image: bytes, detail: str = None, stream: bool = False) -> bytes:
+        """Serialized request body for _build_payload (in streaming mode with stream)"""
+        payload = self._build_payload(IMAGE_PLACEHOLDER, detail)
+        if stream:
+            payload.update(STREAM_OPTIONS)
+        return self._splice_images(payload, [encoded_image])
+    
+    def _build_batch_body(self, encoded_images: List[bytes], detail: str = None) -> bytes:
+        """Serialized request body for _build_batch_payload"""
+        payload = self._build_batch_payload([IMAGE_PLACEHOLDER] * len(encoded_images), detail)
+        return self._splice_images(payload, encoded_images)
+    
+    @staticmethod
+    def _splice_images(payload: Dict, encoded_images: List[bytes]) -> bytes:
+        """
+        payload as JSON bytes with each IMAGE_PLACEHOLDER, in order, replaced
+        by a base64 image. The images are spliced into the bytes rather than
+        going through a str and json.dumps (base64 needs no JSON escaping).
+        """
+        parts = json.dumps(payload).encode().split(json.dumps(IMAGE_PLACEHOLDER)[1:-1].encode())
+        body = [parts[0]]
+        for encoded_image, part in zip(encoded_images, parts[1:]):
+            body += [encoded_image, part]
+        return b"".join(body)
+    
+    def _api_headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.openai_api_key}"
+        }
+    
+    def _build_payload(self, encoded_image: str, detail: str = None) -> Dict:
+        """ChatGPT Vision API request body for one base64-encoded JPEG (detail: "low"/"high"/None)"""
+        return {
+            "model": config.CHATGPT_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": IMAGE_PROMPT
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": self._image_url(encoded_image, detail)
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": config.MAX_TOKENS,
+            "response_format": self.response_format,
+        }
+    
+    def _build_batch_payload(self, encoded_images: List[str], detail: str = None) -> Dict:
+        """Request body for several base64-encoded JPEGs, each after an "Image <n>:" label"""
+        content = [{"type": "text", "text": batch_prompt(len(encoded_images))}]
+        for number, encoded_image in enumerate(encoded_images, 1):
+            content.append({"type": "text", "text": f"Image {number}:"})
+            content.append({"type": "image_url", "image_url": self._image_url(encoded_image, detail)})
+        return {
+            "model": config.CHATGPT_MODEL,
+            "messages": [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": content}],
+            "max_tokens": config.MAX_TOKENS * len(encoded_images),
+            "response_format": self.batch_response_format,
+        }
+    
+    @staticmethod
+    def _image_url(encoded_image: str, detail: str = None) -> Dict:
+        image_url = {"url": f"data:image/jpeg;base64,{encoded_image}"}
+        if detail:
+            image_url["detail"] = detail
+        return image_url
+    
+    def _parse_api_response(self, status_code: int, body: str, image_path: str) -> Dict:
+        """Turn a ChatGPT Vision API response into an analyze_lure result"""
+        if status_code != 200:
+            return self._status_error(status_code, body)
+        
+        result = json.loads(body)
+        self._record_prompt_cache(result.get("usage"))
+        message = result['choices'][0]['message']
+        try:
+            chatgpt_analysis = parse_analysis(message.get('content'), self.lure_types)
+        except AnalysisFormatError as e:
+            self._record_parse(1, 1, result.get("usage"))
+            answer = message.get('refusal') or message.get('content')
+            print(f"[WARNING] Unusable ChatGPT response ({e}): {answer}")
+            return {"error": f"Failed to parse ChatGPT response: {answer}"}
+        
+        self._record_parse(1, 0, result.get("usage"))
+        return self._analysis_result(chatgpt_analysis, image_path, result.get("usage"))
+    
+    def _parse_batch_response(self, status_code: int, body: str, image_paths: List[str]) -> List[Optional[Dict]]:
+        """
+        Turn a batch response into one analyze_lure result per image, matched
+        by the "image" label. None for an image the response doesn't answer
+        (or for every image when the content isn't a JSON array).
+        """
+        if status_code != 200:
+            return [self._status_error(status_code, body) for _ in image_paths]
+        
+        result = json.loads(body)
+        self._record_prompt_cache(result.get("usage"))
+        message = result['choices'][0]['message']
+        try:
+            by_number = parse_batch(message.get('content'), self.lure_types)
+        except AnalysisFormatError as e:
+            print(f"[WARNING] Unusable batch response ({e}): {message.get('refusal') or message.get('content')}")
+            by_number = {}
+        answered = sum(number in by_number for number in range(1, len(image_paths) + 1))
+        self._record_parse(len(image_paths), len(image_paths) - answered, result.get("usage"))
+        
+        usage = self._usage_share(result.get("usage"), len(image_paths))
+        results = []
+        for number, image_path in enumerate(image_paths, 1):
+            analysis = by_number.get(number)
+            if analysis is None:
+                results.append(None)
+                continue
+            results.append(dict(self._analysis_result(analysis, image_path, usage), batch_size=len(image_paths)))
+        return results
+    
+    @staticmethod
+    def _status_error(status_code: int, body: str) -> Dict:
+        return {
+            "error": f"API request failed: {status_code} - {body}",
+            "retryable": status_code in RETRYABLE_STATUSES,
+        }
+    
+    def _record_parse(self, answers: int, failures: int, usage: Optional[Dict]):
+        """Count answers (one per image) the response schema parse accepted or rejected"""
+        completion_tokens = (usage or {}).get("completion_tokens")
+        with self._parse_lock:
+            self._parse_stats["answers"] += answers
+            self._parse_stats["parse_failures"] += failures
+            if isinstance(completion_tokens, (int, float)):
+                self._parse_stats["completion_tokens"] += completion_tokens
+                self._parse_stats["answers_with_usage"] += answers
+    
+    def _record_prompt_cache(self, usage: Optional[Dict]):
+        """Count the prompt tokens of a response and how many of them upstream served from its prompt cache"""
+        if not usage or not isinstance(usage.get("prompt_tokens"), (int, float)):
+            return
+        cached = cached_tokens(usage) or 0
+        with self._prompt_cache_lock:
+            self._prompt_cache_stats["responses"] += 1
+            if cached:
+                self._prompt_cache_stats["cache_hits"] += 1
+            self._prompt_cache_stats["prompt_tokens"] += usage["prompt_tokens"]
+            self._prompt_cache_stats["cached_tokens"] += cached
+    
+    def _prompt_cache_counts(self) -> Dict:
+        with self._prompt_cache_lock:
+            stats = dict(self._prompt_cache_stats)
+        stats["hit_rate"] = round(stats["cache_hits"] / stats["responses"], 4) if stats["responses"] else 0.0
+        prompt_tokens = stats["prompt_tokens"]
+        stats["cached_token_share"] = round(stats["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+        stats["system_prompt_chars"] = len(self.system_prompt)
+        return stats
+    
+    def _parse_counts(self) -> Dict:
+        with self._parse_lock:
+            stats = dict(self._parse_stats)
+        answers, with_usage = stats["answers"], stats.pop("answers_with_usage")
+        stats["parse_failure_rate"] = round(stats["parse_failures"] / answers, 4) if answers else 0.0
+        stats["avg_completion_tokens"] = round(stats["completion_tokens"] / with_usage, 1) if with_usage else 0.0
+        return stats
+    
+    @staticmethod
+    def _usage_share(usage: Optional[Dict], count: int) -> Optional[Dict]:
+        """One image's share of a batch request's token usage"""
+        if not usage:
+            return None
+        share = {name: round(usage[name] / count) for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+                 if isinstance(usage.get(name), (int, float))}
+        cached = cached_tokens(usage)
+        if cached is not None:
+            share["prompt_tokens_details"] = {"cached_tokens": round(cached / count)}
+        return share
+    
+    def _analysis_result(self, chatgpt_analysis: Dict, image_path: str, usage: Optional[Dict]) -> Dict:
+        """analyze_lure result for the model's parsed answer about one image"""
+        # Get lure type and confidence
+        lure_type = chatgpt_analysis.get("lure_type", "Unknown")
+        confidence = chatgpt_analysis.get("confidence", 0)
+        
+        # Post-process: Upgrade generic types to specific ones based on visual features
+        lure_type = self._upgrade_lure_type_specificity(lure_type, chatgpt_analysis)
+        
+        # Get detailed lure information from database
+        lure_info = self.get_lure_info(lure_type)
+        
+        # Store in history
+        self.analysis_history.append({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "image_path": image_path,
+            "lure_type": lure_type,
+            "confidence": confidence,
+            "analysis": chatgpt_analysis
+        })
+        
+        # Return comprehensive results
+        return {
+            "success": True,
+            "image_path": image_path,
+            "lure_type": lure_type,
+            "confidence": confidence,
+            "chatgpt_analysis": chatgpt_analysis,
+            "lure_details": lure_info,
+            "analysis_method": "ChatGPT Vision API",
+            "analysis_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "token_usage": usage,
+            "tokens_used": (usage or {}).get("total_tokens"),
+            "cached_tokens": cached_tokens(usage),
+        }
     
     def _upgrade_lure_type_specificity(self, lure_type: str, chatgpt_analysis: Dict) -> str:
         """
@@ -1015,125 +2013,46 @@ Respond in JSON format:
         
         return full_output_path
 
-    def _compress_image_for_api(self, image_path: str, max_size_kb: int = None) -> str:
+    def _compress_image_for_api(self, image_bytes: bytes, max_size_kb: int = None, detail: str = None,
+                                crop=None) -> bytes:
         """
         Compress image for API while preserving important lure details
+        (see image_offload.compress_image). Runs in the image offload pool
+        when one is configured. Returns the JPEG bytes.
         """
         if max_size_kb is None:
             max_size_kb = config.TARGET_COMPRESSION_KB
-            
-        try:
-            # Ensure uploads directory exists
-            os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
-            
-            # Open image with PIL
-            with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Get original dimensions
-                original_width, original_height = img.size
-                print(f"Original image: {original_width}x{original_height}")
-                
-                # Calculate target dimensions (maintain aspect ratio)
-                # ChatGPT works well with images around 800-1200px on longest side
-                max_dimension = config.MAX_IMAGE_DIMENSION
-                new_width, new_height = original_width, original_height
-                
-                if original_width > max_dimension or original_height > max_dimension:
-                    if original_width > original_height:
-                        new_width = max_dimension
-                        new_height = int((original_height * max_dimension) / original_width)
-                    else:
-                        new_height = max_dimension
-                        new_width = int((original_width * max_dimension) / original_height)
-                    
-                    # Resize image
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    print(f"Resized to: {new_width}x{new_height}")
-                
-                # Create compressed version path
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                compressed_path = f"{config.UPLOAD_FOLDER}/compressed_{base_name}.jpg"
-                
-                # Save with quality optimization
-                quality = 95
-                img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
-                
-                # Check file size and reduce quality if needed
-                file_size_kb = os.path.getsize(compressed_path) / 1024
-                print(f"Compressed size: {file_size_kb:.1f} KB")
-                
-                # If still too large, reduce quality further
-                if file_size_kb > max_size_kb:
-                    quality = 85
-                    img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
-                    file_size_kb = os.path.getsize(compressed_path) / 1024
-                    print(f"Further compressed: {file_size_kb:.1f} KB")
-                
-                # If still too large, resize more aggressively
-                if file_size_kb > max_size_kb:
-                    # Reduce to 800px max dimension
-                    if new_width > 800 or new_height > 800:
-                        if new_width > new_height:
-                            new_width = 800
-                            new_height = int((new_height * 800) / new_width)
-                        else:
-                            new_height = 800
-                            new_width = int((new_width * 800) / new_height)
-                        
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                        img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
-                        file_size_kb = os.path.getsize(compressed_path) / 1024
-                        print(f"Aggressively compressed: {file_size_kb:.1f} KB")
-                
-                print(f"[OK] Image compressed successfully: {compressed_path}")
-                return compressed_path
-                
-        except Exception as e:
-            print(f"[ERROR] Image compression failed: {str(e)}")
-            return image_path  # Return original if compression fails
+        args = (image_bytes, self._max_dimension(detail), detail, max_size_kb * 1024, self.jpeg_encoder,
+                self.decode_budget, crop)
+        if self.image_offload:
+            return self.image_offload.compress(*args)
+        return compress_image(*args)
     
-    def _cleanup_compressed_image(self, compressed_path: str):
+    def estimate_api_cost(self, image, detail: str = None) -> Dict:
         """
-        Clean up compressed image after analysis
+        Estimate API cost and token usage for an image (a path or file object).
+        Only the image header is read: nothing is decoded, compressed or written.
         """
+        if detail is None:
+            detail = "low" if self.detail_routing == "adaptive" else "high"
         try:
-            if compressed_path != compressed_path and os.path.exists(compressed_path):
-                os.remove(compressed_path)
-                print(f"[INFO] Cleaned up compressed image: {compressed_path}")
-        except Exception as e:
-            print(f"[WARNING] Failed to cleanup compressed image: {str(e)}")
-
-    def estimate_api_cost(self, image_path: str) -> Dict:
-        """
-        Estimate API cost and token usage for an image
-        """
-        try:
-            # Compress image to see final size
-            compressed_path = self._compress_image_for_api(image_path)
-            
-            # Get compressed image size
-            file_size_kb = os.path.getsize(compressed_path) / 1024
+            with Image.open(image) as img:
+                width, height = img.size
             
-            # Estimate tokens (rough calculation)
-            # Base64 encoding increases size by ~33%
-            # ChatGPT Vision pricing: $0.01 per 1K tokens (input)
-            estimated_tokens = int((file_size_kb * 1.33) * 0.75)  # Rough estimate
-            estimated_cost = (estimated_tokens / 1000) * 0.01
-            
-            # Clean up compressed image
-            self._cleanup_compressed_image(compressed_path)
+            if hasattr(image, "seek"):
+                image.seek(0, os.SEEK_END)
+                size_bytes = image.tell()
+            else:
+                size_bytes = os.path.getsize(image)
             
-            return {
-                "original_size_kb": os.path.getsize(image_path) / 1024,
-                "compressed_size_kb": file_size_kb,
-                "compression_ratio": f"{((os.path.getsize(image_path) - os.path.getsize(compressed_path)) / os.path.getsize(image_path) * 100):.1f}%",
-                "estimated_tokens": estimated_tokens,
-                "estimated_cost_usd": f"${estimated_cost:.4f}",
-                "cost_efficiency": "[OK] Good" if file_size_kb < 500 else "[WARNING] High cost"
-            }
+            estimate = self.cost_model.estimate(width, height, detail)
+            estimate.update({
+                "original_size_kb": round(size_bytes / 1024, 1),
+                "estimated_tokens": estimate["input_tokens"],
+                "estimated_cost_usd": f"${estimate['max_total_cost_usd']:.4f}",
+                "cost_efficiency": "[OK] Good" if estimate["tiles"] <= 4 else "[WARNING] High cost",
+            })
+            return estimate
             
         except Exception as e:
             return {"error": f"Cost estimation failed: {str(e)}"}
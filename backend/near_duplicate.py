@@ -0,0 +1,353 @@
+"""
+Perceptual-hash index for spotting re-photographed lures.
+
+A new photo of the same lure never matches the exact-bytes result cache, but
+its 64-bit dHash/pHash usually lands within a few bits of the earlier one.
+Every successful analysis records (perceptual hash -> result cache key) here,
+and analyze_lure tries the neighbours under the current model, closest first,
+before calling the API.
+
+Hashes are persisted in a small SQLite file next to the result cache, each
+row tagged with its hash algorithm: dHash and pHash values are not
+comparable, so an index only ever loads rows of its own algorithm. Each
+worker builds its in-memory BK-tree lazily on the first lookup and then only
+pulls rows it hasn't seen yet, so hashes added by other workers show up
+without a reload. Rows whose result has left the cache are removed by the
+caller, and rows older than the result cache's TTL are purged every
+PURGE_EVERY adds; a worker rebuilds its tree once half of it is stale.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+import config
+from result_cache import cache_key
+
+HASH_BITS = 64
+
+
+# ============================================================================
+# PERCEPTUAL HASHES
+# ============================================================================
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def _grayscale(img: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    # draft() lets the JPEG decoder skip most of the work for tiny targets
+    if img.format == "JPEG":
+        img.draft("L", (size[0] * 4, size[1] * 4))
+    small = img.convert("L").resize(size, Image.Resampling.BILINEAR)
+    return np.asarray(small, dtype=np.float32)
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: compares horizontally adjacent pixels of a 9x8 thumbnail"""
+    pixels = _grayscale(img, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0, :] = np.sqrt(1.0 / n)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(img: Image.Image, hash_size: int = 8) -> int:
+    """DCT hash: low-frequency coefficients of a 32x32 thumbnail compared to their median"""
+    pixels = _grayscale(img, (32, 32))
+    dct = _DCT_32 @ pixels @ _DCT_32.T
+    low = dct[:hash_size, :hash_size]
+    median = np.median(low.ravel()[1:])  # DC term would dominate the median
+    return _bits_to_int(low > median)
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def perceptual_hash(image, algorithm: str = None) -> int:
+    """Perceptual hash of an image (a path or file object)"""
+    hash_function = HASH_FUNCTIONS[algorithm or config.NEAR_DUPLICATE_ALGORITHM]
+    with Image.open(image) as img:
+        return hash_function(img)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ============================================================================
+# BK-TREE
+# ============================================================================
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+
+    Nodes are [hash, value, children] lists where children maps
+    distance -> child node; lists keep the per-node overhead small enough
+    for a million entries per worker.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value: int, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, value, None]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(hash_value, node[0])
+            children = node[2]
+            if children is None:
+                children = node[2] = {}
+            child = children.get(distance)
+            if child is None:
+                children[distance] = [hash_value, value, None]
+                return
+            node = child
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, int, object]]:
+        """All (distance, hash, value) entries within max_distance, closest first"""
+        matches = []
+        if self.root is None:
+            return matches
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[0], node[1]))
+
+            children = node[2]
+            if children:
+                low, high = distance - max_distance, distance + max_distance
+                for child_distance, child in children.items():
+                    if low <= child_distance <= high:
+                        stack.append(child)
+
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+# ============================================================================
+# PERSISTENT INDEX
+# ============================================================================
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    # Neighbours handed back per lookup
+    MAX_CANDIDATES = 8
+    # Purge rows past ttl_seconds every N adds
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str, max_distance: int, algorithm: str = "dhash", ttl_seconds: int = None):
+        """
+        ttl_seconds: age after which a row's result has expired from the
+        result cache (None = rows are only removed by remove())
+        """
+        self.path = path
+        self.max_distance = max_distance
+        self.algorithm = algorithm
+        self.ttl_seconds = ttl_seconds
+
+        self._tree = None
+        self._last_row_id = 0
+        self._stale = 0  # tree entries whose row is gone
+        self._adds = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"lookups": 0, "matches": 0, "added": 0, "removed": 0, "errors": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    @classmethod
+    def from_config(cls) -> "NearDuplicateIndex":
+        """Build an index from config values"""
+        return cls(
+            path=config.NEAR_DUPLICATE_INDEX_PATH,
+            max_distance=config.NEAR_DUPLICATE_MAX_DISTANCE,
+            algorithm=config.NEAR_DUPLICATE_ALGORITHM,
+            ttl_seconds=config.RESULT_CACHE_TTL_SECONDS,
+        )
+
+    def hash_image(self, image) -> int:
+        return perceptual_hash(image, self.algorithm)
+
+    def find(self, hash_value: int, model: str = None) -> List[Dict]:
+        """
+        Indexed images within max_distance whose cache key is under model
+        (default config.CHATGPT_MODEL), closest first, as
+        [{"id": ..., "cache_key": ..., "distance": ...}]; at most MAX_CANDIDATES.
+        """
+        namespace = cache_key("", model)
+        try:
+            with self._lock:
+                self._sync()
+                matches = self._tree.search(hash_value, self.max_distance)
+                self._stats["lookups"] += 1
+            if not matches:
+                return []
+
+            row_ids = [row_id for _, _, row_id in matches]
+            keys = {}
+            conn = self._connection()
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(row_ids), 500):
+                chunk = row_ids[start:start + 500]
+                keys.update(conn.execute(
+                    f"SELECT id, cache_key FROM hashes WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+
+            candidates = [
+                {"id": row_id, "cache_key": keys[row_id], "distance": distance}
+                for distance, _, row_id in matches
+                if row_id in keys and keys[row_id].startswith(namespace)
+            ][:self.MAX_CANDIDATES]
+            with self._lock:
+                self._mark_stale(len(row_ids) - len(keys))
+                if candidates:
+                    self._stats["matches"] += 1
+            return candidates
+        except sqlite3.Error as e:
+            self._error("lookup", e)
+            return []
+
+    def add(self, hash_value: int, key: str):
+        """Record the perceptual hash of an analysed image"""
+        try:
+            conn = self._connection()
+            now = time.time()
+            with conn:
+                conn.execute(
+                    "INSERT INTO hashes (hash, algorithm, cache_key, created_at) VALUES (?, ?, ?, ?)",
+                    (_to_signed(hash_value), self.algorithm, key, now),
+                )
+            with self._lock:
+                self._stats["added"] += 1
+                # The row is picked up by the next _sync along with other workers' rows
+                self._adds += 1
+                purge = self.ttl_seconds is not None and self._adds % self.PURGE_EVERY == 0
+            if purge:
+                with conn:
+                    purged = conn.execute(
+                        "DELETE FROM hashes WHERE created_at <= ?", (now - self.ttl_seconds,)
+                    ).rowcount
+                with self._lock:
+                    self._stats["removed"] += purged
+                    self._mark_stale(purged)
+        except sqlite3.Error as e:
+            self._error("add", e)
+
+    def remove(self, row_id: int):
+        """Delete a row (from find) whose cache key no longer resolves"""
+        try:
+            conn = self._connection()
+            with conn:
+                removed = conn.execute("DELETE FROM hashes WHERE id = ?", (row_id,)).rowcount
+            with self._lock:
+                self._stats["removed"] += removed
+                self._mark_stale(removed)
+        except sqlite3.Error as e:
+            self._error("remove", e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["indexed"] = self._tree.size if self._tree else 0
+        stats["max_distance"] = self.max_distance
+        stats["algorithm"] = self.algorithm
+        return stats
+
+    def _mark_stale(self, count: int):
+        """
+        Note tree entries whose row is gone; past half the tree, drop it so
+        the next _sync rebuilds it from the rows left. Caller holds the lock.
+        """
+        self._stale += count
+        if self._tree is not None and self._stale * 2 > self._tree.size:
+            self._tree = None
+
+    def _sync(self):
+        """
+        Load rows of this index's algorithm added since the last sync (all
+        rows on first use). Caller holds the lock.
+        """
+        if self._tree is None:
+            self._tree = BKTree()
+            self._last_row_id = 0
+            self._stale = 0
+
+        rows = self._connection().execute(
+            "SELECT id, hash FROM hashes WHERE id > ? AND algorithm = ? ORDER BY id",
+            (self._last_row_id, self.algorithm),
+        ).fetchall()
+        for row_id, hash_value in rows:
+            self._tree.add(_to_unsigned(hash_value), row_id)
+            self._last_row_id = row_id
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS hashes (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        hash INTEGER NOT NULL,
+                        algorithm TEXT NOT NULL,
+                        cache_key TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                    """
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(hashes)")]
+                if "algorithm" not in columns:
+                    # Rows from before the column existed have no known algorithm and never match
+                    conn.execute("ALTER TABLE hashes ADD COLUMN algorithm TEXT NOT NULL DEFAULT ''")
+        except sqlite3.Error as e:
+            self._error("init", e)
+
+    def _error(self, operation: str, error: Exception):
+        with self._lock:
+            self._stats["errors"] += 1
+        print(f"[WARNING] Near-duplicate index {operation} failed: {error}")
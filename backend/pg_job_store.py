@@ -0,0 +1,231 @@
+"""
+Postgres-backed scan job queue for the classifier worker fleet.
+
+With SCAN_JOB_BACKEND=postgres the web tier only inserts jobs (image bytes
+included) into public.scan_jobs; classifier_worker.py processes on any
+number of nodes claim them with FOR UPDATE SKIP LOCKED, so adding
+classification capacity never touches the web dynos.
+
+Schema: database/supabase_scan_jobs.sql
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+import config
+from scan_jobs import TERMINAL_STATUSES, QueueFullError
+
+_JOB_COLUMNS = (
+    "id::text, user_id::text, status, stage, meta, result, error, "
+    "extract(epoch from created_at), extract(epoch from updated_at)"
+)
+
+
+def _job_from_row(row) -> Dict:
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "status": row[2],
+        "stage": row[3],
+        "meta": row[4] or {},
+        "result": row[5],
+        "error": row[6],
+        "created_at": float(row[7]),
+        "updated_at": float(row[8]),
+    }
+
+
+class PostgresJobStore:
+    def __init__(self, dsn: str, stale_seconds: int = 600, max_attempts: int = 3):
+        """
+        dsn: Postgres connection string (Supabase: Settings -> Database)
+        stale_seconds: a running job whose claim is older than this is swept
+        max_attempts: claims allowed before a swept job is failed instead of requeued
+        """
+        self.dsn = dsn
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connection(self) -> psycopg.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not conn.closed and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        # prepare_threshold=None keeps us compatible with pgbouncer transaction pooling
+        conn = psycopg.connect(self.dsn, autocommit=True, prepare_threshold=None)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def create(self, user_id: str, meta: Dict = None, image_bytes: bytes = None, image_name: str = None) -> str:
+        row = self._connection().execute(
+            "INSERT INTO public.scan_jobs (user_id, image_name, image_data, meta) "
+            "VALUES (%s, %s, %s, %s) RETURNING id::text",
+            (user_id, image_name, image_bytes, Jsonb(meta or {})),
+        ).fetchone()
+        return row[0]
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Claim the oldest queued job, skipping rows other workers hold locks on"""
+        row = self._connection().execute(
+            """
+            UPDATE public.scan_jobs
+               SET status = 'running', stage = 'running', locked_by = %s, locked_at = NOW(),
+                   attempts = attempts + 1, updated_at = NOW()
+             WHERE id = (
+                   SELECT id FROM public.scan_jobs
+                    WHERE status = 'queued'
+                    ORDER BY created_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+             )
+            RETURNING id::text, user_id::text, image_name, image_data, meta, attempts
+            """,
+            (worker_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        return {
+            "id": row[0],
+            "user_id": row[1],
+            "image_name": row[2],
+            "image_data": bytes(row[3]) if row[3] is not None else None,
+            "meta": row[4] or {},
+            "attempts": row[5],
+        }
+
+    def update(self, job_id: str, status: str = None, stage: str = None,
+               result: Dict = None, error: str = None, worker_id: str = None, attempt: int = None) -> bool:
+        """
+        Set a job's fields. With worker_id (and attempt, from claim()) only a
+        job still running under that claim is touched, so a worker whose job
+        was requeued by requeue_stale and claimed again can't overwrite it.
+        Returns False when no row was updated.
+        """
+        fields, values = ["updated_at = NOW()"], []
+        if status is not None:
+            fields.append("status = %s")
+            values.append(status)
+            if status in TERMINAL_STATUSES:
+                # The upload has been persisted elsewhere by now; don't keep megabytes in the queue
+                fields.append("image_data = NULL")
+        if stage is not None:
+            fields.append("stage = %s")
+            values.append(stage)
+        if result is not None:
+            fields.append("result = %s")
+            values.append(Jsonb(result))
+        if error is not None:
+            fields.append("error = %s")
+            values.append(error)
+
+        conditions, arguments = ["id = %s"], [job_id]
+        if worker_id is not None:
+            conditions.append("status = 'running' AND locked_by = %s")
+            arguments.append(worker_id)
+        if attempt is not None:
+            conditions.append("attempts = %s")
+            arguments.append(attempt)
+
+        cursor = self._connection().execute(
+            f"UPDATE public.scan_jobs SET {', '.join(fields)} WHERE {' AND '.join(conditions)}",
+            (*values, *arguments),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        try:
+            row = self._connection().execute(
+                f"SELECT {_JOB_COLUMNS} FROM public.scan_jobs WHERE id = %s", (job_id,)
+            ).fetchone()
+        except psycopg.errors.InvalidTextRepresentation:
+            # Not a UUID
+            return None
+        return _job_from_row(row) if row else None
+
+    def requeue_stale(self) -> int:
+        """Return jobs whose worker disappeared to the queue (or fail them after max_attempts)"""
+        cursor = self._connection().execute(
+            """
+            UPDATE public.scan_jobs
+               SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                   stage = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                   error = CASE WHEN attempts >= %s THEN 'interrupted' ELSE error END,
+                   image_data = CASE WHEN attempts >= %s THEN NULL ELSE image_data END,
+                   locked_by = NULL, updated_at = NOW()
+             WHERE status = 'running'
+               AND locked_at < NOW() - make_interval(secs => %s)
+            """,
+            (self.max_attempts, self.max_attempts, self.max_attempts, self.max_attempts, self.stale_seconds),
+        )
+        return cursor.rowcount
+
+    def queued_count(self) -> int:
+        return self._connection().execute(
+            "SELECT count(*) FROM public.scan_jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+
+    def purge(self, retention_seconds: int):
+        """Delete finished jobs older than the retention period"""
+        self._connection().execute(
+            "DELETE FROM public.scan_jobs WHERE status IN ('succeeded', 'failed') "
+            "AND updated_at < NOW() - make_interval(secs => %s)",
+            (retention_seconds,),
+        )
+
+
+class PostgresJobQueue:
+    """
+    Web-tier side of the Postgres queue: same interface as
+    scan_jobs.ScanJobQueue, but jobs are run by classifier_worker.py.
+    """
+
+    def __init__(self, store: PostgresJobStore, max_queued: int = 32):
+        self.store = store
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0}
+
+    @classmethod
+    def from_config(cls) -> "PostgresJobQueue":
+        store = PostgresJobStore(
+            config.DATABASE_URL,
+            stale_seconds=config.SCAN_JOB_STALE_SECONDS,
+            max_attempts=config.SCAN_JOB_MAX_ATTEMPTS,
+        )
+        return cls(store, max_queued=config.SCAN_JOB_MAX_QUEUED)
+
+    def reserve(self):
+        """Refuse new jobs while the shared backlog is at capacity"""
+        if self.store.queued_count() >= self.max_queued:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError()
+
+    def release(self):
+        pass
+
+    def enqueue(self, user_id: str, meta: Dict, image_bytes: bytes, run=None) -> str:
+        """Insert a queued job carrying the image bytes; run is ignored (workers run the pipeline)"""
+        job_id = self.store.create(user_id, meta, image_bytes=image_bytes, image_name=meta.get("image_name"))
+        with self._lock:
+            self._stats["submitted"] += 1
+        return job_id
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = "postgres"
+        stats["max_queued"] = self.max_queued
+        try:
+            stats["queued"] = self.store.queued_count()
+        except psycopg.Error as e:
+            stats["queued"] = None
+            print(f"[WARNING] Could not count queued scan jobs: {e}")
+        return stats
@@ -0,0 +1,274 @@
+"""
+Content-addressed cache for lure classification results.
+
+Two tiers:
+  - an in-process LRU (one per gunicorn worker) for the hottest keys
+  - a shared SQLite file on local disk that every worker on the host reads
+
+Keys are the SHA-256 of the normalized image (the JPEG the vision API is
+sent), so re-encodes and EXIF differences of one photo share an entry; the
+classifier also stores each result under the raw upload's digest, which
+byte-identical retries and /api/scan-probe look up without normalizing.
+Keys are namespaced by model so a model change never serves answers
+produced by the old one. Successful
+results live for RESULT_CACHE_TTL_SECONDS. Failed analyses are stored as
+short-lived negative entries so a burst of client retries doesn't turn into
+a burst of paid API calls.
+
+The cache is best-effort: any SQLite problem is logged and the lookup is
+treated as a miss, so a broken cache never fails a scan.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import config
+
+
+def image_digest(image_bytes: bytes) -> str:
+    """SHA-256 hex digest of image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cache_key(digest: str, model: str = None) -> str:
+    """Build the cache key for an image digest under the given model"""
+    return f"{model or config.CHATGPT_MODEL}:{digest}"
+
+
+class ResultCache:
+    # Purge expired rows from SQLite every N writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path: Optional[str], ttl_seconds: int, negative_ttl_seconds: int,
+                 memory_entries: int = 512):
+        """
+        path: SQLite file shared by all workers (None = memory tier only)
+        ttl_seconds: lifetime of successful results
+        negative_ttl_seconds: lifetime of cached failures
+        memory_entries: size of the per-process LRU
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.memory_entries = memory_entries
+
+        self._memory = OrderedDict()  # key -> (expires_at, negative, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "negative_stores": 0,
+            "expired": 0,
+            "evictions": 0,
+            "disk_errors": 0,
+        }
+
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._init_schema()
+
+    @classmethod
+    def from_config(cls) -> "ResultCache":
+        """Build a cache from config values"""
+        return cls(
+            path=config.RESULT_CACHE_PATH,
+            ttl_seconds=config.RESULT_CACHE_TTL_SECONDS,
+            negative_ttl_seconds=config.RESULT_CACHE_NEGATIVE_TTL_SECONDS,
+            memory_entries=config.RESULT_CACHE_MEMORY_ENTRIES,
+        )
+
+    # ========================================================================
+    # PUBLIC API
+    # ========================================================================
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached value for key, or None on a miss.
+        Negative entries come back as the stored error dict.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, negative, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["negative_hits" if negative else "memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        row = self._disk_get(key, now)
+        if row is not None:
+            expires_at, negative, value = row
+            self._remember(key, expires_at, negative, value)
+            with self._lock:
+                self._stats["negative_hits" if negative else "disk_hits"] += 1
+            return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Dict, negative: bool = False):
+        """Store a result (or a failure when negative=True)"""
+        ttl = self.negative_ttl_seconds if negative else self.ttl_seconds
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        expires_at = now + ttl
+        self._remember(key, expires_at, negative, value)
+        self._disk_set(key, value, negative, now, expires_at)
+
+        with self._lock:
+            self._stats["negative_stores" if negative else "stores"] += 1
+
+    def invalidate(self, key: str):
+        """Drop a key from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self._disk_error("invalidate", e)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters plus derived hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["negative_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    # ========================================================================
+    # MEMORY TIER
+    # ========================================================================
+
+    def _remember(self, key: str, expires_at: float, negative: bool, value: Dict):
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, negative, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ========================================================================
+    # DISK TIER
+    # ========================================================================
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """One connection per thread, reopened after a fork"""
+        if not self.path:
+            return None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        try:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            self._disk_error("connect", e)
+            return None
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        negative INTEGER NOT NULL DEFAULT 0,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)")
+        except sqlite3.Error as e:
+            self._disk_error("init", e)
+
+    def _disk_get(self, key: str, now: float):
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT value, negative, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, negative, expires_at = row
+            if expires_at <= now:
+                with conn:
+                    conn.execute("DELETE FROM results WHERE key = ? AND expires_at <= ?", (key, now))
+                with self._lock:
+                    self._stats["expired"] += 1
+                return None
+
+            return expires_at, bool(negative), json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            self._disk_error("get", e)
+            return None
+
+    def _disk_set(self, key: str, value: Dict, negative: bool, now: float, expires_at: float):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, negative, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(value), int(negative), now, expires_at),
+                )
+
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self.PURGE_EVERY == 0
+            if purge:
+                with conn:
+                    conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._disk_error("set", e)
+
+    def _disk_error(self, operation: str, error: Exception):
+        with self._lock:
+            self._stats["disk_errors"] += 1
+        print(f"[WARNING] Result cache {operation} failed: {error}")
@@ -0,0 +1,250 @@
+"""
+Asynchronous scan jobs for /upload?async=1.
+
+The request thread only validates the upload, reserves quota and enqueues;
+a bounded in-process thread pool runs the normal scan pipeline and records
+progress in a SQLite table shared by every gunicorn worker. Clients poll
+/api/jobs/<id> (or hold /api/jobs/<id>/events open for Server-Sent Events),
+and any worker can answer because the state lives in SQLite.
+
+Jobs run in the worker that accepted them. If that worker dies, its jobs
+are marked failed once they've been stuck for SCAN_JOB_STALE_SECONDS.
+
+With SCAN_JOB_BACKEND=postgres, create_queue() returns a
+pg_job_store.PostgresJobQueue instead, and jobs are run by the separate
+classifier_worker.py fleet.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import config
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class JobStore:
+    def __init__(self, path: str, retention_seconds: int = 86400, stale_seconds: int = 600):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def create(self, user_id: str, meta: Dict = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, status, stage, meta, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, QUEUED, QUEUED, json.dumps(meta or {}), now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, status: str = None, stage: str = None,
+               result: Dict = None, error: str = None):
+        fields, values = ["updated_at = ?"], [time.time()]
+        if status is not None:
+            fields.append("status = ?")
+            values.append(status)
+        if stage is not None:
+            fields.append("stage = ?")
+            values.append(stage)
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result))
+        if error is not None:
+            fields.append("error = ?")
+            values.append(error)
+
+        conn = self._connection()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id = ?", (*values, job_id))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT id, user_id, status, stage, meta, result, error, created_at, updated_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "id": row[0],
+            "user_id": row[1],
+            "status": row[2],
+            "stage": row[3],
+            "meta": json.loads(row[4] or "{}"),
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+        if job["status"] not in TERMINAL_STATUSES and time.time() - job["updated_at"] > self.stale_seconds:
+            # The worker that owned this job is gone
+            self.update(job_id, status=FAILED, error="interrupted")
+            job.update(status=FAILED, error="interrupted")
+        return job
+
+    def purge(self):
+        """Delete finished jobs older than the retention period"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, time.time() - self.retention_seconds),
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    meta TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+
+class ScanJobQueue:
+    def __init__(self, store: JobStore, workers: int = 4, max_queued: int = 32):
+        """
+        store: where job state lives
+        workers: scans run concurrently by this process
+        max_queued: jobs accepted (running + waiting) before submit() refuses
+        """
+        self.store = store
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    @classmethod
+    def from_config(cls) -> "ScanJobQueue":
+        """Build a queue from config values"""
+        store = JobStore(
+            config.SCAN_JOB_DB_PATH,
+            retention_seconds=config.SCAN_JOB_RETENTION_SECONDS,
+            stale_seconds=config.SCAN_JOB_STALE_SECONDS,
+        )
+        return cls(store, workers=config.SCAN_JOB_WORKERS, max_queued=config.SCAN_JOB_MAX_QUEUED)
+
+    def reserve(self):
+        """Claim a queue slot before doing any work for a job; raises QueueFullError"""
+        with self._lock:
+            if self._pending >= self.max_queued:
+                self._stats["rejected"] += 1
+                raise QueueFullError()
+            self._pending += 1
+
+    def release(self):
+        """Give back a slot reserved with reserve() that was never submitted"""
+        with self._lock:
+            self._pending -= 1
+
+    def enqueue(self, user_id: str, meta: Dict, image_bytes: bytes,
+                run: Callable[[Callable[[str], None]], Dict]) -> str:
+        """Create a job for an upload and run it on this process's pool (run already holds the image)"""
+        job_id = self.store.create(user_id, meta)
+        self.submit(job_id, run)
+        return job_id
+
+    def submit(self, job_id: str, run: Callable[[Callable[[str], None]], Dict]):
+        """
+        Run run(set_stage) on the pool for a job created in self.store.
+        The slot must already be reserved; it is released when the job finishes.
+        run() returns the job result; an error result or raising marks the job failed.
+        """
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._submitted += 1
+            purge = self._submitted % 100 == 0
+        if purge:
+            self.store.purge()
+        self._executor.submit(self._run, job_id, run)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        stats["backend"] = "local"
+        stats["max_queued"] = self.max_queued
+        return stats
+
+    def _run(self, job_id: str, run: Callable[[Callable[[str], None]], Dict]):
+        try:
+            self.store.update(job_id, status=RUNNING, stage=RUNNING)
+            result = run(lambda stage: self.store.update(job_id, stage=stage))
+            if result.get("error"):
+                # The classifier's error result ("Analysis Failed") is a failed scan, not a success
+                self.store.update(job_id, status=FAILED, stage=FAILED, result=result, error=result["error"])
+                outcome = "failed"
+            else:
+                self.store.update(job_id, status=SUCCEEDED, stage=SUCCEEDED, result=result)
+                outcome = "succeeded"
+        except Exception as e:
+            print(f"[ERROR] Scan job {job_id} failed: {e}")
+            try:
+                self.store.update(job_id, status=FAILED, stage=FAILED, error=str(e))
+            except sqlite3.Error as store_error:
+                print(f"[ERROR] Could not record failure for job {job_id}: {store_error}")
+            outcome = "failed"
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        with self._lock:
+            self._stats[outcome] += 1
+
+
+def create_queue():
+    """Build the queue selected by SCAN_JOB_BACKEND ("local" or "postgres")"""
+    if config.SCAN_JOB_BACKEND == "postgres":
+        if not config.DATABASE_URL:
+            raise ValueError("SCAN_JOB_BACKEND=postgres requires DATABASE_URL")
+        # psycopg is only needed when the Postgres backend is selected
+        from pg_job_store import PostgresJobQueue
+        return PostgresJobQueue.from_config()
+    return ScanJobQueue.from_config()
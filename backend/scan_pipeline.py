@@ -0,0 +1,129 @@
+"""
+The scan pipeline shared by every place that runs a scan: the synchronous
+/upload handler, the in-process async job pool and classifier_worker.py.
+
+It classifies a saved upload, writes the local JSON record, uploads the
+image's display renditions to Supabase Storage and fills in the pending
+scan row created when quota was reserved. /api/scan-probe reuses the
+last two steps for a scan answered without an upload.
+"""
+
+from typing import Callable, Dict, Optional
+
+import config
+from image_renditions import make_renditions, rendition_sizes
+from result_cache import image_digest
+
+
+def run_scan(classifier, supabase_service, user_id: str, filepath: str, filename: str,
+             pending_scan_id: Optional[str], set_stage: Callable[[str], None] = None,
+             deadline: float = None, image_bytes: bytes = None, quality_checked: bool = False,
+             progress: Callable[[str, Dict], None] = None) -> Dict:
+    """
+    Classify a saved upload and persist the outcome.
+    set_stage(name) reports progress for async jobs; deadline (time.monotonic())
+    bounds the vision API call for requests a client is waiting on.
+    image_bytes: the upload already in memory, so neither the classifier nor
+    the Storage upload reads filepath back from disk.
+    quality_checked: the caller already ran the classifier's quality gate.
+    progress(event, data) reports the classifier's stages (see analyze_lure),
+    then "parsed" with the result before it is stored and "stored" after.
+    """
+    set_stage = set_stage or (lambda stage: None)
+
+    set_stage('analyzing')
+    results = classifier.analyze_lure(filepath, deadline=deadline, image_bytes=image_bytes,
+                                      quality_checked=quality_checked, progress=progress)
+    results['image_path'] = filepath
+    results['image_name'] = filename
+
+    if 'error' in results:
+        print(f'[ERROR] Analysis failed: {results["error"]}')
+        results['lure_type'] = 'Analysis Failed'
+        results['confidence'] = 0
+        results['analysis_method'] = 'ChatGPT Vision API (Failed)'
+
+    if progress:
+        progress('parsed', dict(results))
+
+    set_stage('saving')
+    results = save_results(classifier, supabase_service, user_id, results, pending_scan_id,
+                           lambda: store_image(supabase_service, user_id, filepath, filename, image_bytes))
+    if progress:
+        progress('stored', {'supabase_id': results.get('supabase_id'), 'image_url': results.get('image_url')})
+    return results
+
+
+def save_results(classifier, supabase_service, user_id: str, results: Dict, pending_scan_id: Optional[str],
+                 image_urls: Callable[[], Dict]) -> Dict:
+    """
+    Write the local JSON record and fill in the pending scan row (a new row
+    without one). image_urls() stores the image and returns the row's URL fields.
+    """
+    json_file = classifier.save_analysis_to_json(results)
+    results['json_file'] = json_file
+
+    if supabase_service.is_enabled():
+        try:
+            if not results.get('lure_type'):
+                results['lure_type'] = 'Unknown'
+
+            results.update(image_urls())
+
+            if pending_scan_id:
+                supabase_result = supabase_service.update_scan_with_results(pending_scan_id, results)
+            else:
+                supabase_result = supabase_service.save_lure_analysis(user_id, results)
+
+            if supabase_result:
+                results['supabase_id'] = supabase_result.get('id')
+
+        except Exception as e:
+            print(f'[WARNING] Supabase save failed: {e}')
+            # Scan already counted via pending record — continue
+
+    print(f'[OK] Analysis complete for user {user_id}')
+    return results
+
+
+def find_stored_image(supabase_service, user_id: str, digest: str, filename: str) -> Optional[Dict]:
+    """URL fields of an upload already in Storage under this digest, or None"""
+    sizes = rendition_sizes()
+    original_name = filename if config.STORE_ORIGINAL_IMAGES else None
+    return supabase_service.find_lure_renditions(user_id, digest, sorted(sizes, key=sizes.get, reverse=True),
+                                                 original_name)
+
+
+def upload_max_dimension() -> Optional[int]:
+    """
+    Longest side the server ever uses from an upload (vision API input and
+    stored renditions), or None when originals are stored as uploaded
+    """
+    if config.STORE_ORIGINAL_IMAGES:
+        return None
+    return max(config.MAX_IMAGE_DIMENSION, config.IMAGE_MEDIUM_SIZE)
+
+
+def store_image(supabase_service, user_id: str, filepath: str, filename: str, image_bytes: bytes = None) -> Dict:
+    """
+    Upload the scan's thumb and medium renditions (and the original, with
+    STORE_ORIGINAL_IMAGES) to Storage; returns the URL fields for the row.
+    Paths are keyed by the upload's content hash, so a photo already stored
+    is neither rendered nor uploaded again. An image Pillow can't read is
+    stored as uploaded.
+    """
+    if image_bytes is None:
+        with open(filepath, 'rb') as image_file:
+            image_bytes = image_file.read()
+    digest = image_digest(image_bytes)
+    stored = find_stored_image(supabase_service, user_id, digest, filename)
+    if stored:
+        return stored
+    try:
+        renditions = make_renditions(image_bytes)
+    except Exception as e:
+        print(f'[WARNING] Could not make image renditions, storing the original: {e}')
+        image_url = supabase_service.upload_lure_image(user_id, filepath, filename, file_data=image_bytes)
+        return {'image_url': image_url} if image_url else {}
+    original = image_bytes if config.STORE_ORIGINAL_IMAGES else None
+    return supabase_service.upload_lure_renditions(user_id, digest, renditions, original, filename)
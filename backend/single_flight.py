@@ -0,0 +1,315 @@
+"""
+Single-flight coalescing for duplicate classification requests.
+
+When the same image arrives twice at once (a double-tap, or a client retry
+racing the original) only one caller - the leader - runs the upstream call.
+
+  - Within a worker, followers block on the leader's Event and get its result
+    (do_async: coroutines on one event loop await the leader's future).
+  - Across gunicorn workers, leaders claim the key in a small SQLite lock
+    table. A worker that finds the key already claimed polls the shared
+    result cache until the other worker's answer lands, the claim is
+    released, or its lease expires (then it takes over).
+
+The lease bounds how long a crashed leader can block anyone; a caller's
+own deadline bounds how long it waits at all (InFlightTimeoutError).
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+
+
+class InFlightTimeoutError(Exception):
+    """Raised when a follower's deadline passes before the leader's result arrives"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, lock_path: Optional[str], lease_seconds: float = 120, poll_interval: float = 0.25):
+        """
+        lock_path: SQLite file for the cross-worker lock table (None = in-process only)
+        lease_seconds: how long a claim is honoured before another worker may take over
+        poll_interval: how often a waiting worker re-checks the result cache
+        """
+        self.lock_path = lock_path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self._calls = {}
+        self._async_calls = {}  # (loop, key) -> asyncio.Future
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {
+            "leaders": 0,
+            "local_followers": 0,
+            "remote_followers": 0,
+            "takeovers": 0,
+            "timeouts": 0,
+            "lock_errors": 0,
+        }
+
+        if self.lock_path:
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._init_schema()
+
+    @classmethod
+    def from_config(cls) -> "SingleFlight":
+        """Build a coalescer from config values"""
+        return cls(
+            lock_path=config.SINGLE_FLIGHT_LOCK_PATH,
+            lease_seconds=config.SINGLE_FLIGHT_LEASE_SECONDS,
+            poll_interval=config.SINGLE_FLIGHT_POLL_SECONDS,
+        )
+
+    def do(self, key: str, fn: Callable[[], Dict],
+           lookup: Callable[[], Optional[Dict]] = None, deadline: float = None) -> Tuple[Dict, bool]:
+        """
+        Run fn() once per key across concurrent callers.
+
+        lookup() should return the finished result from shared storage (or None);
+        it is how followers in other workers pick up the leader's answer.
+        deadline: time.monotonic() value after which a follower stops waiting
+        and raises InFlightTimeoutError (None = wait for the leader or its lease).
+
+        Returns (result, shared) where shared is True when another caller did the work.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["local_followers"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not call.done.wait(timeout):
+                self._timed_out(key)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_across_workers(key, fn, lookup, deadline)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Dict]],
+                       lookup: Callable[[], Optional[Dict]] = None, deadline: float = None) -> Tuple[Dict, bool]:
+        """
+        do() for coroutines: fn() is awaited, and waiting for a leader never
+        blocks the event loop. Followers on the same loop await the leader's
+        future; other threads and workers coalesce through the lock table.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_calls.get((loop, key))
+            if future is not None:
+                self._stats["local_followers"] += 1
+                leader = False
+            else:
+                future = self._async_calls[(loop, key)] = loop.create_future()
+                leader = True
+
+        if not leader:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout), True
+            except asyncio.TimeoutError:
+                self._timed_out(key)
+
+        try:
+            result, shared = await self._run_across_workers_async(key, fn, lookup, deadline)
+            future.set_result(result)
+            return result, shared
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # followers re-raise it; don't log it as never retrieved
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop((loop, key), None)
+
+    @property
+    def owner(self) -> str:
+        # Evaluated per call so forked workers never share an owner id
+        return f"{os.getpid()}-{id(self)}"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._async_calls)
+        return stats
+
+    # ========================================================================
+    # CROSS-WORKER LOCK TABLE
+    # ========================================================================
+
+    def _run_across_workers(self, key: str, fn: Callable[[], Dict],
+                            lookup: Optional[Callable[[], Optional[Dict]]],
+                            deadline: Optional[float] = None) -> Tuple[Dict, bool]:
+        waited = False
+        while not self._claim(key):
+            # Another worker is on it - wait for its result to reach shared storage
+            waited = True
+            time.sleep(self._poll_delay(key, deadline))
+            result = self._remote_result(lookup)
+            if result is not None:
+                return result, True
+
+        # Released while we polled: the result may have landed since the last check
+        result = self._remote_result(lookup) if waited else None
+        if result is not None:
+            self._release(key)
+            return result, True
+
+        with self._lock:
+            self._stats["leaders"] += 1
+        try:
+            return fn(), False
+        finally:
+            self._release(key)
+
+    async def _run_across_workers_async(self, key: str, fn: Callable[[], Awaitable[Dict]],
+                                        lookup: Optional[Callable[[], Optional[Dict]]],
+                                        deadline: Optional[float] = None) -> Tuple[Dict, bool]:
+        """_run_across_workers, sleeping on the event loop"""
+        waited = False
+        while not self._claim(key):
+            waited = True
+            await asyncio.sleep(self._poll_delay(key, deadline))
+            result = self._remote_result(lookup)
+            if result is not None:
+                return result, True
+
+        result = self._remote_result(lookup) if waited else None
+        if result is not None:
+            self._release(key)
+            return result, True
+
+        with self._lock:
+            self._stats["leaders"] += 1
+        try:
+            return await fn(), False
+        finally:
+            self._release(key)
+
+    def _poll_delay(self, key: str, deadline: Optional[float]) -> float:
+        """Seconds until the next look at the claimed key; raises InFlightTimeoutError past the deadline"""
+        if deadline is None:
+            return self.poll_interval
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._timed_out(key)
+        return min(self.poll_interval, remaining)
+
+    def _remote_result(self, lookup: Optional[Callable[[], Optional[Dict]]]) -> Optional[Dict]:
+        """Another worker's result from shared storage, or None"""
+        result = lookup() if lookup else None
+        if result is not None:
+            with self._lock:
+                self._stats["remote_followers"] += 1
+        return result
+
+    def _timed_out(self, key: str):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        raise InFlightTimeoutError(f"Deadline passed waiting for in-flight call {key}")
+
+    def _claim(self, key: str) -> bool:
+        """Try to claim key; True if this worker should run the call"""
+        conn = self._connection()
+        if conn is None:
+            return True
+
+        now = time.time()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM inflight WHERE key = ? AND expires_at <= ?", (key, now)
+                )
+                if cursor.rowcount:
+                    with self._lock:
+                        self._stats["takeovers"] += 1
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO inflight (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self.owner, now + self.lease_seconds),
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            # Fail open: a duplicate upstream call beats a stuck request
+            self._lock_error("claim", e)
+            return True
+
+    def _release(self, key: str):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            self._lock_error("release", e)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.lock_path:
+            return None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        try:
+            conn = sqlite3.connect(self.lock_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            self._lock_error("connect", e)
+            return None
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS inflight (
+                        key TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+        except sqlite3.Error as e:
+            self._lock_error("init", e)
+
+    def _lock_error(self, operation: str, error: Exception):
+        with self._lock:
+            self._stats["lock_errors"] += 1
+        print(f"[WARNING] Single-flight {operation} failed: {error}")
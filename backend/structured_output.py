@@ -0,0 +1,154 @@
+"""
+Strict JSON-schema response format for the vision API's answers.
+
+The request's response_format holds the model to a schema: the lure type
+must be one of the lure database's types (or "Unknown"), the confidence a
+number, and nothing but the JSON object comes back, so there is no prose or
+markdown to strip. On the wire the fields have one-letter names (FIELDS),
+which cuts the output tokens of every answer; parse_analysis validates an
+answer and expands it to the full names the rest of the app, and the stored
+chatgpt_analysis, use.
+
+Property order matters for streaming: the model writes the lure type first.
+"""
+
+import json
+from typing import Dict, List
+
+# Full name -> wire name, in the order the model writes them
+FIELDS = {
+    "lure_type": "t",
+    "confidence": "c",
+    "visual_features": "f",
+    "reasoning": "r",
+    "target_species": "s",
+}
+DESCRIPTIONS = {
+    "lure_type": "lure type, the most specific match, exactly as named in the list",
+    "confidence": "confidence, 0-100",
+    "visual_features": "key visual features that support this specific type",
+    "reasoning": "why this specific type, not a general category",
+    "target_species": "fish species this lure would attract",
+}
+# Label of each answer in a batch request ("Image <n>")
+IMAGE_FIELD = "i"
+BATCH_FIELD = "results"
+
+
+class AnalysisFormatError(ValueError):
+    """Raised for an answer that doesn't match the response schema"""
+
+
+def result_format() -> str:
+    """The answer's fields as described in the prompt"""
+    lines = [f'    "{FIELDS[name]}": {DESCRIPTIONS[name]}' for name in FIELDS]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def analysis_schema(lure_types: List[str]) -> Dict:
+    """JSON schema of one answer (strict mode: every property required, nothing else allowed)"""
+    string_list = {"type": "array", "items": {"type": "string"}}
+    properties = {
+        FIELDS["lure_type"]: {"type": "string", "enum": list(lure_types)},
+        FIELDS["confidence"]: {"type": "integer"},
+        FIELDS["visual_features"]: string_list,
+        FIELDS["reasoning"]: {"type": "string"},
+        FIELDS["target_species"]: string_list,
+    }
+    for name, wire_name in FIELDS.items():
+        properties[wire_name] = dict(properties[wire_name], description=DESCRIPTIONS[name])
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+
+def response_format(lure_types: List[str], batch: bool = False) -> Dict:
+    """
+    response_format for a chat completions request. A batch answer is an
+    object holding a list (a strict schema's root must be an object), each
+    entry labelled with its image number.
+    """
+    schema = analysis_schema(lure_types)
+    name = "lure_analysis"
+    if batch:
+        entry = dict(schema, properties={IMAGE_FIELD: {"type": "integer"}, **schema["properties"]},
+                     required=[IMAGE_FIELD] + schema["required"])
+        schema = {"type": "object", "properties": {BATCH_FIELD: {"type": "array", "items": entry}},
+                  "required": [BATCH_FIELD], "additionalProperties": False}
+        name = "lure_analyses"
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def parse_analysis(content, lure_types) -> Dict:
+    """
+    One answer (the message content) as an analysis with full field names.
+    Raises AnalysisFormatError when it isn't a JSON object with a known lure
+    type and a numeric confidence; the other fields default to empty.
+    """
+    return validate_analysis(_load(content), lure_types)
+
+
+def parse_batch(content, lure_types) -> Dict[int, Dict]:
+    """
+    A batch answer as {image number: analysis}. Entries that don't validate,
+    or repeat a number, are left out; raises AnalysisFormatError when the
+    content isn't a batch answer at all.
+    """
+    answer = _load(content)
+    entries = answer.get(BATCH_FIELD) if isinstance(answer, dict) else None
+    if not isinstance(entries, list):
+        raise AnalysisFormatError(f'no "{BATCH_FIELD}" list')
+
+    analyses = {}
+    for position, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            number = int(str(entry.get(IMAGE_FIELD, position)).rsplit(" ", 1)[-1])
+            analysis = validate_analysis(entry, lure_types)
+        except (AnalysisFormatError, ValueError):
+            continue
+        analyses.setdefault(number, analysis)
+    return analyses
+
+
+def validate_analysis(answer, lure_types) -> Dict:
+    """A decoded answer object checked and expanded to full field names"""
+    if not isinstance(answer, dict):
+        raise AnalysisFormatError("answer is not a JSON object")
+    lure_type = answer.get(FIELDS["lure_type"])
+    if lure_type not in lure_types:
+        raise AnalysisFormatError(f"unknown lure type: {lure_type!r}")
+    confidence = answer.get(FIELDS["confidence"])
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        raise AnalysisFormatError(f"confidence is not a number: {confidence!r}")
+
+    return {
+        "lure_type": lure_type,
+        "confidence": max(0, min(100, round(confidence))),
+        "visual_features": _strings(answer.get(FIELDS["visual_features"])),
+        "reasoning": answer.get(FIELDS["reasoning"]) if isinstance(answer.get(FIELDS["reasoning"]), str) else "",
+        "target_species": _strings(answer.get(FIELDS["target_species"])),
+    }
+
+
+def compact(analysis: Dict) -> Dict:
+    """An analysis with full field names in its wire form (for tests and fakes)"""
+    wire = {FIELDS.get(name, name): value for name, value in analysis.items()}
+    if "image" in wire:
+        wire[IMAGE_FIELD] = wire.pop("image")
+    return wire
+
+
+def _load(content):
+    if not isinstance(content, str):
+        raise AnalysisFormatError("no answer content")
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        raise AnalysisFormatError(f"not JSON: {e}")
+
+
+def _strings(value) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    return [item for item in value if isinstance(item, str)]
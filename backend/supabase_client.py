@@ -6,11 +6,22 @@ Handles database and storage operations
 from supabase import create_client, Client
 import config
 from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import mimetypes
+import threading
+
+from image_renditions import URL_COLUMNS, original_path, rendition_path
+from result_cache import image_digest
+
+# Storage paths this worker has uploaded or seen exist, most recent last
+KNOWN_PATHS_MAX = 4096
 
 class SupabaseService:
     def __init__(self):
         """Initialize Supabase client with service role key (backend only)"""
+        self._init_storage_index()
         if not config.SUPABASE_URL or not config.SUPABASE_SERVICE_ROLE_KEY:
             print("[WARNING] Supabase credentials not found in config")
             print("[INFO] To enable Supabase:")
@@ -44,6 +55,13 @@ class SupabaseService:
         """Check if Supabase is properly configured"""
         return self.enabled and self.client is not None
     
+    def _init_storage_index(self):
+        self._known_paths: OrderedDict = OrderedDict()
+        self._storage_lock = threading.Lock()
+        self._storage_stats = {"uploads": 0, "skipped_known": 0, "skipped_exists": 0, "head_checks": 0}
+        # storage3 releases before bucket.exists() get every upload sent, as before
+        self._can_check_storage = True
+    
     # ========================================================================
     # LURE ANALYSES
     # ========================================================================
@@ -80,6 +98,35 @@ class SupabaseService:
                 print("[INFO] Database schema error - run supabase_schema.sql in Supabase SQL Editor")
             return None
     
+    def create_pending_scans(self, user_id: str, image_names: List[str]) -> List[Optional[str]]:
+        """Create pending scan records for a batch upload in one insert; IDs in image_names order"""
+        if not self.is_enabled():
+            print("[WARNING] Supabase not enabled, skipping pending scan creation")
+            return [None for _ in image_names]
+        if not image_names:
+            return []
+        
+        try:
+            rows = [{
+                'user_id': user_id,
+                'lure_type': 'Scanning...',  # Placeholder, will be updated
+                'confidence': 0,
+                'image_name': image_name or 'pending',
+                'analysis_method': 'Pending',
+            } for image_name in image_names]
+            
+            response = self.client.table('lure_analyses').insert(rows).execute()
+            scan_ids = [row.get('id') for row in (response.data or [])]
+            if len(scan_ids) != len(image_names):
+                print(f"[ERROR] ✗ Pending scan insert returned {len(scan_ids)} IDs for {len(image_names)} scans")
+                return [None for _ in image_names]
+            print(f"[OK] ✓ Created {len(scan_ids)} pending scan records for user {user_id}")
+            return scan_ids
+            
+        except Exception as e:
+            print(f"[ERROR] Failed to create pending scans: {str(e)}")
+            return [None for _ in image_names]
+    
     def update_scan_with_results(self, scan_id: str, analysis_data: Dict) -> Optional[Dict]:
         """Update a pending scan record with analysis results"""
         if not self.is_enabled():
@@ -96,6 +143,8 @@ class SupabaseService:
                 'lure_type': lure_type,
                 'confidence': confidence,
                 'image_url': analysis_data.get('image_url'),
+                'image_thumb_url': analysis_data.get('image_thumb_url'),
+                'image_medium_url': analysis_data.get('image_medium_url'),
                 'image_name': analysis_data.get('image_name'),
                 'image_path': analysis_data.get('image_path'),
                 'analysis_method': analysis_data.get('analysis_method', 'ChatGPT Vision API'),
@@ -103,6 +152,7 @@ class SupabaseService:
                 'lure_details': analysis_data.get('lure_details', {}),
                 'api_cost_usd': analysis_data.get('api_cost_usd'),
                 'tokens_used': analysis_data.get('tokens_used'),
+                'cached_tokens': analysis_data.get('cached_tokens'),
             }
             
             # Remove None values to avoid overwriting with null
@@ -139,6 +189,8 @@ class SupabaseService:
                 'lure_type': lure_type,  # Required field, default to 'Unknown'
                 'confidence': confidence,
                 'image_url': analysis_data.get('image_url'),
+                'image_thumb_url': analysis_data.get('image_thumb_url'),
+                'image_medium_url': analysis_data.get('image_medium_url'),
                 'image_name': analysis_data.get('image_name'),
                 'image_path': analysis_data.get('image_path'),
                 'analysis_method': analysis_data.get('analysis_method', 'ChatGPT Vision API'),
@@ -146,6 +198,7 @@ class SupabaseService:
                 'lure_details': analysis_data.get('lure_details', {}),
                 'api_cost_usd': analysis_data.get('api_cost_usd'),
                 'tokens_used': analysis_data.get('tokens_used'),
+                'cached_tokens': analysis_data.get('cached_tokens'),
             }
             
             response = self.client.table('lure_analyses').insert(data_to_insert).execute()
@@ -246,51 +299,178 @@ class SupabaseService:
     # STORAGE
     # ========================================================================
     
-    def upload_lure_image(self, user_id: str, file_path: str, file_name: str) -> Optional[str]:
-        """Upload lure image to Supabase Storage"""
+    def upload_lure_image(self, user_id: str, file_path: str, file_name: str,
+                          file_data: Optional[bytes] = None) -> Optional[str]:
+        """
+        Upload lure image to Supabase Storage (file_data: the image, if already
+        in memory). The path is keyed by the image's content hash; an image
+        already in Storage is not uploaded again.
+        """
         if not self.is_enabled():
             print("[WARNING] Supabase not enabled, skipping image upload")
             return None
         
         try:
             # Read file
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
+            if file_data is None:
+                with open(file_path, 'rb') as f:
+                    file_data = f.read()
             
-            # Upload to storage with user-specific path
-            storage_path = f"{user_id}/{file_name}"
-            
-            self.client.storage.from_('lure-images').upload(
-                storage_path,
-                file_data,
-                file_options={"content-type": "image/jpeg", "upsert": "true"}
-            )
-            
-            # Get public URL
-            public_url = self.client.storage.from_('lure-images').get_public_url(storage_path)
-            
-            print(f"[OK] Uploaded image to Supabase Storage: {storage_path}")
-            return public_url
+            storage_path = original_path(user_id, image_digest(file_data), file_name)
+            if self._is_stored(storage_path):
+                return self._public_url(storage_path)
+            content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+            return self._upload_to_storage(storage_path, file_data, content_type)
             
         except Exception as e:
-            error_msg = str(e)
-            print(f"[ERROR] Failed to upload to Supabase Storage: {error_msg}")
-            if "bucket" in error_msg.lower():
-                print("[INFO] Storage bucket error - create 'lure-images' bucket in Supabase Storage")
-                print("[INFO] Run the storage policies from supabase_schema.sql")
-            elif "policy" in error_msg.lower() or "permission" in error_msg.lower():
-                print("[INFO] Permission error - check storage policies in Supabase")
-            elif "JWT" in error_msg or "authentication" in error_msg.lower():
-                print("[INFO] Authentication error - check your SUPABASE_SERVICE_ROLE_KEY")
+            self._report_storage_error(e)
             return None
     
+    def find_lure_renditions(self, user_id: str, digest: str, names: List[str],
+                             file_name: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        URL fields (as upload_lure_renditions returns them) for an upload whose
+        renditions (names, largest first) are all in Storage already, plus its original when file_name
+        is given; None if any is missing. Lets a repeat upload skip rendering.
+        """
+        if not self.is_enabled() or not names:
+            return None
+        
+        paths = {name: rendition_path(user_id, digest, name) for name in names}
+        if file_name is not None:
+            paths['original'] = original_path(user_id, digest, file_name)
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+            if not all(pool.map(self._is_stored, paths.values())):
+                return None
+        
+        urls = {URL_COLUMNS[name]: self._public_url(paths[name]) for name in names}
+        urls['image_url'] = self._public_url(paths.get('original', paths[names[0]]))
+        print(f"[OK] Image already in Supabase Storage: {user_id}/{digest}")
+        return urls
+    
+    def upload_lure_renditions(self, user_id: str, digest: str, renditions: Dict[str, bytes],
+                               original: Optional[bytes] = None, file_name: Optional[str] = None) -> Dict[str, str]:
+        """
+        Upload an upload's JPEG renditions (see image_renditions) in parallel,
+        plus the original (file_name gives its extension) when given, under
+        paths keyed by the upload's content digest. Returns
+        {"image_thumb_url": ..., ...} for the renditions that uploaded, and
+        "image_url": the original's URL, or the largest rendition's when the
+        original isn't stored.
+        """
+        if not self.is_enabled():
+            print("[WARNING] Supabase not enabled, skipping image upload")
+            return {}
+        
+        def upload(name):
+            try:
+                if name == 'original':
+                    return self.upload_lure_image(user_id, None, file_name or '', file_data=original)
+                storage_path = rendition_path(user_id, digest, name)
+                if self._is_stored(storage_path, check_storage=False):
+                    return self._public_url(storage_path)
+                return self._upload_to_storage(storage_path, renditions[name], 'image/jpeg')
+            except Exception as e:
+                self._report_storage_error(e)
+                return None
+        
+        names = list(renditions) + (['original'] if original is not None else [])
+        with ThreadPoolExecutor(max_workers=len(names) or 1) as pool:
+            uploaded = dict(zip(names, pool.map(upload, names)))
+        
+        urls = {URL_COLUMNS[name]: uploaded[name] for name in renditions if uploaded[name]}
+        # make_renditions returns the largest rendition first
+        largest = next(iter(renditions), None)
+        image_url = uploaded.get('original') or (uploaded[largest] if largest else None)
+        if image_url:
+            urls['image_url'] = image_url
+        return urls
+    
+    def _is_stored(self, storage_path: str, check_storage: bool = True) -> bool:
+        """
+        Whether an object is in the lure-images bucket: paths this worker has
+        uploaded or seen are answered from memory, others (with check_storage)
+        by a HEAD request. Paths are content-addressed, so an object that
+        exists has the bytes we would upload.
+        """
+        with self._storage_lock:
+            if storage_path in self._known_paths:
+                self._known_paths.move_to_end(storage_path)
+                self._storage_stats["skipped_known"] += 1
+                return True
+            if not check_storage or not self._can_check_storage:
+                return False
+            self._storage_stats["head_checks"] += 1
+        try:
+            exists = self.client.storage.from_('lure-images').exists(storage_path)
+        except AttributeError:
+            print("[WARNING] This storage3 version has no bucket.exists() - uploading without checking Storage")
+            with self._storage_lock:
+                self._can_check_storage = False
+            return False
+        except Exception as e:
+            # Not knowing costs one redundant upload, not a failed scan
+            print(f"[WARNING] Could not check Supabase Storage for {storage_path}: {e}")
+            return False
+        if exists:
+            self._remember_path(storage_path)
+            with self._storage_lock:
+                self._storage_stats["skipped_exists"] += 1
+        return bool(exists)
+    
+    def _remember_path(self, storage_path: str):
+        with self._storage_lock:
+            self._known_paths[storage_path] = True
+            self._known_paths.move_to_end(storage_path)
+            while len(self._known_paths) > KNOWN_PATHS_MAX:
+                self._known_paths.popitem(last=False)
+    
+    def _public_url(self, storage_path: str) -> str:
+        return self.client.storage.from_('lure-images').get_public_url(storage_path)
+    
+    def _upload_to_storage(self, storage_path: str, data: bytes, content_type: str) -> str:
+        """Upload one object to the lure-images bucket; returns its public URL"""
+        # upsert: a concurrent upload of the same content may have won the race
+        self.client.storage.from_('lure-images').upload(
+            storage_path,
+            data,
+            file_options={"content-type": content_type, "upsert": "true"}
+        )
+        self._remember_path(storage_path)
+        with self._storage_lock:
+            self._storage_stats["uploads"] += 1
+        
+        print(f"[OK] Uploaded image to Supabase Storage: {storage_path}")
+        return self._public_url(storage_path)
+    
+    def storage_stats(self) -> Dict:
+        """Upload and deduplication counters for this worker"""
+        with self._storage_lock:
+            return dict(self._storage_stats, known_paths=len(self._known_paths))
+    
+    def _report_storage_error(self, error: Exception):
+        error_msg = str(error)
+        print(f"[ERROR] Failed to upload to Supabase Storage: {error_msg}")
+        if "bucket" in error_msg.lower():
+            print("[INFO] Storage bucket error - create 'lure-images' bucket in Supabase Storage")
+            print("[INFO] Run the storage policies from supabase_schema.sql")
+        elif "policy" in error_msg.lower() or "permission" in error_msg.lower():
+            print("[INFO] Permission error - check storage policies in Supabase")
+        elif "JWT" in error_msg or "authentication" in error_msg.lower():
+            print("[INFO] Authentication error - check your SUPABASE_SERVICE_ROLE_KEY")
+    
     def delete_lure_image(self, storage_path: str) -> bool:
-        """Delete lure image from Supabase Storage"""
+        """
+        Delete lure image from Supabase Storage. Paths are content-addressed,
+        so the object may also back other scans of the same photo.
+        """
         if not self.is_enabled():
             return False
         
         try:
             self.client.storage.from_('lure-images').remove([storage_path])
+            with self._storage_lock:
+                self._known_paths.pop(storage_path, None)
             print(f"[OK] Deleted image from Supabase Storage: {storage_path}")
             return True
             
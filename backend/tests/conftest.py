@@ -0,0 +1,165 @@
+"""
+Shared fixtures for backend tests.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Point every on-disk cache and folder at the test's tmp dir."""
+    import config
+
+    monkeypatch.setattr(config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(config, 'RESULTS_FOLDER', str(tmp_path / 'analysis_results'))
+    monkeypatch.setattr(config, 'RESULT_CACHE_PATH', str(tmp_path / 'cache' / 'results.sqlite3'))
+    monkeypatch.setattr(config, 'NEAR_DUPLICATE_INDEX_PATH', str(tmp_path / 'cache' / 'near_duplicates.sqlite3'))
+    monkeypatch.setattr(config, 'SINGLE_FLIGHT_LOCK_PATH', str(tmp_path / 'cache' / 'inflight.sqlite3'))
+    monkeypatch.setattr(config, 'SCAN_JOB_DB_PATH', str(tmp_path / 'cache' / 'scan_jobs.sqlite3'))
+    monkeypatch.setattr(config, 'UPLOAD_CACHE_DIR', str(tmp_path / 'cache' / 'uploads'))
+
+
+class FakeSupabaseService:
+    """Records calls made by the upload pipeline instead of talking to Supabase."""
+
+    def __init__(self, can_scan=True):
+        self.can_scan = can_scan
+        self.remaining = 10
+        self.pending_scans = []
+        self.updates = []
+        self.uploads = []
+        self.stored_images = {}
+
+    def is_enabled(self):
+        return True
+
+    def can_user_scan(self, user_id):
+        remaining = self.remaining if self.can_scan else 0
+        return {'can_scan': remaining > 0, 'is_pro': False, 'used': 10 - remaining, 'remaining': remaining, 'limit': 10}
+
+    def create_pending_scan(self, user_id, image_name=None):
+        self.pending_scans.append((user_id, image_name))
+        return f'scan-{len(self.pending_scans)}'
+
+    def create_pending_scans(self, user_id, image_names):
+        return [self.create_pending_scan(user_id, image_name) for image_name in image_names]
+
+    def upload_lure_image(self, user_id, file_path, file_name, file_data=None):
+        self.uploads.append((user_id, file_name))
+        return f'https://storage.test/{user_id}/{file_name}'
+
+    def find_lure_renditions(self, user_id, digest, names, file_name=None):
+        return self.stored_images.get(digest)
+
+    def upload_lure_renditions(self, user_id, digest, renditions, original=None, file_name=None):
+        self.uploads.append((user_id, file_name))
+        self.renditions = renditions
+        urls = {f'image_{name}_url': f'https://storage.test/{user_id}/{digest}/{name}.jpg' for name in renditions}
+        urls['image_url'] = urls['image_medium_url']
+        return urls
+
+    def update_scan_with_results(self, scan_id, analysis_data):
+        self.updates.append((scan_id, analysis_data))
+        return {'id': scan_id}
+
+    def storage_stats(self):
+        return {'uploads': len(self.uploads)}
+
+    def save_lure_analysis(self, user_id, analysis_data):
+        return {'id': 'saved'}
+
+
+class FakeClassifier:
+    """Stands in for MobileLureClassifier in endpoint tests."""
+
+    def __init__(self, lure_type='Jig', delay=0.0):
+        self.lure_type = lure_type
+        self.delay = delay
+        self.calls = []
+        self.options = []
+        self.quality_gate = None
+        self.near_duplicate_index = None
+        self.cached = {}
+
+    def analyze_lure(self, image_path, *args, **kwargs):
+        import time
+        self.calls.append(image_path)
+        self.options.append(kwargs)
+        if self.delay:
+            time.sleep(self.delay)
+        return {
+            'success': True, 'image_path': image_path, 'lure_type': self.lure_type, 'confidence': 85,
+            'chatgpt_analysis': {}, 'lure_details': {}, 'analysis_method': 'ChatGPT Vision API',
+        }
+
+    def probe_cache(self, digest, perceptual_hash=None):
+        cached = self.cached.get(digest)
+        return dict(cached) if cached else None
+
+    def save_analysis_to_json(self, results):
+        return 'analysis.json'
+
+    def get_stats(self):
+        return {}
+
+
+@pytest.fixture
+def backend_app(tmp_path, monkeypatch):
+    """The real Flask app with Supabase, the classifier and rate limits swapped out."""
+    import auth
+    import app as app_module
+    from scan_jobs import JobStore, ScanJobQueue
+    from upload_image_cache import UploadImageCache
+
+    monkeypatch.setattr(auth, 'SUPABASE_JWT_SECRET', '')
+    monkeypatch.setattr(auth, 'IS_PRODUCTION', False)
+    monkeypatch.setattr(app_module.limiter, 'enabled', False)
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setitem(app_module.app.config, 'TESTING', True)
+    monkeypatch.setattr(app_module, 'supabase_service', FakeSupabaseService())
+    monkeypatch.setattr(app_module, 'mobile_classifier', FakeClassifier())
+    monkeypatch.setattr(app_module, 'scan_jobs', ScanJobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=2))
+    monkeypatch.setattr(app_module, 'upload_cache', UploadImageCache.from_config())
+    (tmp_path / 'uploads').mkdir(exist_ok=True)
+    return app_module
+
+
+@pytest.fixture
+def api_client(backend_app):
+    return backend_app.app.test_client()
+
+
+@pytest.fixture
+def make_classifier(monkeypatch):
+    """
+    Factory for a MobileLureClassifier that talks to a FakeOpenAIServer.
+    Keyword arguments go to the constructor; the result cache and detail
+    routing are off unless given.
+    """
+    import mobile_lure_classifier
+
+    def make(server, **kwargs):
+        monkeypatch.setattr(mobile_lure_classifier.config, 'OPENAI_API_BASE', server.base_url)
+        options = {'openai_api_key': 'test-key', 'result_cache': False, 'detail_routing': 'off'}
+        options.update(kwargs)
+        return mobile_lure_classifier.MobileLureClassifier(**options)
+
+    return make
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """Factory for small JPEGs as bytes, for multipart uploads."""
+    import io
+    from PIL import Image
+
+    def make(size=(64, 48), color=(200, 80, 40)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    return make
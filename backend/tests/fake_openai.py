@@ -0,0 +1,202 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Used by tests (and benchmarks) that need a real socket without touching the
+network: keep-alive HTTP/1.1, optional TLS with a throwaway self-signed
+certificate, injectable latency and scripted status codes or faults.
+Requests with "stream": true get their 200 answers as server-sent event
+chunks, like the real endpoint's streaming mode.
+"""
+
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from structured_output import BATCH_FIELD, compact
+
+DEFAULT_ANALYSIS = {
+    'lure_type': 'Squarebill Crankbait',
+    'confidence': 91,
+    'visual_features': ['square bill', 'rounded body'],
+    'reasoning': 'Square diving bill visible at the nose',
+    'target_species': ['Largemouth Bass'],
+}
+
+
+def completion(content, prompt_tokens=1200, completion_tokens=80, cached_tokens=None):
+    """
+    Chat completion response body wrapping content as the assistant message.
+    An analysis dict (or a list of them, for a batch) is sent in the response
+    schema's compact wire form; a string is sent as is. cached_tokens adds
+    the prompt cache figure to the usage block.
+    """
+    if isinstance(content, list):
+        content = {BATCH_FIELD: content}
+    if isinstance(content, dict) and isinstance(content.get(BATCH_FIELD), list):
+        content = {BATCH_FIELD: [compact(analysis) for analysis in content[BATCH_FIELD]]}
+    elif isinstance(content, dict):
+        content = compact(content)
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    usage = {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+    if cached_tokens is not None:
+        usage['prompt_tokens_details'] = {'cached_tokens': cached_tokens}
+    return {
+        'id': 'chatcmpl-test',
+        'object': 'chat.completion',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': usage,
+    }
+
+
+def make_self_signed_cert(directory):
+    """Write cert.pem/key.pem for localhost into directory; returns (cert, key) or None."""
+    if not shutil.which('openssl'):
+        return None
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+         '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def stream_chunks(payload, pieces=10):
+    """
+    A completion body as streaming-mode chunks: the content split into
+    pieces deltas, then a usage-only chunk (as with stream_options.include_usage)
+    """
+    content = payload['choices'][0]['message']['content']
+    size = max(1, -(-len(content) // pieces))
+    chunks = [{'id': payload['id'], 'object': 'chat.completion.chunk',
+               'choices': [{'index': 0, 'delta': {'content': content[start:start + size]}, 'finish_reason': None}]}
+              for start in range(0, len(content), size)]
+    chunks.append({'id': payload['id'], 'object': 'chat.completion.chunk', 'choices': [], 'usage': payload['usage']})
+    return chunks
+
+
+DROP = 'drop'
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP(S) server answering POST /v1/chat/completions.
+
+    script: optional list of (status, body_dict, headers_dict[, delay]) consumed
+    one per request; once exhausted (or when absent) every request gets a 200
+    with DEFAULT_ANALYSIS. A step's delay overrides latency for that request,
+    and a status of DROP closes the connection without answering.
+    latency: seconds to sleep before answering.
+    stream_delay: seconds between the chunks of a streamed answer.
+    malformed_streams: how many streamed answers get a chunk cut off mid-JSON.
+    """
+
+    def __init__(self, latency=0.0, script=None, certfile=None, keyfile=None, stream_delay=0.0,
+                 malformed_streams=0):
+        self.latency = latency
+        self.stream_delay = stream_delay
+        self.malformed_streams = malformed_streams
+        self.script = list(script or [])
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                with server._lock:
+                    server.requests.append({'path': self.path, 'headers': dict(self.headers), 'body': body})
+                    step = server.script.pop(0) if server.script else None
+
+                status, payload, headers, *delay = step or (200, completion(DEFAULT_ANALYSIS), {})
+                delay = delay[0] if delay else server.latency
+                if delay:
+                    time.sleep(delay)
+
+                if status == DROP:
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+
+                if status == 200 and json.loads(body or b'{}').get('stream'):
+                    self.send_stream(payload, headers)
+                    return
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, payload, headers):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                events = [f'data: {json.dumps(chunk)}\n\n' for chunk in stream_chunks(payload)]
+                with server._lock:
+                    malformed = server.malformed_streams > 0
+                    server.malformed_streams -= malformed
+                if malformed:
+                    events[1] = events[1][:len(events[1]) // 2] + '\n\n'
+                for event in events + ['data: [DONE]\n\n']:
+                    data = event.encode()
+                    self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                    self.wfile.flush()
+                    if server.stream_delay:
+                        time.sleep(server.stream_delay)
+                self.wfile.write(b'0\r\n\r\n')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = 'https'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host = 'localhost' if self.scheme == 'https' else '127.0.0.1'
+        return f'{self.scheme}://{host}:{self.httpd.server_address[1]}/v1'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,133 @@
+"""
+Tests for MobileLureClassifier.analyze_lure_async
+
+Runs against the local fake OpenAI endpoint with injected latency to check
+that classifications overlap on one event loop and share the sync path's
+parsing and lure type post-processing.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import FakeOpenAIServer, completion
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    from PIL import Image
+    paths = []
+    for i in range(8):
+        path = tmp_path / f'lure_{i}.jpg'
+        Image.new('RGB', (200, 150), (i * 30, 80, 160)).save(path, 'JPEG')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'VISION_RETRY_BASE_SECONDS', 0.01)
+
+
+class TestAnalyzeLureAsync:
+    def test_requests_overlap_on_one_loop(self, image_paths, make_classifier):
+        with FakeOpenAIServer(latency=0.4) as server:
+            classifier = make_classifier(server)
+
+            async def run():
+                try:
+                    return await asyncio.gather(*(classifier.analyze_lure_async(p) for p in image_paths))
+                finally:
+                    await classifier.async_http.aclose()
+
+            started = time.perf_counter()
+            results = asyncio.run(run())
+            elapsed = time.perf_counter() - started
+
+        assert all(r['lure_type'] == 'Squarebill Crankbait' for r in results)
+        # Sequential would take 8 x 0.4 s
+        assert elapsed < 2.0
+        assert len(server.requests) == len(image_paths)
+
+    def test_shares_post_processing_with_sync_path(self, image_paths, make_classifier):
+        generic = {
+            'lure_type': 'Spinnerbait', 'confidence': 70,
+            'visual_features': ['two blades', 'skirt'], 'reasoning': 'double willow blades',
+        }
+        script = [(200, completion(generic), {}), (200, completion(generic), {})]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            async_result = asyncio.run(classifier.analyze_lure_async(image_paths[0]))
+            sync_result = classifier.analyze_lure(image_paths[0])
+
+        assert async_result['lure_type'] == 'Double Blade Spinnerbait'
+        assert async_result['lure_type'] == sync_result['lure_type']
+        assert async_result['lure_details'] == sync_result['lure_details']
+
+    def test_upstream_error_is_reported(self, image_paths, make_classifier):
+        with FakeOpenAIServer(script=[(500, {'error': 'boom'}, {})] * 3) as server:
+            classifier = make_classifier(server)
+            result = asyncio.run(classifier.analyze_lure_async(image_paths[0]))
+
+        assert result['error'].startswith('API request failed: 500')
+        assert result['retryable'] is True
+        assert len(server.requests) == 3
+
+    def test_transient_error_is_retried(self, image_paths, make_classifier):
+        with FakeOpenAIServer(script=[(503, {'error': 'busy'}, {})]) as server:
+            classifier = make_classifier(server)
+            result = asyncio.run(classifier.analyze_lure_async(image_paths[0]))
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert classifier.get_stats()['resilience']['retries'] == 1
+
+
+class TestAsyncDeduplication:
+    """The async path skips paid calls the same way analyze_lure does"""
+
+    def make_caching_classifier(self, server, make_classifier, tmp_path):
+        from near_duplicate import NearDuplicateIndex
+        from result_cache import ResultCache
+        from single_flight import SingleFlight
+
+        return make_classifier(
+            server,
+            result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5),
+            near_duplicate_index=NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=4),
+            single_flight=SingleFlight(None),
+        )
+
+    def test_concurrent_calls_share_one_request(self, image_paths, make_classifier, tmp_path):
+        with FakeOpenAIServer(latency=0.3) as server:
+            classifier = self.make_caching_classifier(server, make_classifier, tmp_path)
+
+            async def run():
+                return await asyncio.gather(*(classifier.analyze_lure_async(image_paths[0]) for _ in range(3)))
+
+            results = asyncio.run(run())
+
+        assert len(server.requests) == 1
+        assert {result['lure_type'] for result in results} == {'Squarebill Crankbait'}
+        assert sum(bool(result.get('coalesced')) for result in results) == 2
+
+    def test_near_duplicate_answered_without_a_request(self, image_paths, make_classifier, tmp_path):
+        from result_cache import cache_key
+
+        with FakeOpenAIServer() as server:
+            classifier = self.make_caching_classifier(server, make_classifier, tmp_path)
+            with open(image_paths[0], 'rb') as image:
+                perceptual_hash = classifier._perceptual_hash(image.read())
+            classifier.near_duplicate_index.add(perceptual_hash ^ 1, cache_key('earlier-photo'))
+            classifier.result_cache.set(cache_key('earlier-photo'), {'lure_type': 'Jig', 'confidence': 90})
+
+            result = asyncio.run(classifier.analyze_lure_async(image_paths[0]))
+
+        assert server.requests == []
+        assert result['lure_type'] == 'Jig'
+        assert result['near_duplicate'] is True
@@ -0,0 +1,131 @@
+"""
+Tests for backend/auto_crop.py and the classifier's auto-crop step
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import config
+from auto_crop import crop_dimensions, crop_savings, find_crop_box
+from fake_openai import FakeOpenAIServer
+
+
+def scene(size=(4000, 3000), lure=(1700, 1200, 2300, 1700), seed=0):
+    """A noisy wooden-table background with a bright, striped lure on it"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    pixels = np.clip(np.array([150, 110, 70]) + rng.normal(0, 4, (height, width, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+    if lure:
+        draw = ImageDraw.Draw(img)
+        draw.ellipse(lure, fill=(230, 200, 20))
+        left, top, right, bottom = lure
+        for x in range(left + 40, right - 40, 60):
+            draw.line((x, top + 60, x, bottom - 60), fill=(20, 60, 30), width=14)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def sent_image(server):
+    image_url = json.loads(server.requests[-1]['body'])['messages'][-1]['content'][1]['image_url']
+    return Image.open(io.BytesIO(base64.b64decode(image_url['url'].split(',', 1)[1])))
+
+
+class TestFindCropBox:
+    def test_box_covers_the_lure_with_margin(self):
+        box = find_crop_box(scene(), margin=0.1, min_area=0.01, max_area=0.6)
+
+        assert box is not None
+        left, top, right, bottom = box
+        assert left <= 1700 and top <= 1200 and right >= 2300 and bottom >= 1700
+        # ...and not much more than the lure plus margin
+        assert (right - left) * (bottom - top) < 0.12 * 4000 * 3000
+
+    def test_plain_background_is_not_cropped(self):
+        assert find_crop_box(scene(lure=None), margin=0.1, min_area=0.01, max_area=0.6) is None
+
+    def test_lure_filling_the_frame_is_not_cropped(self):
+        box = find_crop_box(scene(lure=(200, 150, 3800, 2850)), margin=0.1, min_area=0.01, max_area=0.6)
+        assert box is None
+
+
+class TestCropSavings:
+    def test_tiles_and_tokens_saved(self):
+        pricing = config.MODEL_PRICING['gpt-4o']
+        savings = crop_savings((4000, 3000), (1700, 1200, 2300, 1600), 1200, None, pricing)
+
+        # Whole photo: sent at 1024x768, 2x2 tiles; the 600x400 crop at the same scale fits one tile
+        assert savings['tiles_before'] == 4
+        assert savings['tiles_after'] == 1
+        assert savings['image_tokens_saved'] == 3 * pricing['image_tile_tokens']
+        assert savings['box'] == [1700, 1200, 2300, 1600]
+        assert savings['original_dimensions'] == [4000, 3000]
+
+    def test_wide_crop_never_costs_more_tiles(self):
+        # Enlarged to 1200 px wide, this strip would cover 3 tiles; at the photo's own scale it covers 2
+        assert crop_dimensions((4000, 3000), (0, 1000, 4000, 1900), 1200, None) == (1024, 231)
+        savings = crop_savings((4000, 3000), (0, 1000, 4000, 1900), 1200, None, config.MODEL_PRICING['gpt-4o'])
+        assert savings['tiles_after'] == 2
+
+    def test_low_detail_saves_nothing(self):
+        savings = crop_savings((4000, 3000), (1700, 1200, 2300, 1600), 512, 'low', config.MODEL_PRICING['gpt-4o'])
+        assert savings['image_tokens_saved'] == 0
+
+
+class TestClassifierAutoCrop:
+    def test_cropped_image_is_sent(self, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server, auto_crop=True)
+            result = classifier.analyze_lure('upload.jpg', image_bytes=scene(lure=(1800, 1300, 2200, 1600)))
+            sent = sent_image(server)
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert sent.size[0] < 1024 and sent.size[1] < 768
+        assert result['auto_crop']['tiles_after'] < result['auto_crop']['tiles_before']
+        stats = classifier.get_stats()['auto_crop']
+        assert stats['cropped'] == 1
+        assert stats['image_tokens_saved'] == result['auto_crop']['image_tokens_saved'] > 0
+
+    def test_async_path_crops_too(self, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server, auto_crop=True)
+            result = asyncio.run(classifier.analyze_lure_async('upload.jpg', image_bytes=scene()))
+            sent = sent_image(server)
+
+        assert sent.size[0] < 1024
+        assert 'auto_crop' in result
+
+    def test_disabled_sends_the_whole_photo(self, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server, auto_crop=False)
+            result = classifier.analyze_lure('upload.jpg', image_bytes=scene())
+            sent = sent_image(server)
+
+        assert sent.size == (1024, 768)
+        assert 'auto_crop' not in result
+        assert classifier.get_stats()['auto_crop']['cropped'] == 0
+
+    def test_crop_failure_falls_back_to_whole_photo(self, monkeypatch, make_classifier):
+        import mobile_lure_classifier
+
+        def broken(image_bytes):
+            raise ValueError('boom')
+
+        monkeypatch.setattr(mobile_lure_classifier, 'find_crop_box', broken)
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server, auto_crop=True)
+            result = classifier.analyze_lure('upload.jpg', image_bytes=scene())
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert classifier.get_stats()['auto_crop']['errors'] == 1
@@ -0,0 +1,117 @@
+"""
+Tests for MobileLureClassifier.analyze_lure_batch
+
+Several photos share one vision request; the JSON array answer is split
+back into per-photo results. Runs against the local fake OpenAI endpoint so
+the request bodies can be inspected.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+
+SPINNER = dict(DEFAULT_ANALYSIS, lure_type='Double Blade Spinnerbait', confidence=88)
+JIG = dict(DEFAULT_ANALYSIS, lure_type='Jig', confidence=93)
+
+
+@pytest.fixture
+def images(jpeg_bytes):
+    return [jpeg_bytes((800, 600), (40 * i, 90, 170)) for i in range(3)]
+
+
+def answer(*analyses, **usage):
+    return 200, completion([dict(analysis, image=number) for number, analysis in enumerate(analyses, 1)], **usage), {}
+
+
+def sent_content(request):
+    return json.loads(request['body'])['messages'][-1]['content']
+
+
+class TestAnalyzeLureBatch:
+    def test_one_request_split_into_results(self, images, make_classifier):
+        script = [answer(DEFAULT_ANALYSIS, SPINNER, JIG, prompt_tokens=3000, completion_tokens=300)]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure_batch(['a.jpg', 'b.jpg', 'c.jpg'], images=images)
+
+        assert len(server.requests) == 1
+        assert [result['lure_type'] for result in results] == ['Squarebill Crankbait', 'Double Blade Spinnerbait', 'Jig']
+        assert [result['image_path'] for result in results] == ['a.jpg', 'b.jpg', 'c.jpg']
+        assert results[1]['lure_details'] == classifier.get_lure_info('Double Blade Spinnerbait')
+        assert results[0]['token_usage'] == {'prompt_tokens': 1000, 'completion_tokens': 100, 'total_tokens': 1100}
+        assert all(result['batch_size'] == 3 for result in results)
+
+        content = sent_content(server.requests[0])
+        assert [part['text'] for part in content if part['type'] == 'text'][1:] == ['Image 1:', 'Image 2:', 'Image 3:']
+        assert sum(part['type'] == 'image_url' for part in content) == 3
+        stats = classifier.get_stats()['batch']
+        assert stats['requests'] == 1 and stats['images'] == 3
+        assert stats['prompt_tokens_per_image'] == 1000
+
+    def test_answers_matched_by_label_not_position(self, images, make_classifier):
+        content = [dict(JIG, image='Image 3'), dict(SPINNER, image=1), dict(DEFAULT_ANALYSIS, image=2)]
+        with FakeOpenAIServer(script=[(200, completion({'results': content}), {})]) as server:
+            results = make_classifier(server).analyze_lure_batch(['a', 'b', 'c'], images=images)
+
+        assert [result['lure_type'] for result in results] == ['Double Blade Spinnerbait', 'Squarebill Crankbait', 'Jig']
+
+    def test_missing_answer_retried_on_its_own(self, images, make_classifier):
+        script = [answer(SPINNER, JIG), (200, completion(DEFAULT_ANALYSIS), {})]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure_batch(['a', 'b', 'c'], images=images)
+
+        assert len(server.requests) == 2
+        assert results[2]['lure_type'] == 'Squarebill Crankbait'
+        assert 'batch_size' not in results[2]
+        assert classifier.get_stats()['batch']['fallbacks'] == 1
+
+    def test_failed_request_fails_every_photo(self, images, make_classifier):
+        with FakeOpenAIServer(script=[(400, {'error': 'bad request'}, {})]) as server:
+            results = make_classifier(server).analyze_lure_batch(['a', 'b', 'c'], images=images)
+
+        assert len(server.requests) == 1
+        assert all('400' in result['error'] for result in results)
+
+    def test_groups_of_batch_max_images(self, jpeg_bytes, monkeypatch, make_classifier):
+        monkeypatch.setattr('config.BATCH_MAX_IMAGES', 2)
+        images = [jpeg_bytes((400, 300), (i * 50, 60, 60)) for i in range(5)]
+        script = [answer(JIG, JIG), answer(JIG, JIG), (200, completion(JIG), {})]
+        with FakeOpenAIServer(script=script) as server:
+            results = make_classifier(server).analyze_lure_batch(list('abcde'), images=images)
+
+        assert [len([p for p in sent_content(r) if p['type'] == 'image_url']) for r in server.requests] == [2, 2, 1]
+        assert all(result['lure_type'] == 'Jig' for result in results)
+
+    def test_cached_photos_are_not_sent(self, tmp_path, images, make_classifier):
+        from result_cache import ResultCache
+        cache = ResultCache(str(tmp_path / 'results.sqlite3'), ttl_seconds=60, negative_ttl_seconds=5)
+        script = [(200, completion(DEFAULT_ANALYSIS), {}), answer(SPINNER, JIG)]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server, result_cache=cache)
+            classifier.analyze_lure('first.jpg', image_bytes=images[0])
+            results = classifier.analyze_lure_batch(['a', 'b', 'c'], images=images)
+
+        assert len(server.requests) == 2
+        assert sum(p['type'] == 'image_url' for p in sent_content(server.requests[1])) == 2
+        assert results[0]['cached'] is True
+        assert [result['lure_type'] for result in results[1:]] == ['Double Blade Spinnerbait', 'Jig']
+
+    def test_adaptive_escalates_weak_answers_singly(self, images, make_classifier):
+        weak = dict(DEFAULT_ANALYSIS, confidence=30)
+        script = [answer(DEFAULT_ANALYSIS, weak), (200, completion(SPINNER), {})]
+        with FakeOpenAIServer(script=script) as server:
+            results = make_classifier(server, detail_routing='adaptive').analyze_lure_batch(
+                ['a', 'b'], images=images[:2])
+
+        assert [part['image_url']['detail'] for part in sent_content(server.requests[0])
+                if part['type'] == 'image_url'] == ['low', 'low']
+        assert results[0]['detail'] == 'low'
+        assert results[1]['detail'] == 'high' and results[1]['lure_type'] == 'Double Blade Spinnerbait'
@@ -0,0 +1,158 @@
+"""
+Tests for /api/batch-upload
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from result_cache import image_digest
+
+
+def batch_upload(api_client, files):
+    return api_client.post(
+        '/api/batch-upload', data={'files': [(io.BytesIO(data), name) for name, data in files]},
+        headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+    )
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def file_lines(response):
+    return sorted((line for line in lines(response) if line['type'] == 'file'), key=lambda line: line['index'])
+
+
+class TestBatchUpload:
+    def test_streams_one_line_per_file(self, backend_app, api_client, jpeg_bytes):
+        files = [(f'lure_{i}.jpg', jpeg_bytes(color=(i * 40, 80, 40))) for i in range(3)]
+
+        response = batch_upload(api_client, files)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        parsed = lines(response)
+        assert parsed[0] == dict(parsed[0], type='batch', files=3, accepted=3)
+        assert parsed[-1] == {'type': 'done', 'ok': 3}
+        assert [line['status'] for line in file_lines(response)] == ['ok', 'ok', 'ok']
+        assert file_lines(response)[0]['result']['lure_type'] == 'Jig'
+        assert len(backend_app.supabase_service.pending_scans) == 3
+        assert sorted(scan_id for scan_id, _ in backend_app.supabase_service.updates) == ['scan-1', 'scan-2', 'scan-3']
+
+    def test_files_past_remaining_quota_are_skipped(self, backend_app, api_client, jpeg_bytes):
+        backend_app.supabase_service.remaining = 2
+        files = [(f'lure_{i}.jpg', jpeg_bytes()) for i in range(3)]
+
+        response = batch_upload(api_client, files)
+
+        assert [line['status'] for line in file_lines(response)] == ['ok', 'ok', 'quota_exceeded']
+        assert len(backend_app.supabase_service.pending_scans) == 2
+        assert lines(response)[-1] == {'type': 'done', 'ok': 2, 'quota_exceeded': 1}
+
+    def test_no_quota_is_refused_up_front(self, backend_app, api_client, jpeg_bytes):
+        backend_app.supabase_service.can_scan = False
+
+        response = batch_upload(api_client, [('lure.jpg', jpeg_bytes())])
+
+        assert response.status_code == 403
+        assert response.get_json()['error'] == 'quota_exceeded'
+
+    def test_rejected_photos_cost_no_quota(self, backend_app, api_client, jpeg_bytes):
+        dark = jpeg_bytes(color=(0, 0, 0))
+
+        class Gate:
+            def check(self, image_bytes):
+                return {'error': 'retake_photo', 'reasons': ['too_dark']} if image_bytes == dark else None
+
+        backend_app.mobile_classifier.quality_gate = Gate()
+        response = batch_upload(api_client, [('dark.jpg', dark), ('lure.jpg', jpeg_bytes())])
+
+        assert [line['status'] for line in file_lines(response)] == ['retake_photo', 'ok']
+        assert backend_app.supabase_service.pending_scans == [('user-1', 'lure.jpg')]
+
+    def test_duplicate_names_do_not_collide(self, backend_app, api_client, jpeg_bytes, tmp_path):
+        first, second = jpeg_bytes(color=(10, 10, 10)), jpeg_bytes(color=(250, 250, 250))
+
+        response = batch_upload(api_client, [('image.jpg', first), ('image.jpg', second)])
+
+        names = [line['filename'] for line in file_lines(response)]
+        assert names == ['image.jpg', 'image_1.jpg']
+        for data in (first, second):
+            assert (tmp_path / 'uploads' / f'{image_digest(data)}.jpg').read_bytes() == data
+
+    def test_scans_run_with_bounded_concurrency(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        running, peak, lock = [0], [0], threading.Lock()
+        analyze = backend_app.mobile_classifier.analyze_lure
+
+        def tracked(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return analyze(*args, **kwargs)
+
+        monkeypatch.setattr(backend_app.mobile_classifier, 'analyze_lure', tracked)
+        monkeypatch.setattr(backend_app, 'batch_executor', ThreadPoolExecutor(max_workers=2))
+        response = batch_upload(api_client, [(f'lure_{i}.jpg', jpeg_bytes()) for i in range(6)])
+
+        assert lines(response)[-1] == {'type': 'done', 'ok': 6}
+        assert peak[0] == 2
+
+    @pytest.mark.parametrize('count', [0, 4])
+    def test_file_count_limits(self, backend_app, api_client, jpeg_bytes, monkeypatch, count):
+        monkeypatch.setattr(backend_app.config, 'BATCH_UPLOAD_MAX_FILES', 3)
+
+        response = batch_upload(api_client, [(f'lure_{i}.jpg', jpeg_bytes()) for i in range(count)])
+
+        assert response.status_code == 400
+
+    def test_oversized_file_fails_alone(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(backend_app.config, 'MAX_IMAGE_SIZE_MB', 1)
+        files = [('huge.jpg', b'x' * (1024 * 1024 + 1)), ('lure.jpg', jpeg_bytes())]
+
+        response = batch_upload(api_client, files)
+
+        assert [line['status'] for line in file_lines(response)] == ['failed', 'ok']
+        assert file_lines(response)[0]['result'] == {'error': 'File too large'}
+        assert backend_app.supabase_service.pending_scans == [('user-1', 'lure.jpg')]
+
+    def test_batch_over_total_limit_is_refused(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(backend_app.config, 'BATCH_UPLOAD_MAX_TOTAL_MB', 0)
+
+        response = batch_upload(api_client, [('lure.jpg', jpeg_bytes())])
+
+        assert response.status_code == 413
+        assert backend_app.supabase_service.pending_scans == []
+
+    def test_single_image_endpoints_keep_their_size_limit(self, backend_app, api_client, monkeypatch):
+        monkeypatch.setitem(backend_app.app.config, 'MAX_CONTENT_LENGTH', 512)
+
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(b'x' * 1024), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 413
+
+    def test_chunked_upload_without_length_is_limited(self, backend_app, api_client, monkeypatch):
+        monkeypatch.setitem(backend_app.app.config, 'MAX_CONTENT_LENGTH', 512)
+        environ = EnvironBuilder(method='POST', data={'file': (io.BytesIO(b'x' * 1024), 'lure.jpg')}).get_environ()
+
+        response = api_client.post(
+            '/upload', input_stream=io.BytesIO(environ['wsgi.input'].read()), content_type=environ['CONTENT_TYPE'],
+            headers={'X-User-ID': 'user-1'}, environ_overrides={'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''},
+        )
+
+        assert response.status_code == 413
@@ -0,0 +1,222 @@
+"""
+Tests for the Postgres job queue and classifier_worker.py
+
+Needs a disposable Postgres: set TEST_DATABASE_URL (public.scan_jobs is
+created from database/supabase_scan_jobs.sql and truncated between tests).
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+MIGRATION = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'supabase_scan_jobs.sql')
+
+
+@pytest.fixture
+def store():
+    import psycopg
+    from pg_job_store import PostgresJobStore
+
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        with open(MIGRATION) as migration:
+            conn.execute(migration.read())
+        conn.execute('TRUNCATE public.scan_jobs')
+    return PostgresJobStore(TEST_DATABASE_URL, stale_seconds=600, max_attempts=2)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestPostgresJobStore:
+    def test_claim_returns_oldest_job_with_image(self, store):
+        user_id = str(uuid.uuid4())
+        first = store.create(user_id, {'image_name': 'a.jpg'}, image_bytes=b'first', image_name='a.jpg')
+        store.create(user_id, {'image_name': 'b.jpg'}, image_bytes=b'second', image_name='b.jpg')
+
+        job = store.claim('worker-1')
+
+        assert job['id'] == first
+        assert job['image_data'] == b'first'
+        assert job['attempts'] == 1
+        assert store.get(first)['status'] == 'running'
+
+    def test_empty_queue_returns_none(self, store):
+        assert store.claim('worker-1') is None
+
+    def test_concurrent_claims_never_share_a_job(self, store):
+        user_id = str(uuid.uuid4())
+        created = {store.create(user_id, {}, image_bytes=b'x') for _ in range(40)}
+        claimed, lock = [], threading.Lock()
+
+        def drain(worker_id):
+            while True:
+                job = store.claim(worker_id)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job['id'])
+
+        threads = [threading.Thread(target=drain, args=(f'worker-{i}',)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert sorted(claimed) == sorted(created)
+
+    def test_finishing_clears_image_data(self, store):
+        import psycopg
+
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x' * 1000)
+        store.claim('worker-1')
+        store.update(job_id, status='succeeded', stage='succeeded', result={'lure_type': 'Jig'})
+
+        with psycopg.connect(TEST_DATABASE_URL) as conn:
+            image_data = conn.execute('SELECT image_data FROM public.scan_jobs WHERE id = %s', (job_id,)).fetchone()[0]
+        assert image_data is None
+        assert store.get(job_id)['result'] == {'lure_type': 'Jig'}
+
+    def test_stale_claims_are_requeued_then_failed(self, store):
+        store.stale_seconds = 0
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x')
+
+        store.claim('worker-1')
+        assert store.requeue_stale() == 1
+        assert store.get(job_id)['status'] == 'queued'
+
+        store.claim('worker-2')
+        assert store.requeue_stale() == 1
+        job = store.get(job_id)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'interrupted'
+
+    def test_update_under_a_lost_claim_is_ignored(self, store):
+        store.stale_seconds = 0
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x')
+        first = store.claim('worker-1')
+        store.requeue_stale()
+        second = store.claim('worker-2')
+
+        assert not store.update(job_id, status='succeeded', result={'lure_type': 'stale'},
+                                worker_id='worker-1', attempt=first['attempts'])
+        assert store.update(job_id, stage='analyzing', worker_id='worker-2', attempt=second['attempts'])
+        job = store.get(job_id)
+        assert job['status'] == 'running' and job['result'] is None
+
+    def test_get_unknown_or_malformed_id(self, store):
+        assert store.get(str(uuid.uuid4())) is None
+        assert store.get('not-a-uuid') is None
+
+
+class TestClassifierWorker:
+    def test_processes_jobs_and_records_results(self, store):
+        from classifier_worker import ClassifierWorker
+
+        def process(job, set_stage):
+            set_stage('analyzing')
+            return {'lure_type': 'Jig', 'size': len(job['image_data'])}
+
+        job_ids = [store.create(str(uuid.uuid4()), {}, image_bytes=b'x' * i) for i in range(1, 6)]
+        worker = ClassifierWorker(store, process, concurrency=3, poll_interval=0.05)
+        worker.start()
+        try:
+            assert wait_for(lambda: all(store.get(j)['status'] == 'succeeded' for j in job_ids))
+        finally:
+            worker.stop()
+
+        assert [store.get(j)['result']['size'] for j in job_ids] == [1, 2, 3, 4, 5]
+        assert worker.stats()['succeeded'] == 5
+
+    def test_failed_job_is_recorded(self, store):
+        from classifier_worker import ClassifierWorker
+
+        def process(job, set_stage):
+            raise RuntimeError('classifier exploded')
+
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x')
+        worker = ClassifierWorker(store, process, concurrency=1, poll_interval=0.05)
+        worker.start()
+        try:
+            assert wait_for(lambda: store.get(job_id)['status'] == 'failed')
+        finally:
+            worker.stop()
+
+        assert store.get(job_id)['error'] == 'classifier exploded'
+        assert worker.stats()['failed'] == 1
+
+    def test_requeued_job_is_dropped_by_the_slow_worker(self, store):
+        from classifier_worker import ClassifierWorker
+
+        requeued = threading.Event()
+
+        def slow(job, set_stage):
+            store.stale_seconds = 0
+            store.requeue_stale()
+            store.claim('worker-2')
+            requeued.set()
+            set_stage('saving')
+            return {'lure_type': 'stale'}
+
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x')
+        worker = ClassifierWorker(store, slow, concurrency=1, poll_interval=0.05, sweep_interval=3600,
+                                  worker_id='worker-1')
+        worker.start()
+        try:
+            assert wait_for(lambda: worker.stats()['lost_claims'] == 1)
+        finally:
+            worker.stop()
+
+        assert requeued.is_set()
+        job = store.get(job_id)
+        assert job['status'] == 'running' and job['result'] is None
+        assert worker.stats()['succeeded'] == 0
+
+    def test_processor_runs_scan_pipeline(self, store):
+        from classifier_worker import make_processor
+        from conftest import FakeClassifier, FakeSupabaseService
+
+        supabase = FakeSupabaseService()
+        classifier = FakeClassifier()
+        process = make_processor(classifier, supabase)
+        job_id = store.create(str(uuid.uuid4()), {'pending_scan_id': 'scan-1', 'quality_checked': True},
+                              image_bytes=b'jpeg', image_name='lure.jpg')
+
+        result = process(store.claim('worker-1'), lambda stage: None)
+
+        assert result['lure_type'] == 'Jig'
+        assert result['image_name'] == 'lure.jpg'
+        assert supabase.updates[0][0] == 'scan-1'
+        assert job_id in result['image_path']
+        # Classified from the job's bytes: no scratch file, and the web tier's quality gate isn't repeated
+        assert not os.path.exists(result['image_path'])
+        assert classifier.options[0]['image_bytes'] == b'jpeg'
+        assert classifier.options[0]['quality_checked'] is True
+
+    def test_error_result_is_recorded_as_failed(self, store):
+        from classifier_worker import ClassifierWorker
+
+        job_id = store.create(str(uuid.uuid4()), {}, image_bytes=b'x')
+        worker = ClassifierWorker(store, lambda job, set_stage: {'error': 'Not a lure'}, concurrency=1,
+                                  poll_interval=0.05)
+        worker.start()
+        try:
+            assert wait_for(lambda: store.get(job_id)['status'] == 'failed')
+        finally:
+            worker.stop()
+
+        assert store.get(job_id)['error'] == 'Not a lure'
+        assert store.get(job_id)['result'] == {'error': 'Not a lure'}
@@ -0,0 +1,87 @@
+"""
+Tests for backend/decode_budget.py and draft-mode decoding in
+image_offload.compress_image
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from decode_budget import DecodeBudget, decode_bytes
+
+
+class TestDecodeBudget:
+    def test_reservation_waits_for_room(self):
+        budget = DecodeBudget(100)
+        order = []
+
+        def second():
+            with budget.reserve(60):
+                order.append('second')
+
+        with budget.reserve(60):
+            thread = threading.Thread(target=second)
+            thread.start()
+            time.sleep(0.1)
+            order.append('first done')
+        thread.join(2)
+
+        assert order == ['first done', 'second']
+        assert budget.stats()['waits'] == 1
+        assert budget.stats()['peak_bytes'] == 60
+        assert budget.stats()['in_use_bytes'] == 0
+
+    def test_small_reservations_share_the_budget(self):
+        budget = DecodeBudget(100)
+        with budget.reserve(40), budget.reserve(40):
+            assert budget.stats()['in_use_bytes'] == 80
+        assert budget.stats()['waits'] == 0
+
+    def test_oversized_image_runs_alone(self):
+        budget = DecodeBudget(100)
+        with budget.reserve(500):
+            assert budget.stats()['in_use_bytes'] == 500
+        assert budget.stats()['oversized'] == 1
+
+    def test_decode_bytes(self):
+        assert decode_bytes((100, 100), 'RGB', (100, 100)) == 30000 + 30000
+        assert decode_bytes((100, 100), 'CMYK', (10, 10)) == 40000 + 30000 + 3000 + 300
+
+
+class TestDraftDecoding:
+    def make_jpeg(self, size):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (40, 120, 200)).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def test_large_jpeg_decodes_at_reduced_scale(self, monkeypatch, capsys):
+        from PIL import Image
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='k', result_cache=False, decode_budget=DecodeBudget(1 << 30),
+        )
+        jpeg = classifier._compress_image_for_api(self.make_jpeg((4032, 3024)))
+
+        assert Image.open(io.BytesIO(jpeg)).size == (1024, 768)
+        assert 'Draft decode at: 2016x1512' in capsys.readouterr().out
+        # Reserved for the half-scale raster, not the 12 MP one
+        assert classifier.get_stats()['decode_budget']['peak_bytes'] == (2016 * 1512 + 1024 * 1512 + 1024 * 768) * 3
+
+    def test_non_jpeg_decodes_normally(self):
+        from PIL import Image
+        import mobile_lure_classifier
+
+        buffer = io.BytesIO()
+        Image.new('RGBA', (2400, 1800), (40, 120, 200, 255)).save(buffer, 'PNG')
+        classifier = mobile_lure_classifier.MobileLureClassifier(openai_api_key='k', result_cache=False)
+
+        jpeg = classifier._compress_image_for_api(buffer.getvalue())
+
+        assert Image.open(io.BytesIO(jpeg)).size == (1024, 768)
+        assert classifier.get_stats()['decode_budget']['peak_bytes'] == decode_bytes((2400, 1800), 'RGBA', (1024, 768))
@@ -0,0 +1,106 @@
+"""
+Tests for adaptive detail routing in MobileLureClassifier
+
+A low-detail first pass is accepted when it is confident and specific;
+otherwise the image is re-sent at high detail. Runs against the local fake
+OpenAI endpoint so the request bodies can be inspected.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+
+WEAK = dict(DEFAULT_ANALYSIS, confidence=40)
+GENERAL = dict(DEFAULT_ANALYSIS, lure_type='Jerkbait', visual_features=['slim body'], reasoning='long lure')
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    from PIL import Image
+    path = tmp_path / 'lure.jpg'
+    Image.new('RGB', (1600, 1200), (30, 120, 200)).save(path, 'JPEG')
+    return str(path)
+
+
+def sent_image(request):
+    """(detail, (width, height)) of the image in a captured request"""
+    from PIL import Image
+    image_url = json.loads(request['body'])['messages'][-1]['content'][1]['image_url']
+    data = base64.b64decode(image_url['url'].split(',', 1)[1])
+    return image_url.get('detail'), Image.open(io.BytesIO(data)).size
+
+
+class TestDetailRouting:
+    def test_confident_specific_answer_stays_low_detail(self, image_path, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server, detail_routing='adaptive')
+            result = classifier.analyze_lure(image_path)
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert result['detail'] == 'low'
+        assert result['escalated'] is False
+        assert len(server.requests) == 1
+        detail, size = sent_image(server.requests[0])
+        assert detail == 'low'
+        assert max(size) == 512
+
+    def test_low_confidence_escalates_to_high_detail(self, image_path, make_classifier):
+        with FakeOpenAIServer(script=[(200, completion(WEAK), {})]) as server:
+            classifier = make_classifier(server, detail_routing='adaptive')
+            result = classifier.analyze_lure(image_path)
+
+        assert result['confidence'] == 91
+        assert result['detail'] == 'high'
+        assert result['escalated'] is True
+        assert len(server.requests) == 2
+        detail, size = sent_image(server.requests[1])
+        assert detail == 'high'
+        assert size == (1024, 768)
+        stats = classifier.get_stats()['detail_routing']
+        assert stats['escalated_low_confidence'] == 1
+        assert stats['escalation_rate'] == 1.0
+
+    def test_unrefined_general_type_escalates(self, image_path, make_classifier):
+        with FakeOpenAIServer(script=[(200, completion(GENERAL), {})]) as server:
+            classifier = make_classifier(server, detail_routing='adaptive')
+            result = classifier.analyze_lure(image_path)
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert classifier.get_stats()['detail_routing']['escalated_general_type'] == 1
+
+    def test_failed_escalation_keeps_low_detail_answer(self, image_path, make_classifier):
+        script = [(200, completion(WEAK), {}), (400, {'error': 'bad'}, {})]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server, detail_routing='adaptive')
+            result = classifier.analyze_lure(image_path)
+
+        assert result['confidence'] == 40
+        assert result['detail'] == 'low'
+        assert classifier.get_stats()['detail_routing']['escalation_failed'] == 1
+
+    def test_routing_off_sends_one_default_detail_image(self, image_path, make_classifier):
+        with FakeOpenAIServer(script=[(200, completion(WEAK), {})]) as server:
+            classifier = make_classifier(server, detail_routing='off')
+            result = classifier.analyze_lure(image_path)
+
+        assert result['confidence'] == 40
+        assert 'detail' not in result
+        assert len(server.requests) == 1
+        assert sent_image(server.requests[0]) == (None, (1024, 768))
+
+    def test_async_path_escalates_too(self, image_path, make_classifier):
+        with FakeOpenAIServer(script=[(200, completion(WEAK), {})]) as server:
+            classifier = make_classifier(server, detail_routing='adaptive')
+            result = asyncio.run(classifier.analyze_lure_async(image_path))
+
+        assert result['detail'] == 'high'
+        assert [sent_image(r)[0] for r in server.requests] == ['low', 'high']
@@ -0,0 +1,89 @@
+"""
+Tests for backend/image_offload.py
+"""
+
+import io
+import os
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from image_offload import ImageOffload, compress_image
+from jpeg_quality import JPEGEncoder
+from near_duplicate import perceptual_hash
+
+
+def jpeg(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (30, 140, 90)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def offload():
+    pool = ImageOffload(workers=2, inline_max_pixels=500_000)
+    yield pool
+    pool.shutdown()
+
+
+class TestImageOffload:
+    def test_large_image_is_compressed_in_the_pool(self, offload):
+        encoder = JPEGEncoder()
+        before = offload.stats()['offloaded']
+
+        compressed = offload.compress(jpeg((2400, 1800)), 1200, None, 500 * 1024, encoder)
+
+        assert Image.open(io.BytesIO(compressed)).size == (1024, 768)
+        assert offload.stats()['offloaded'] == before + 1
+        # Counters recorded in the pool process land in the caller's encoder
+        assert encoder.stats()['images'] == 1
+        assert encoder.stats()['encodes'] == 1
+
+    def test_small_image_runs_inline(self, offload):
+        encoder = JPEGEncoder()
+        before = offload.stats()['inline']
+
+        compressed = offload.compress(jpeg((640, 480)), 1200, None, 500 * 1024, encoder)
+
+        assert Image.open(io.BytesIO(compressed)).size == (640, 480)
+        assert offload.stats()['inline'] == before + 1
+        assert encoder.stats()['images'] == 1
+
+    def test_perceptual_hash_matches_inline(self, offload):
+        image = jpeg((2400, 1800))
+        assert offload.perceptual_hash(image, 'dhash') == perceptual_hash(io.BytesIO(image), 'dhash')
+
+    def test_broken_pool_falls_back_inline(self, monkeypatch):
+        pool = ImageOffload(workers=1, inline_max_pixels=0)
+
+        class Broken:
+            def submit(self, *args):
+                raise BrokenProcessPool('worker died')
+
+        monkeypatch.setattr(pool, '_pool', lambda: Broken())
+        compressed = pool.compress(jpeg((2400, 1800)), 1200, None, 500 * 1024, JPEGEncoder())
+
+        assert Image.open(io.BytesIO(compressed)).size == (1024, 768)
+        assert pool.stats()['pool_errors'] == 1
+
+
+class TestClassifierOffload:
+    def test_classifier_compresses_through_the_pool(self, offload):
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='k', result_cache=False, image_offload=offload,
+        )
+        compressed = classifier._compress_image_for_api(jpeg((2400, 1800)))
+
+        assert Image.open(io.BytesIO(compressed)).size == (1024, 768)
+        assert classifier.get_stats()['image_offload']['workers'] == 2
+        assert classifier.get_stats()['jpeg_encoder']['images'] == 1
+
+    def test_unreadable_image_is_returned_unchanged(self):
+        garbage = b'not an image'
+        assert compress_image(garbage, 1200, None, 500 * 1024, JPEGEncoder()) == garbage
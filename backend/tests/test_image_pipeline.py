@@ -0,0 +1,98 @@
+"""
+Tests for the in-memory image pipeline in MobileLureClassifier
+
+The upload is decoded, resized, JPEG-encoded and base64-encoded in memory
+and the request body is sent pre-serialized; nothing is written to disk on
+the way to the API.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import FakeOpenAIServer
+
+
+class TestInMemoryPipeline:
+    def test_analysis_from_bytes_touches_no_files(self, jpeg_bytes, tmp_path, make_classifier):
+        import config
+
+        image = jpeg_bytes((1600, 1200))
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            result = classifier.analyze_lure(str(tmp_path / 'never-written.jpg'), image_bytes=image)
+
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert not os.path.exists(config.UPLOAD_FOLDER)
+        assert os.listdir(tmp_path) == []
+
+    def test_pre_serialized_body_matches_payload(self, monkeypatch):
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(openai_api_key='k', result_cache=False)
+        encoded = base64.b64encode(b'\xff\xd8jpeg bytes\xff\xd9')
+
+        body = classifier._build_body(encoded, 'low')
+
+        assert json.loads(body) == classifier._build_payload(encoded.decode(), 'low')
+
+    def test_async_analysis_from_bytes(self, jpeg_bytes, tmp_path, make_classifier):
+        from PIL import Image
+
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            result = asyncio.run(classifier.analyze_lure_async('upload.jpg', image_bytes=jpeg_bytes((1600, 1200))))
+
+        image_url = json.loads(server.requests[0]['body'])['messages'][-1]['content'][1]['image_url']
+        sent = Image.open(io.BytesIO(base64.b64decode(image_url['url'].split(',', 1)[1])))
+        assert result['lure_type'] == 'Squarebill Crankbait'
+        assert sent.size == (1024, 768)
+
+    def test_unreadable_path_is_an_error_result(self, tmp_path):
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(openai_api_key='k', result_cache=False)
+        result = classifier.analyze_lure(str(tmp_path / 'missing.jpg'))
+
+        assert result['error'].startswith('Analysis failed:')
+
+
+class TestUploadStream:
+    def test_upload_bytes_reach_classifier_without_reread(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        import app as app_module
+
+        image = jpeg_bytes()
+        received = []
+
+        def analyze(path, deadline=None, image_bytes=None, quality_checked=False, progress=None):
+            received.append(image_bytes)
+            os.remove(path)  # the pipeline must not need the saved copy
+            return {'lure_type': 'Jig', 'confidence': 90}
+
+        monkeypatch.setattr(app_module.mobile_classifier, 'analyze_lure', analyze)
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(image), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 200
+        assert received == [image]
+        assert backend_app.supabase_service.uploads == [('user-1', 'lure.jpg')]
+
+    def test_same_filename_from_two_users_kept_apart(self, backend_app, api_client, jpeg_bytes, tmp_path):
+        images = [jpeg_bytes(color=(200, 80, 40)), jpeg_bytes(color=(20, 80, 200))]
+        for user, image in zip(('user-1', 'user-2'), images):
+            response = api_client.post(
+                '/upload', data={'file': (io.BytesIO(image), 'IMG_0001.jpg')},
+                headers={'X-User-ID': user}, content_type='multipart/form-data',
+            )
+            assert response.status_code == 200
+
+        saved = sorted(path.read_bytes() for path in (tmp_path / 'uploads').iterdir())
+        assert saved == sorted(images)
@@ -0,0 +1,148 @@
+"""
+Tests for backend/image_quality.py and where the quality gate runs
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from image_quality import QualityGate, measure
+
+
+def photo(lure=(750, 550, 1250, 950), blur=0, brightness=1.0, size=(2000, 1500)):
+    """A noisy table-top photo with a striped lure on it, as JPEG bytes"""
+    rng = np.random.default_rng(0)
+    width, height = size
+    pixels = np.clip(np.array([150, 110, 70]) + rng.normal(0, 4, (height, width, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+    if lure:
+        draw = ImageDraw.Draw(img)
+        draw.ellipse(lure, fill=(230, 200, 20))
+        for x in range(lure[0] + 20, lure[2] - 20, 30):
+            draw.line((x, lure[1] + 40, x, lure[3] - 40), fill=(20, 60, 30), width=7)
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def gate():
+    return QualityGate(min_sharpness=100, min_brightness=40, max_brightness=225, max_clipped_fraction=0.5,
+                       min_object_area=0.002, min_contrast=4)
+
+
+class TestQualityGate:
+    def test_good_photo_passes(self, gate):
+        assert gate.check(photo()) is None
+        assert gate.stats()['passed'] == 1
+
+    def test_blurry_photo(self, gate):
+        rejection = gate.check(photo(blur=10))
+
+        assert rejection['error'] == 'retake_photo'
+        assert rejection['retake_photo'] is True
+        assert rejection['reasons'] == ['blurry']
+        assert rejection['tips']
+        assert rejection['quality']['sharpness'] < 100
+
+    def test_dark_photo_is_dark_not_blurry(self, gate):
+        assert gate.check(photo(brightness=0.1))['reasons'] == ['too_dark']
+
+    def test_overexposed_photo(self, gate):
+        assert gate.check(photo(brightness=2.5))['reasons'] == ['overexposed']
+
+    def test_empty_frame_has_no_lure(self, gate):
+        rejection = gate.check(photo(lure=None))
+        assert rejection['reasons'] == ['no_lure']
+        assert 'no lure' in rejection['message']
+
+    def test_lure_filling_the_frame_passes(self, gate):
+        # Nothing stands out from a border that is all lure, but the frame is far from uniform
+        metrics = measure(photo(lure=(-100, -100, 2100, 1600)))
+        assert gate.reasons(metrics) == []
+
+    def test_rejection_counters(self, gate):
+        gate.check(photo())
+        gate.check(photo(blur=10))
+        gate.check(photo(lure=None))
+        gate.check(b'not an image')
+
+        stats = gate.stats()
+        assert stats['checked'] == 3
+        assert stats['passed'] == 1
+        assert stats['rejected'] == 2
+        assert stats['errors'] == 1
+        assert stats['rejections'] == {'blurry': 1, 'too_dark': 0, 'overexposed': 0, 'no_lure': 1}
+
+    def test_disabled_by_config(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'QUALITY_GATE_ENABLED', False)
+        assert QualityGate.from_config() is None
+
+
+class TestClassifierQualityGate:
+    def make_classifier(self, gate, monkeypatch):
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='k', result_cache=False, quality_gate=gate,
+        )
+        calls = []
+        monkeypatch.setattr(classifier, '_analyze_uncached',
+                            lambda path, deadline=None, image_bytes=None, progress=None, first_pass=None:
+                            calls.append(path) or {'lure_type': 'Jig'})
+        return classifier, calls
+
+    def test_rejected_photo_never_reaches_the_api(self, gate, monkeypatch):
+        classifier, calls = self.make_classifier(gate, monkeypatch)
+
+        result = classifier.analyze_lure('blurry.jpg', image_bytes=photo(blur=10))
+
+        assert result['retake_photo'] is True
+        assert result['image_path'] == 'blurry.jpg'
+        assert calls == []
+        assert classifier.get_stats()['quality_gate']['rejected'] == 1
+
+    def test_quality_checked_skips_the_gate(self, gate, monkeypatch):
+        classifier, calls = self.make_classifier(gate, monkeypatch)
+
+        result = classifier.analyze_lure('blurry.jpg', image_bytes=photo(blur=10), quality_checked=True)
+
+        assert result == {'lure_type': 'Jig'}
+        assert gate.stats()['checked'] == 0
+
+
+class TestUploadQualityGate:
+    def test_rejected_before_quota_is_reserved(self, backend_app, api_client, gate):
+        backend_app.mobile_classifier.quality_gate = gate
+
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(photo(lure=None)), 'empty.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 422
+        assert response.get_json()['reasons'] == ['no_lure']
+        assert backend_app.supabase_service.pending_scans == []
+        assert backend_app.mobile_classifier.calls == []
+
+    def test_good_photo_is_scanned(self, backend_app, api_client, gate):
+        backend_app.mobile_classifier.quality_gate = gate
+
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(photo()), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 200
+        assert len(backend_app.supabase_service.pending_scans) == 1
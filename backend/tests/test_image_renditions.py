@@ -0,0 +1,216 @@
+"""
+Tests for backend/image_renditions.py and rendition storage
+"""
+
+import io
+import os
+import sys
+import threading
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from image_renditions import make_renditions, original_path, rendition_path
+from result_cache import image_digest
+from scan_pipeline import store_image
+
+
+def jpeg(size=(4032, 3024), orientation=None):
+    img = Image.new('RGB', size, (40, 120, 200))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.threads = set()
+        self.puts = []
+        self.heads = []
+
+    def upload(self, path, data, file_options=None):
+        self.threads.add(threading.current_thread().name)
+        self.puts.append(path)
+        self.objects[path] = (data, file_options['content-type'])
+
+    def exists(self, path):
+        self.heads.append(path)
+        return path in self.objects
+
+    def get_public_url(self, path):
+        return f'https://storage.test/{path}'
+
+
+def supabase_service(bucket):
+    from supabase_client import SupabaseService
+
+    class Storage:
+        def from_(self, name):
+            return bucket
+
+    class Client:
+        storage = Storage()
+
+    service = SupabaseService.__new__(SupabaseService)
+    service.client, service.enabled = Client(), True
+    service._init_storage_index()
+    return service
+
+
+class TestMakeRenditions:
+    def test_sizes_and_order(self):
+        renditions = make_renditions(jpeg(), {'thumb': 256, 'medium': 1024}, 80)
+
+        assert list(renditions) == ['medium', 'thumb']
+        assert Image.open(io.BytesIO(renditions['medium'])).size == (1024, 768)
+        assert Image.open(io.BytesIO(renditions['thumb'])).size == (256, 192)
+
+    def test_small_upload_is_not_enlarged(self):
+        renditions = make_renditions(jpeg((640, 480)), {'thumb': 256, 'medium': 1024}, 80)
+        assert Image.open(io.BytesIO(renditions['medium'])).size == (640, 480)
+
+    def test_exif_orientation_is_applied(self):
+        # Orientation 6: the sensor image is landscape, the photo was taken upright
+        renditions = make_renditions(jpeg(orientation=6), {'thumb': 256}, 80)
+        assert Image.open(io.BytesIO(renditions['thumb'])).size == (192, 256)
+
+    def test_paths_are_keyed_by_content(self):
+        assert rendition_path('user-1', 'abc123', 'thumb') == 'user-1/abc123/thumb.jpg'
+        assert original_path('user-1', 'abc123', 'IMG_0001.JPG') == 'user-1/abc123.jpg'
+
+
+class TestStoreImage:
+    def test_renditions_uploaded_instead_of_original(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'STORE_ORIGINAL_IMAGES', False)
+        bucket = FakeBucket()
+
+        image = jpeg()
+        digest = image_digest(image)
+
+        urls = store_image(supabase_service(bucket), 'user-1', 'unused.jpg', 'lure.jpg', image)
+
+        assert set(bucket.objects) == {f'user-1/{digest}/thumb.jpg', f'user-1/{digest}/medium.jpg'}
+        assert all(content_type == 'image/jpeg' for _, content_type in bucket.objects.values())
+        assert urls == {
+            'image_thumb_url': f'https://storage.test/user-1/{digest}/thumb.jpg',
+            'image_medium_url': f'https://storage.test/user-1/{digest}/medium.jpg',
+            'image_url': f'https://storage.test/user-1/{digest}/medium.jpg',
+        }
+        # Uploads run on a pool, not the scan thread
+        assert threading.current_thread().name not in bucket.threads
+
+    def test_original_kept_when_configured(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'STORE_ORIGINAL_IMAGES', True)
+        bucket = FakeBucket()
+
+        image = jpeg()
+        digest = image_digest(image)
+
+        urls = store_image(supabase_service(bucket), 'user-1', 'unused.png', 'lure.png', image)
+
+        assert bucket.objects[f'user-1/{digest}.png'][1] == 'image/png'
+        assert urls['image_url'] == f'https://storage.test/user-1/{digest}.png'
+        assert urls['image_thumb_url'] == f'https://storage.test/user-1/{digest}/thumb.jpg'
+
+    def test_unreadable_image_stored_as_uploaded(self):
+        bucket = FakeBucket()
+
+        digest = image_digest(b'not decodable')
+
+        urls = store_image(supabase_service(bucket), 'user-1', 'unused.heic', 'lure.heic', b'not decodable')
+
+        assert list(bucket.objects) == [f'user-1/{digest}.heic']
+        assert urls == {'image_url': f'https://storage.test/user-1/{digest}.heic'}
+
+    def test_upload_records_rendition_urls(self, backend_app, api_client, jpeg_bytes):
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(jpeg_bytes((1600, 1200))), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        row = backend_app.supabase_service.updates[0][1]
+        assert response.status_code == 200
+        assert row['image_thumb_url'].endswith('/thumb.jpg')
+        assert row['image_url'] == row['image_medium_url']
+        assert set(backend_app.supabase_service.renditions) == {'thumb', 'medium'}
+
+
+class TestDeduplication:
+    def test_same_photo_stored_once(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'STORE_ORIGINAL_IMAGES', False)
+        bucket = FakeBucket()
+        service = supabase_service(bucket)
+        image = jpeg()
+
+        first = store_image(service, 'user-1', 'unused.jpg', 'image.jpg', image)
+        heads = len(bucket.heads)
+        second = store_image(service, 'user-1', 'unused.jpg', 'other.jpg', image)
+
+        assert second == first
+        assert len(bucket.puts) == 2
+        # Answered from this worker's memory, without asking Storage again
+        assert len(bucket.heads) == heads
+        assert service.storage_stats()['skipped_known'] == 2
+
+    def test_object_in_storage_found_by_head(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'STORE_ORIGINAL_IMAGES', False)
+        bucket = FakeBucket()
+        image = jpeg()
+        store_image(supabase_service(bucket), 'user-1', 'unused.jpg', 'image.jpg', image)
+
+        # Another worker: nothing in memory, the objects are in the bucket
+        other_worker = supabase_service(bucket)
+        urls = store_image(other_worker, 'user-1', 'unused.jpg', 'image.jpg', image)
+
+        assert len(bucket.puts) == 2
+        assert urls['image_thumb_url'].endswith(f'{image_digest(image)}/thumb.jpg')
+        assert other_worker.storage_stats()['skipped_exists'] == 2
+
+    def test_different_photos_with_the_same_name_do_not_collide(self, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'STORE_ORIGINAL_IMAGES', True)
+        bucket = FakeBucket()
+        service = supabase_service(bucket)
+
+        first = store_image(service, 'user-1', 'unused.jpg', 'image.jpg', jpeg((800, 600)))
+        second = store_image(service, 'user-1', 'unused.jpg', 'image.jpg', jpeg((600, 800)))
+
+        assert first['image_url'] != second['image_url']
+        assert len(bucket.objects) == 6
+
+    def test_failed_head_falls_back_to_uploading(self):
+        bucket = FakeBucket()
+
+        def unavailable(path):
+            raise ConnectionError('storage unreachable')
+
+        bucket.exists = unavailable
+        url = supabase_service(bucket).upload_lure_image('user-1', None, 'lure.jpg', file_data=b'bytes')
+
+        assert url == f"https://storage.test/user-1/{image_digest(b'bytes')}.jpg"
+        assert len(bucket.puts) == 1
+
+    def test_storage3_without_exists_uploads_as_before(self):
+        class OldBucket(FakeBucket):
+            def __getattribute__(self, name):
+                if name == 'exists':
+                    raise AttributeError(name)
+                return super().__getattribute__(name)
+
+        bucket = OldBucket()
+        service = supabase_service(bucket)
+        first = service.upload_lure_image('user-1', None, 'a.jpg', file_data=b'first')
+        service.upload_lure_image('user-1', None, 'b.jpg', file_data=b'second')
+
+        assert first == f"https://storage.test/user-1/{image_digest(b'first')}.jpg"
+        assert len(bucket.puts) == 2
+        assert service.storage_stats()['head_checks'] == 1  # not retried once known missing
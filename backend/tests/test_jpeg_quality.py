@@ -0,0 +1,63 @@
+"""
+Tests for backend/jpeg_quality.py
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from jpeg_quality import JPEGEncoder, encode_jpeg, predict_quality
+
+
+def noisy(size=(1024, 768), sigma=25, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = np.clip(rng.normal(128, sigma, (size[1], size[0], 3)), 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+class TestPredictQuality:
+    def test_picks_highest_quality_under_target(self):
+        assert predict_quality(700_000, 500_000) == 85   # 0.75 * 700k > 475k, 0.62 * 700k fits
+        assert predict_quality(500_001, 500_000) == 90
+
+    def test_none_when_nothing_fits(self):
+        assert predict_quality(5_000_000, 500_000) is None
+
+
+class TestJPEGEncoder:
+    def test_image_under_target_is_encoded_once(self):
+        encoder = JPEGEncoder()
+        data = encoder.encode(Image.new('RGB', (1024, 768), (40, 90, 200)), 500 * 1024)
+
+        assert Image.open(io.BytesIO(data)).size == (1024, 768)
+        assert encoder.stats()['encodes'] == 1
+        assert encoder.stats()['single_encode'] == 1
+
+    @pytest.mark.parametrize('seed', range(3))
+    def test_large_image_fits_in_two_encodes(self, seed):
+        img = noisy(seed=seed)
+        target = len(encode_jpeg(img, 95)) * 2 // 3
+        encoder = JPEGEncoder()
+
+        data = encoder.encode(img, target)
+
+        assert len(data) <= target
+        assert Image.open(io.BytesIO(data)).size == (1024, 768)
+        assert encoder.stats()['encodes'] == 2
+        assert encoder.stats()['over_target'] == 0
+
+    def test_fallback_resize_keeps_aspect_ratio(self):
+        encoder = JPEGEncoder()
+        data = encoder.encode(noisy(sigma=60), 40 * 1024)
+
+        assert Image.open(io.BytesIO(data)).size == (800, 600)
+        stats = encoder.stats()
+        assert stats['fallback_resizes'] == 1
+        assert stats['encodes'] == 2
+        assert stats['encodes_per_image'] == 2.0
@@ -0,0 +1,227 @@
+"""
+Tests for backend/near_duplicate.py
+
+Covers hash stability under re-encoding and resizing, BK-tree search
+against brute force, index persistence between workers, and the
+near-duplicate shortcut in MobileLureClassifier.analyze_lure.
+"""
+
+import os
+import random
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image, ImageDraw
+
+from near_duplicate import BKTree, NearDuplicateIndex, dhash, hamming, phash
+from result_cache import ResultCache
+
+
+def draw_lure(size=(640, 480), offset=0):
+    """Synthetic 'lure on a table' photo with enough structure to hash."""
+    img = Image.new('RGB', size, (210, 200, 185))
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    draw.ellipse([w * 0.25 + offset, h * 0.35, w * 0.7 + offset, h * 0.6], fill=(200, 60, 30))
+    draw.polygon([(w * 0.7 + offset, h * 0.47), (w * 0.85 + offset, h * 0.35), (w * 0.85 + offset, h * 0.6)],
+                 fill=(40, 40, 40))
+    draw.rectangle([w * 0.15 + offset, h * 0.44, w * 0.25 + offset, h * 0.5], fill=(230, 230, 230))
+    return img
+
+
+def save(img, path, quality=90):
+    img.save(path, 'JPEG', quality=quality)
+    return str(path)
+
+
+# ---------------------------------------------------------------------------
+# Hash functions
+# ---------------------------------------------------------------------------
+
+class TestPerceptualHashes:
+    @pytest.mark.parametrize('hash_function', [dhash, phash])
+    def test_reencoded_and_resized_copy_is_close(self, tmp_path, hash_function):
+        original = Image.open(save(draw_lure(), tmp_path / 'a.jpg', quality=95))
+        copy = Image.open(save(draw_lure().resize((480, 360)), tmp_path / 'b.jpg', quality=60))
+        assert hamming(hash_function(original), hash_function(copy)) <= 4
+
+    @pytest.mark.parametrize('hash_function', [dhash, phash])
+    def test_different_images_are_far_apart(self, hash_function):
+        lure = draw_lure()
+        other = Image.new('RGB', (640, 480), (20, 90, 160))
+        ImageDraw.Draw(other).rectangle([50, 300, 600, 460], fill=(250, 240, 60))
+        assert hamming(hash_function(lure), hash_function(other)) > 10
+
+    def test_hashes_fit_in_64_bits(self):
+        assert 0 <= dhash(draw_lure()) < 2 ** 64
+        assert 0 <= phash(draw_lure()) < 2 ** 64
+
+
+# ---------------------------------------------------------------------------
+# BK-tree
+# ---------------------------------------------------------------------------
+
+class TestBKTree:
+    def test_search_matches_brute_force(self):
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        # Plant a few near neighbours of the query
+        query = hashes[0]
+        for bit in (1, 5, 17):
+            hashes.append(query ^ (1 << bit) ^ (1 << (bit + 20)))
+
+        tree = BKTree()
+        for i, h in enumerate(hashes):
+            tree.add(h, i)
+
+        found = sorted(value for _, _, value in tree.search(query, 4))
+        expected = sorted(i for i, h in enumerate(hashes) if hamming(h, query) <= 4)
+        assert found == expected
+        assert tree.size == len(hashes)
+
+    def test_results_are_sorted_by_distance(self):
+        tree = BKTree()
+        tree.add(0b1111, 'far')
+        tree.add(0b0001, 'near')
+        tree.add(0b0000, 'exact')
+        assert [value for _, _, value in tree.search(0, 4)] == ['exact', 'near', 'far']
+
+
+# ---------------------------------------------------------------------------
+# Persistent index
+# ---------------------------------------------------------------------------
+
+class TestNearDuplicateIndex:
+    def test_lookup_sees_rows_added_by_another_worker(self, tmp_path):
+        path = str(tmp_path / 'index.sqlite3')
+        worker_a = NearDuplicateIndex(path, max_distance=4)
+        worker_b = NearDuplicateIndex(path, max_distance=4)
+
+        assert worker_b.find(0xFFFF0000FFFF0000, 'model') == []  # builds b's tree
+        worker_a.add(0xFFFF0000FFFF0000, 'model:abc')
+
+        [match] = worker_b.find(0xFFFF0000FFFF0001, 'model')
+        assert match['cache_key'] == 'model:abc' and match['distance'] == 1
+
+    def test_high_bit_hashes_round_trip(self, tmp_path):
+        index = NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=0)
+        index.add(2 ** 64 - 1, 'model:max')
+        assert index.find(2 ** 64 - 1, 'model')[0]['cache_key'] == 'model:max'
+
+    def test_out_of_range_is_a_miss(self, tmp_path):
+        index = NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=2)
+        index.add(0, 'model:zero')
+        assert index.find(0b111, 'model') == []
+
+    def test_candidates_closest_first_under_the_model(self, tmp_path):
+        index = NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=4)
+        index.add(0b1111, 'gpt-4o:far')
+        index.add(0b1, 'gpt-4o:near')
+        index.add(0, 'gpt-4o-mini:other-model')
+
+        assert [match['cache_key'] for match in index.find(0, 'gpt-4o')] == ['gpt-4o:near', 'gpt-4o:far']
+
+    def test_switching_algorithm_ignores_old_hashes(self, tmp_path):
+        path = str(tmp_path / 'index.sqlite3')
+        dhash_index = NearDuplicateIndex(path, max_distance=4, algorithm='dhash')
+        dhash_index.add(0, 'model:dhash-row')
+        phash_index = NearDuplicateIndex(path, max_distance=4, algorithm='phash')
+
+        assert phash_index.find(0, 'model') == []
+        phash_index.add(1, 'model:phash-row')
+        assert [match['cache_key'] for match in phash_index.find(0, 'model')] == ['model:phash-row']
+        assert [match['cache_key'] for match in dhash_index.find(0, 'model')] == ['model:dhash-row']
+
+    def test_rows_from_before_the_algorithm_column_never_match(self, tmp_path):
+        import sqlite3
+        path = str(tmp_path / 'index.sqlite3')
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE hashes (id INTEGER PRIMARY KEY AUTOINCREMENT, hash INTEGER NOT NULL, "
+                "cache_key TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("INSERT INTO hashes (hash, cache_key, created_at) VALUES (0, 'model:legacy', 0)")
+        index = NearDuplicateIndex(path, max_distance=4)
+
+        assert index.find(0, 'model') == []
+        index.add(0, 'model:new')
+        assert [match['cache_key'] for match in index.find(0, 'model')] == ['model:new']
+
+    def test_removed_rows_are_not_found_by_any_worker(self, tmp_path):
+        path = str(tmp_path / 'index.sqlite3')
+        worker_a = NearDuplicateIndex(path, max_distance=4)
+        worker_b = NearDuplicateIndex(path, max_distance=4)
+        worker_a.add(0, 'model:gone')
+        worker_a.add(1, 'model:kept')
+        assert len(worker_b.find(0, 'model')) == 2
+
+        worker_a.remove(worker_a.find(0, 'model')[0]['id'])
+
+        assert [match['cache_key'] for match in worker_b.find(0, 'model')] == ['model:kept']
+        assert worker_a.stats()['removed'] == 1
+
+    def test_rows_past_ttl_are_purged(self, tmp_path, monkeypatch):
+        index = NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=4, ttl_seconds=60)
+        monkeypatch.setattr(NearDuplicateIndex, 'PURGE_EVERY', 2)
+        index.add(0, 'model:old')
+        monkeypatch.setattr('near_duplicate.time.time', lambda: 1e10)
+        index.add(1, 'model:new')
+
+        assert [match['cache_key'] for match in index.find(0, 'model')] == ['model:new']
+
+
+# ---------------------------------------------------------------------------
+# MobileLureClassifier integration
+# ---------------------------------------------------------------------------
+
+class TestClassifierNearDuplicates:
+    def test_rephotographed_lure_reuses_result(self, tmp_path, monkeypatch):
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key',
+            result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5),
+            near_duplicate_index=NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=6),
+        )
+        calls = []
+
+        def fake_analyze(path, deadline=None, image_bytes=None, progress=None, first_pass=None):
+            calls.append(path)
+            return {
+                'success': True, 'image_path': path, 'lure_type': 'Lipless Crankbait', 'confidence': 90,
+                'chatgpt_analysis': {}, 'lure_details': {}, 'analysis_method': 'ChatGPT Vision API',
+            }
+
+        monkeypatch.setattr(classifier, '_analyze_uncached', fake_analyze)
+
+        first = classifier.analyze_lure(save(draw_lure(), tmp_path / 'first.jpg', quality=95))
+        second = classifier.analyze_lure(save(draw_lure(offset=4), tmp_path / 'second.jpg', quality=70))
+
+        assert len(calls) == 1
+        assert 'near_duplicate' not in first
+        assert second['near_duplicate'] is True
+        assert second['lure_type'] == 'Lipless Crankbait'
+        assert second['near_duplicate_distance'] <= 6
+
+    def test_falls_back_past_evicted_neighbours(self, tmp_path):
+        import mobile_lure_classifier
+        from result_cache import cache_key
+
+        results = ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5)
+        index = NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=6)
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key', result_cache=results, near_duplicate_index=index,
+        )
+        index.add(0, cache_key('evicted'))
+        index.add(0, cache_key('other-model', 'old-model'))
+        index.add(0b11, cache_key('cached'))
+        results.set(cache_key('other-model', 'old-model'), {'lure_type': 'Jig', 'confidence': 80})
+        results.set(cache_key('cached'), {'lure_type': 'Buzzbait', 'confidence': 85})
+
+        match = classifier.probe_cache('0' * 64, perceptual_hash=0)
+
+        assert match['lure_type'] == 'Buzzbait'
+        assert match['near_duplicate_distance'] == 2
+        assert [candidate['cache_key'] for candidate in index.find(0)] == [cache_key('cached')]
@@ -0,0 +1,94 @@
+"""
+Tests for the cache-friendly request layout and cached-token accounting
+
+Every request starts with the same system message, built once from the
+lure database, so upstream prompt caching can reuse it; the cached share of
+each response's prompt tokens is recorded per scan and in get_stats().
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+
+
+def prefix(request):
+    """Bytes of the request body up to the end of the system message"""
+    body = request['body']
+    system = json.loads(body)['messages'][0]['content']
+    return body[:body.index(json.dumps(system).encode()) + len(json.dumps(system))]
+
+
+class TestPayloadLayout:
+    def test_system_prompt_is_a_byte_identical_prefix(self, jpeg_bytes, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            classifier.analyze_lure('a.jpg', image_bytes=jpeg_bytes((800, 600), (10, 200, 30)))
+            classifier.analyze_lure('b.jpg', image_bytes=jpeg_bytes((600, 800), (200, 10, 30)))
+
+        first, second = (json.loads(request['body'])['messages'] for request in server.requests)
+        assert first[0] == {'role': 'system', 'content': classifier.system_prompt}
+        assert prefix(server.requests[0]) == prefix(server.requests[1])
+        # The user message carries only the image and a one-line request
+        assert [part['type'] for part in first[1]['content']] == ['text', 'image_url']
+        assert len(first[1]['content'][0]['text']) < 80
+
+    def test_system_prompt_built_from_lure_database(self, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+
+        for name, info in classifier.lure_database.items():
+            assert f"- {name}" in classifier.system_prompt
+            assert ', '.join(info['visual_features']) in classifier.system_prompt
+        # OpenAI only caches prompts of 1024 tokens or more (~4 characters per token)
+        assert len(classifier.system_prompt) / 4 > 1024
+
+    def test_batch_requests_share_the_system_prompt(self, jpeg_bytes, make_classifier):
+        images = [jpeg_bytes((400, 300), (i * 60, 90, 170)) for i in range(2)]
+        script = [(200, completion([dict(DEFAULT_ANALYSIS, image=n) for n in (1, 2)]), {})]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            classifier.analyze_lure_batch(['a.jpg', 'b.jpg'], images=images)
+
+        assert json.loads(server.requests[0]['body'])['messages'][0]['content'] == classifier.system_prompt
+
+
+class TestCachedTokens:
+    def test_recorded_per_scan_and_in_stats(self, jpeg_bytes, make_classifier):
+        script = [
+            (200, completion(DEFAULT_ANALYSIS, prompt_tokens=1400, cached_tokens=0), {}),
+            (200, completion(DEFAULT_ANALYSIS, prompt_tokens=1400, cached_tokens=1152), {}),
+        ]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            first = classifier.analyze_lure('a.jpg', image_bytes=jpeg_bytes())
+            second = classifier.analyze_lure('b.jpg', image_bytes=jpeg_bytes(color=(20, 30, 200)))
+
+        assert first['cached_tokens'] == 0
+        assert second['cached_tokens'] == 1152
+        assert second['tokens_used'] == 1480
+        stats = classifier.get_stats()['prompt_cache']
+        assert stats['responses'] == 2 and stats['cache_hits'] == 1
+        assert stats['cached_tokens'] == 1152
+        assert stats['cached_token_share'] == round(1152 / 2800, 4)
+
+    def test_not_reported_is_none(self, jpeg_bytes, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('a.jpg', image_bytes=jpeg_bytes())
+
+        assert results['cached_tokens'] is None
+        assert classifier.get_stats()['prompt_cache']['cache_hits'] == 0
+
+    def test_batch_share(self, jpeg_bytes, make_classifier):
+        images = [jpeg_bytes((400, 300), (i * 60, 90, 170)) for i in range(2)]
+        analyses = [dict(DEFAULT_ANALYSIS, image=n) for n in (1, 2)]
+        script = [(200, completion(analyses, prompt_tokens=3000, cached_tokens=1200), {})]
+        with FakeOpenAIServer(script=script) as server:
+            results = make_classifier(server).analyze_lure_batch(['a.jpg', 'b.jpg'], images=images)
+
+        assert [result['cached_tokens'] for result in results] == [600, 600]
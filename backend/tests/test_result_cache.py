@@ -0,0 +1,171 @@
+"""
+Tests for backend/result_cache.py
+
+Covers the LRU and SQLite tiers, TTL expiry, negative entries and the
+MobileLureClassifier integration. No network access — the OpenAI call is
+replaced with a stub that counts invocations.
+"""
+
+import io
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from result_cache import ResultCache, cache_key, image_digest
+
+RESULT = {
+    'lure_type': 'Squarebill Crankbait',
+    'confidence': 88,
+    'chatgpt_analysis': {'lure_type': 'Squarebill Crankbait', 'confidence': 88},
+    'lure_details': {'description': 'Crankbait with square-shaped diving bill'},
+    'analysis_method': 'ChatGPT Vision API',
+}
+
+
+def make_cache(tmp_path, **kwargs):
+    options = {'ttl_seconds': 60, 'negative_ttl_seconds': 5, 'memory_entries': 8}
+    options.update(kwargs)
+    return ResultCache(str(tmp_path / 'results.sqlite3'), **options)
+
+
+# ---------------------------------------------------------------------------
+# ResultCache unit tests
+# ---------------------------------------------------------------------------
+
+class TestResultCache:
+    def test_miss_then_memory_hit(self, tmp_path):
+        cache = make_cache(tmp_path)
+        assert cache.get('k') is None
+        cache.set('k', RESULT)
+        assert cache.get('k') == RESULT
+
+        stats = cache.stats()
+        assert stats['misses'] == 1
+        assert stats['memory_hits'] == 1
+
+    def test_disk_tier_shared_between_instances(self, tmp_path):
+        writer = make_cache(tmp_path)
+        reader = make_cache(tmp_path)
+        writer.set('k', RESULT)
+
+        assert reader.get('k') == RESULT
+        assert reader.stats()['disk_hits'] == 1
+        # Promoted into the reader's memory tier
+        assert reader.get('k') == RESULT
+        assert reader.stats()['memory_hits'] == 1
+
+    def test_expired_entries_are_misses(self, tmp_path):
+        cache = make_cache(tmp_path, ttl_seconds=1)
+        cache.set('k', RESULT)
+        time.sleep(1.1)
+        assert cache.get('k') is None
+        assert cache.stats()['expired'] >= 1
+
+    def test_negative_entries_use_short_ttl(self, tmp_path):
+        cache = make_cache(tmp_path, negative_ttl_seconds=1)
+        cache.set('k', {'error': 'API request failed: 500'}, negative=True)
+        assert cache.get('k') == {'error': 'API request failed: 500'}
+        assert cache.stats()['negative_hits'] == 1
+
+        time.sleep(1.1)
+        assert cache.get('k') is None
+
+    def test_lru_evicts_oldest(self, tmp_path):
+        cache = ResultCache(None, ttl_seconds=60, negative_ttl_seconds=5, memory_entries=2)
+        cache.set('a', RESULT)
+        cache.set('b', RESULT)
+        cache.get('a')
+        cache.set('c', RESULT)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == RESULT
+        assert cache.stats()['evictions'] == 1
+
+    def test_keys_are_namespaced_by_model(self):
+        digest = image_digest(b'same bytes')
+        assert cache_key(digest, 'gpt-4o-mini') != cache_key(digest, 'gpt-4o')
+
+
+# ---------------------------------------------------------------------------
+# MobileLureClassifier integration
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def image_path(tmp_path):
+    from PIL import Image
+    path = tmp_path / 'lure.jpg'
+    Image.new('RGB', (64, 48), (200, 80, 40)).save(path, 'JPEG')
+    return str(path)
+
+
+@pytest.fixture
+def classifier(tmp_path, monkeypatch):
+    import mobile_lure_classifier
+
+    monkeypatch.setattr(mobile_lure_classifier.config, 'NEAR_DUPLICATE_ENABLED', False)
+    instance = mobile_lure_classifier.MobileLureClassifier(
+        openai_api_key='test-key', result_cache=make_cache(tmp_path)
+    )
+    instance.upstream_calls = 0
+
+    def fake_analyze(path, deadline=None, image_bytes=None, progress=None, first_pass=None):
+        instance.upstream_calls += 1
+        return dict(RESULT, success=True, image_path=path, analysis_date='2026-01-01 00:00:00')
+
+    monkeypatch.setattr(instance, '_analyze_uncached', fake_analyze)
+    return instance
+
+
+class TestClassifierCaching:
+    def test_second_identical_image_skips_upstream(self, classifier, image_path):
+        first = classifier.analyze_lure(image_path)
+        second = classifier.analyze_lure(image_path)
+
+        assert classifier.upstream_calls == 1
+        assert 'cached' not in first
+        assert second['cached'] is True
+        for field in ('lure_type', 'chatgpt_analysis', 'lure_details'):
+            assert second[field] == first[field]
+
+    def test_same_photo_with_other_metadata_hits(self, classifier):
+        from PIL import Image
+        photo = Image.new('RGB', (64, 48), (200, 80, 40))
+        exif = Image.Exif()
+        exif[0x0110] = 'Phone 12'  # camera model
+        plain, tagged = io.BytesIO(), io.BytesIO()
+        photo.save(plain, 'JPEG', quality=90)
+        photo.save(tagged, 'JPEG', quality=90, exif=exif)
+        assert plain.getvalue() != tagged.getvalue()
+
+        classifier.analyze_lure('plain.jpg', image_bytes=plain.getvalue())
+        second = classifier.analyze_lure('tagged.jpg', image_bytes=tagged.getvalue())
+        repeat = classifier.analyze_lure('tagged.jpg', image_bytes=tagged.getvalue())
+
+        assert classifier.upstream_calls == 1
+        assert second['cached'] is True and repeat['cached'] is True
+
+    def test_failures_are_cached_negatively(self, classifier, image_path, monkeypatch):
+        def failing(path, deadline=None, image_bytes=None, progress=None, first_pass=None):
+            classifier.upstream_calls += 1
+            return {'error': 'API request failed: 400 - bad image'}
+
+        monkeypatch.setattr(classifier, '_analyze_uncached', failing)
+        classifier.analyze_lure(image_path)
+        retry = classifier.analyze_lure(image_path)
+
+        assert classifier.upstream_calls == 1
+        assert retry == {'error': 'API request failed: 400 - bad image', 'cached': True}
+
+    def test_transient_failures_are_not_cached(self, classifier, image_path, monkeypatch):
+        def failing(path, deadline=None, image_bytes=None, progress=None, first_pass=None):
+            classifier.upstream_calls += 1
+            return {'error': 'Vision API temporarily unavailable', 'retryable': True}
+
+        monkeypatch.setattr(classifier, '_analyze_uncached', failing)
+        classifier.analyze_lure(image_path)
+        classifier.analyze_lure(image_path)
+
+        assert classifier.upstream_calls == 2
@@ -0,0 +1,199 @@
+"""
+Tests for backend/scan_jobs.py and the /upload?async=1 job endpoints.
+
+Supabase and the classifier are replaced by the fakes in conftest.py.
+"""
+
+import io
+import json
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scan_jobs import FAILED, QUEUED, SUCCEEDED, JobStore, QueueFullError, ScanJobQueue
+
+USER = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+OTHER_USER = 'ffffffff-bbbb-cccc-dddd-eeeeeeeeeeee'
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# JobStore / ScanJobQueue
+# ---------------------------------------------------------------------------
+
+class TestJobStore:
+    def test_round_trip(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+        job_id = store.create(USER, {'image_name': 'a.jpg'})
+        assert store.get(job_id)['status'] == QUEUED
+
+        store.update(job_id, status=SUCCEEDED, stage=SUCCEEDED, result={'lure_type': 'Jig'})
+        job = store.get(job_id)
+        assert job['status'] == SUCCEEDED
+        assert job['result'] == {'lure_type': 'Jig'}
+        assert job['meta'] == {'image_name': 'a.jpg'}
+
+    def test_visible_from_another_worker(self, tmp_path):
+        path = str(tmp_path / 'jobs.sqlite3')
+        job_id = JobStore(path).create(USER)
+        assert JobStore(path).get(job_id)['user_id'] == USER
+
+    def test_stuck_jobs_are_marked_interrupted(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.sqlite3'), stale_seconds=0)
+        job_id = store.create(USER)
+        time.sleep(0.01)
+        job = store.get(job_id)
+        assert job['status'] == FAILED
+        assert job['error'] == 'interrupted'
+
+
+class TestScanJobQueue:
+    def test_job_runs_and_records_stages(self, tmp_path):
+        queue = ScanJobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=1)
+        job_id = queue.store.create(USER)
+        stages = []
+
+        def run(set_stage):
+            set_stage('analyzing')
+            stages.append(queue.store.get(job_id)['stage'])
+            return {'lure_type': 'Spoon'}
+
+        queue.reserve()
+        queue.submit(job_id, run)
+        assert wait_for(lambda: queue.store.get(job_id)['status'] == SUCCEEDED)
+        assert stages == ['analyzing']
+        assert queue.store.get(job_id)['result'] == {'lure_type': 'Spoon'}
+        assert wait_for(lambda: queue.stats()['pending'] == 0)
+
+    def test_exception_marks_job_failed(self, tmp_path):
+        queue = ScanJobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=1)
+        job_id = queue.store.create(USER)
+
+        def run(set_stage):
+            raise RuntimeError('storage exploded')
+
+        queue.reserve()
+        queue.submit(job_id, run)
+        assert wait_for(lambda: queue.store.get(job_id)['status'] == FAILED)
+        assert queue.store.get(job_id)['error'] == 'storage exploded'
+
+    def test_error_result_marks_job_failed(self, tmp_path):
+        queue = ScanJobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=1)
+        job_id = queue.store.create(USER)
+
+        queue.reserve()
+        queue.submit(job_id, lambda set_stage: {'error': 'Analysis failed: bad image', 'lure_type': 'Analysis Failed'})
+        assert wait_for(lambda: queue.store.get(job_id)['status'] == FAILED)
+        job = queue.store.get(job_id)
+        assert job['error'] == 'Analysis failed: bad image'
+        assert job['result']['lure_type'] == 'Analysis Failed'
+        assert wait_for(lambda: queue.stats()['failed'] == 1)
+
+    def test_reserve_refuses_when_full(self, tmp_path):
+        queue = ScanJobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=1, max_queued=2)
+        queue.reserve()
+        queue.reserve()
+        with pytest.raises(QueueFullError):
+            queue.reserve()
+        queue.release()
+        queue.reserve()
+        assert queue.stats()['rejected'] == 1
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+def upload_async(client, jpeg, user=USER):
+    return client.post(
+        '/upload?async=1',
+        data={'file': (io.BytesIO(jpeg), 'lure.jpg')},
+        headers={'X-User-ID': user},
+        content_type='multipart/form-data',
+    )
+
+
+class TestAsyncUploadEndpoints:
+    def test_async_upload_returns_202_then_result(self, api_client, backend_app, jpeg_bytes):
+        backend_app.mobile_classifier.delay = 0.2
+        response = upload_async(api_client, jpeg_bytes())
+
+        assert response.status_code == 202
+        body = response.get_json()
+        assert body['status'] == 'queued'
+        assert response.headers['Location'] == body['status_url']
+        # Quota was reserved on the request thread
+        assert backend_app.supabase_service.pending_scans == [(USER, 'lure.jpg')]
+
+        def finished():
+            job = api_client.get(body['status_url'], headers={'X-User-ID': USER}).get_json()
+            return job['status'] == SUCCEEDED
+
+        assert wait_for(finished)
+        job = api_client.get(body['status_url'], headers={'X-User-ID': USER}).get_json()
+        assert job['result']['lure_type'] == 'Jig'
+        assert job['result']['supabase_id'] == 'scan-1'
+
+    def test_other_users_cannot_read_job(self, api_client, jpeg_bytes):
+        body = upload_async(api_client, jpeg_bytes()).get_json()
+        response = api_client.get(body['status_url'], headers={'X-User-ID': OTHER_USER})
+        assert response.status_code == 404
+
+    def test_full_queue_returns_503_without_using_quota(self, api_client, backend_app, jpeg_bytes):
+        backend_app.scan_jobs.max_queued = 0
+        response = upload_async(api_client, jpeg_bytes())
+        assert response.status_code == 503
+        assert response.get_json()['error'] == 'queue_full'
+        assert backend_app.supabase_service.pending_scans == []
+
+    def test_quota_exceeded_releases_queue_slot(self, api_client, backend_app, jpeg_bytes):
+        backend_app.supabase_service.can_scan = False
+        assert upload_async(api_client, jpeg_bytes()).status_code == 403
+        assert backend_app.scan_jobs.stats()['pending'] == 0
+
+    def test_event_stream_ends_with_result(self, api_client, backend_app, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(backend_app.config, 'SCAN_JOB_POLL_SECONDS', 0.02)
+        backend_app.mobile_classifier.delay = 0.1
+        body = upload_async(api_client, jpeg_bytes()).get_json()
+
+        response = api_client.get(body['events_url'], headers={'X-User-ID': USER})
+        assert response.mimetype == 'text/event-stream'
+        events = [chunk for chunk in response.get_data(as_text=True).split('\n\n') if chunk.startswith('event:')]
+
+        last_event, last_data = events[-1].split('\n', 1)
+        assert last_event == 'event: succeeded'
+        assert json.loads(last_data[len('data: '):])['result']['lure_type'] == 'Jig'
+
+    def test_event_stream_ends_when_job_is_purged(self, api_client, backend_app, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(backend_app.config, 'SCAN_JOB_POLL_SECONDS', 0.02)
+        backend_app.mobile_classifier.delay = 0.1
+        body = upload_async(api_client, jpeg_bytes()).get_json()
+        job = backend_app.scan_jobs.store.get(body['job_id'])
+        lookups = iter([job])
+        monkeypatch.setattr(backend_app.scan_jobs.store, 'get', lambda job_id: next(lookups, None))
+
+        response = api_client.get(body['events_url'], headers={'X-User-ID': USER})
+        events = [chunk for chunk in response.get_data(as_text=True).split('\n\n') if chunk.startswith('event:')]
+
+        assert events[-1].split('\n', 1)[0] == 'event: gone'
+
+    def test_sync_upload_still_returns_result(self, api_client, jpeg_bytes):
+        response = api_client.post(
+            '/upload',
+            data={'file': (io.BytesIO(jpeg_bytes()), 'lure.jpg')},
+            headers={'X-User-ID': USER},
+            content_type='multipart/form-data',
+        )
+        assert response.status_code == 200
+        assert response.get_json()['lure_type'] == 'Jig'
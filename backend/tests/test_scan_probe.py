@@ -0,0 +1,146 @@
+"""
+Tests for /api/scan-probe and MobileLureClassifier.probe_cache
+"""
+
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from near_duplicate import NearDuplicateIndex, dhash
+from result_cache import ResultCache
+
+RESULT = {
+    'success': True, 'lure_type': 'Spinnerbait', 'confidence': 90,
+    'chatgpt_analysis': {}, 'lure_details': {}, 'analysis_method': 'ChatGPT Vision API',
+}
+DIGEST = 'ab' * 32
+URLS = {
+    'image_thumb_url': f'https://storage.test/user-1/{DIGEST}/thumb.jpg',
+    'image_medium_url': f'https://storage.test/user-1/{DIGEST}/medium.jpg',
+    'image_url': f'https://storage.test/user-1/{DIGEST}/medium.jpg',
+}
+
+
+def probe(api_client, **body):
+    return api_client.post('/api/scan-probe', json=body, headers={'X-User-ID': 'user-1'})
+
+
+class TestProbeCache:
+    @pytest.fixture
+    def classifier(self, tmp_path, monkeypatch):
+        import mobile_lure_classifier
+
+        instance = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key',
+            result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), ttl_seconds=60, negative_ttl_seconds=5),
+            near_duplicate_index=NearDuplicateIndex(str(tmp_path / 'index.sqlite3'), max_distance=4),
+        )
+        monkeypatch.setattr(instance, '_analyze_uncached',
+                            lambda path, deadline=None, image_bytes=None, progress=None, first_pass=None:
+                            dict(RESULT, image_path=path))
+        return instance
+
+    def test_exact_hit_after_analysis(self, classifier, jpeg_bytes):
+        image = jpeg_bytes((320, 240))
+        classifier.analyze_lure('lure.jpg', image_bytes=image)
+
+        results = classifier.probe_cache(hashlib.sha256(image).hexdigest())
+
+        assert results['lure_type'] == 'Spinnerbait'
+        assert results['cached'] is True
+        assert 'near_duplicate' not in results
+        assert classifier.probe_cache(DIGEST) is None
+        assert classifier.get_stats()['probe'] == {'exact': 1, 'near_duplicate': 0, 'misses': 1}
+
+    def test_perceptual_hash_finds_near_duplicate(self, classifier, jpeg_bytes):
+        image = Image.new('RGB', (320, 240), (200, 190, 170))
+        image.paste((180, 40, 30), (80, 90, 240, 150))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG')
+        classifier.analyze_lure('lure.jpg', image_bytes=buffer.getvalue())
+
+        results = classifier.probe_cache(DIGEST, dhash(image.resize((160, 120))))
+
+        assert results['near_duplicate'] is True
+        assert results['lure_type'] == 'Spinnerbait'
+
+    def test_cached_failures_are_misses(self, classifier, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(classifier, '_analyze_uncached',
+                            lambda path, deadline=None, image_bytes=None, progress=None, first_pass=None:
+                            {'error': 'Not a lure'})
+        image = jpeg_bytes()
+        classifier.analyze_lure('lure.jpg', image_bytes=image)
+
+        assert classifier.probe_cache(hashlib.sha256(image).hexdigest()) is None
+
+
+class TestScanProbeEndpoint:
+    def test_hit_records_the_scan_without_an_upload(self, backend_app, api_client):
+        backend_app.mobile_classifier.cached[DIGEST] = RESULT
+        backend_app.supabase_service.stored_images[DIGEST] = URLS
+
+        response = probe(api_client, sha256=DIGEST.upper(), filename='lure.jpg')
+
+        body = response.get_json()
+        assert response.status_code == 200
+        assert body['status'] == 'hit'
+        assert body['result']['lure_type'] == 'Spinnerbait'
+        assert body['result']['image_thumb_url'] == URLS['image_thumb_url']
+        assert backend_app.supabase_service.pending_scans == [('user-1', 'lure.jpg')]
+        assert backend_app.supabase_service.updates[0][0] == 'scan-1'
+        assert backend_app.supabase_service.uploads == []
+
+    def test_hit_still_needs_quota(self, backend_app, api_client):
+        backend_app.mobile_classifier.cached[DIGEST] = RESULT
+        backend_app.supabase_service.stored_images[DIGEST] = URLS
+        backend_app.supabase_service.can_scan = False
+
+        response = probe(api_client, sha256=DIGEST)
+
+        assert response.status_code == 403
+        assert response.get_json()['error'] == 'quota_exceeded'
+
+    def test_cached_result_without_stored_image_asks_for_upload(self, backend_app, api_client):
+        backend_app.mobile_classifier.cached[DIGEST] = RESULT
+
+        body = probe(api_client, sha256=DIGEST).get_json()
+
+        assert body == {'status': 'upload', 'upload': {'url': '/upload', 'field': 'file'}}
+        assert backend_app.supabase_service.pending_scans == []
+
+    def test_miss_returns_ticket_with_resize_hint(self, backend_app, api_client, monkeypatch):
+        monkeypatch.setattr(backend_app.config, 'STORE_ORIGINAL_IMAGES', False)
+
+        body = probe(api_client, sha256=DIGEST, width=4032, height=3024).get_json()
+
+        assert body['status'] == 'upload'
+        assert body['upload']['url'] == '/upload'
+        assert body['upload']['resize_to'] == max(backend_app.config.MAX_IMAGE_DIMENSION,
+                                                  backend_app.config.IMAGE_MEDIUM_SIZE)
+        assert 'resize_to' not in probe(api_client, sha256=DIGEST, width=800, height=600).get_json()['upload']
+
+    def test_other_users_scans_are_not_revealed(self, backend_app, api_client):
+        other = 'cd' * 32
+        backend_app.mobile_classifier.cached[other] = RESULT
+        backend_app.mobile_classifier.cached[DIGEST] = dict(RESULT, near_duplicate=True)
+
+        responses = [probe(api_client, sha256=digest, perceptual_hash='0' * 16).get_json()
+                     for digest in (other, DIGEST, 'ef' * 32)]
+
+        assert responses[0] == responses[1] == responses[2]
+        assert 'preview' not in responses[0]
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'sha256': 'not-a-digest'},
+        {'sha256': DIGEST, 'width': 'wide'},
+        {'sha256': DIGEST, 'width': 0},
+    ])
+    def test_bad_requests(self, backend_app, api_client, body):
+        assert probe(api_client, **body).status_code == 400
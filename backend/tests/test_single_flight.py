@@ -0,0 +1,247 @@
+"""
+Tests for backend/single_flight.py
+
+Covers in-process coalescing across threads, cross-worker coalescing via
+the SQLite lock table (two SingleFlight instances stand in for two gunicorn
+workers), lease takeover, and error propagation.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from single_flight import InFlightTimeoutError, SingleFlight
+
+
+def run_in_threads(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return results, errors
+
+
+class TestInProcess:
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight(None)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'lure_type': 'Jig'}
+
+        results, _ = run_in_threads(8, lambda: flight.do('k', slow))
+
+        assert len(calls) == 1
+        assert all(result[0] == {'lure_type': 'Jig'} for result in results)
+        assert sum(shared for _, shared in results) == 7
+        assert flight.stats()['local_followers'] == 7
+
+    def test_different_keys_do_not_coalesce(self):
+        flight = SingleFlight(None)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return {}
+
+        run_in_threads(2, lambda: flight.do(f'k{threading.get_ident()}', slow))
+        assert len(calls) == 2
+
+    def test_leader_error_reaches_followers(self):
+        flight = SingleFlight(None)
+
+        def boom():
+            time.sleep(0.2)
+            raise RuntimeError('upstream exploded')
+
+        _, errors = run_in_threads(3, lambda: flight.do('k', boom))
+        assert all(isinstance(e, RuntimeError) for e in errors)
+
+    def test_follower_stops_waiting_at_its_deadline(self):
+        flight = SingleFlight(None)
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: flight.do('k', lambda: release.wait(5) and {}))
+        leader.start()
+        time.sleep(0.05)
+
+        started = time.monotonic()
+        with pytest.raises(InFlightTimeoutError):
+            flight.do('k', lambda: {'lure_type': 'should not run'}, deadline=time.monotonic() + 0.2)
+        release.set()
+        leader.join()
+
+        assert time.monotonic() - started < 1
+        assert flight.stats()['timeouts'] == 1
+
+    def test_coroutines_share_one_call(self):
+        import asyncio
+        flight = SingleFlight(None)
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return {'lure_type': 'Jig'}
+
+        async def run():
+            return await asyncio.gather(*(flight.do_async('k', slow) for _ in range(4)))
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert [shared for _, shared in results].count(True) == 3
+        assert flight.stats()['in_flight'] == 0
+
+    def test_key_is_released_after_completion(self):
+        flight = SingleFlight(None)
+        flight.do('k', lambda: {'n': 1})
+        result, shared = flight.do('k', lambda: {'n': 2})
+        assert result == {'n': 2}
+        assert shared is False
+
+
+class TestAcrossWorkers:
+    def test_second_worker_waits_for_first_workers_result(self, tmp_path):
+        lock_path = str(tmp_path / 'inflight.sqlite3')
+        worker_a = SingleFlight(lock_path, poll_interval=0.02)
+        worker_b = SingleFlight(lock_path, poll_interval=0.02)
+        shared_store = {}
+        calls = []
+
+        def leader_call():
+            calls.append('a')
+            time.sleep(0.3)
+            shared_store['k'] = {'lure_type': 'Spoon'}
+            return shared_store['k']
+
+        def follower_call():
+            calls.append('b')
+            return {'lure_type': 'should not run'}
+
+        leader = threading.Thread(target=lambda: worker_a.do('k', leader_call, lambda: shared_store.get('k')))
+        leader.start()
+        time.sleep(0.05)
+        result, shared = worker_b.do('k', follower_call, lambda: shared_store.get('k'))
+        leader.join()
+
+        assert calls == ['a']
+        assert result == {'lure_type': 'Spoon'}
+        assert shared is True
+        assert worker_b.stats()['remote_followers'] == 1
+
+    def test_expired_lease_is_taken_over(self, tmp_path):
+        lock_path = str(tmp_path / 'inflight.sqlite3')
+        crashed = SingleFlight(lock_path, lease_seconds=0.1)
+        assert crashed._claim('k') is True  # claimed, never released
+
+        survivor = SingleFlight(lock_path, lease_seconds=5, poll_interval=0.05)
+        result, shared = survivor.do('k', lambda: {'lure_type': 'Tube'}, lambda: None)
+
+        assert result == {'lure_type': 'Tube'}
+        assert shared is False
+        assert survivor.stats()['takeovers'] == 1
+
+    def test_unreleased_claim_gives_up_at_the_deadline(self, tmp_path):
+        lock_path = str(tmp_path / 'inflight.sqlite3')
+        stuck = SingleFlight(lock_path, lease_seconds=120)
+        assert stuck._claim('k') is True  # never released, lease far off
+
+        waiter = SingleFlight(lock_path, lease_seconds=120, poll_interval=0.05)
+        calls = []
+        started = time.monotonic()
+        with pytest.raises(InFlightTimeoutError):
+            waiter.do('k', lambda: calls.append(1), lambda: None, deadline=time.monotonic() + 0.3)
+
+        assert calls == []
+        assert 0.25 < time.monotonic() - started < 1
+        assert waiter.stats()['timeouts'] == 1
+
+    def test_released_without_result_lets_follower_lead(self, tmp_path):
+        lock_path = str(tmp_path / 'inflight.sqlite3')
+        worker_a = SingleFlight(lock_path)
+        worker_b = SingleFlight(lock_path, poll_interval=0.02)
+
+        assert worker_a._claim('k') is True
+        threading.Timer(0.1, worker_a._release, args=('k',)).start()
+
+        result, shared = worker_b.do('k', lambda: {'lure_type': 'Grub'}, lambda: None)
+        assert result == {'lure_type': 'Grub'}
+        assert shared is False
+
+
+class TestClassifierCoalescing:
+    def test_double_tap_makes_one_upstream_call(self, tmp_path, monkeypatch):
+        from PIL import Image
+        import mobile_lure_classifier
+        from result_cache import ResultCache
+
+        monkeypatch.setattr(mobile_lure_classifier.config, 'NEAR_DUPLICATE_ENABLED', False)
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key',
+            result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5),
+            single_flight=SingleFlight(str(tmp_path / 'inflight.sqlite3')),
+        )
+        calls = []
+
+        def fake_analyze(path, deadline=None, image_bytes=None, progress=None, first_pass=None):
+            calls.append(path)
+            time.sleep(0.2)
+            return {
+                'success': True, 'image_path': path, 'lure_type': 'Buzzbait', 'confidence': 80,
+                'chatgpt_analysis': {}, 'lure_details': {}, 'analysis_method': 'ChatGPT Vision API',
+            }
+
+        monkeypatch.setattr(classifier, '_analyze_uncached', fake_analyze)
+
+        path = tmp_path / 'tap.jpg'
+        Image.new('RGB', (32, 32), (10, 200, 10)).save(path, 'JPEG')
+        results, _ = run_in_threads(2, lambda: classifier.analyze_lure(str(path)))
+
+        assert len(calls) == 1
+        assert {r['lure_type'] for r in results} == {'Buzzbait'}
+        assert sum(bool(r.get('coalesced')) for r in results) == 1
+
+    def test_deadline_while_another_worker_holds_the_claim(self, tmp_path, monkeypatch):
+        from PIL import Image
+        import mobile_lure_classifier
+        from result_cache import ResultCache
+
+        monkeypatch.setattr(mobile_lure_classifier.config, 'NEAR_DUPLICATE_ENABLED', False)
+        lock_path = str(tmp_path / 'inflight.sqlite3')
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key',
+            result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5),
+            single_flight=SingleFlight(lock_path, poll_interval=0.05),
+        )
+        calls = []
+        monkeypatch.setattr(classifier, '_analyze_uncached', lambda path, *args, **kwargs: calls.append(path))
+
+        path = tmp_path / 'tap.jpg'
+        Image.new('RGB', (32, 32), (10, 200, 10)).save(path, 'JPEG')
+        key = classifier._result_cache_key(path.read_bytes())
+        assert SingleFlight(lock_path)._claim(key) is True
+
+        results = classifier.analyze_lure(str(path), deadline=time.monotonic() + 0.2)
+        retry = classifier.analyze_lure(str(path), deadline=time.monotonic() + 0.2)
+
+        assert calls == []
+        assert results['retryable'] is True
+        assert retry['retryable'] is True  # not cached as a failure
@@ -0,0 +1,104 @@
+"""
+Tests for backend/structured_output.py and the classifier's response schema
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+from structured_output import AnalysisFormatError, compact, parse_analysis, parse_batch, response_format
+
+LURE_TYPES = ['Jig', 'Squarebill Crankbait', 'Unknown']
+
+
+class TestParse:
+    def test_compact_answer_expanded(self):
+        content = json.dumps({'t': 'Jig', 'c': 87.6, 'f': ['skirt'], 'r': 'weed guard', 's': ['Bass']})
+
+        assert parse_analysis(content, LURE_TYPES) == {
+            'lure_type': 'Jig', 'confidence': 88, 'visual_features': ['skirt'],
+            'reasoning': 'weed guard', 'target_species': ['Bass'],
+        }
+
+    @pytest.mark.parametrize('content', [
+        'This looks like a jig to me.',
+        json.dumps({'t': 'Spinner Thing', 'c': 80}),
+        json.dumps({'t': 'Jig', 'c': '80%'}),
+        json.dumps(['Jig']),
+        None,
+    ])
+    def test_off_schema_answers_rejected(self, content):
+        with pytest.raises(AnalysisFormatError):
+            parse_analysis(content, LURE_TYPES)
+
+    def test_optional_fields_default_and_confidence_clamped(self):
+        analysis = parse_analysis(json.dumps({'t': 'Unknown', 'c': 140, 'f': 'not a list'}), LURE_TYPES)
+
+        assert analysis['confidence'] == 100
+        assert analysis['visual_features'] == [] and analysis['reasoning'] == ''
+
+    def test_batch_keeps_valid_entries(self):
+        content = json.dumps({'results': [
+            compact(dict(DEFAULT_ANALYSIS, image=2)),
+            {'i': 1, 't': 'Not A Lure', 'c': 50},
+            compact(dict(DEFAULT_ANALYSIS, lure_type='Jig', image='Image 3')),
+        ]})
+
+        analyses = parse_batch(content, LURE_TYPES)
+
+        assert sorted(analyses) == [2, 3]
+        assert analyses[3]['lure_type'] == 'Jig'
+
+    def test_schema_is_strict(self):
+        schema = response_format(LURE_TYPES)['json_schema']
+        properties = schema['schema']['properties']
+
+        assert schema['strict'] is True
+        assert list(properties) == ['t', 'c', 'f', 'r', 's']
+        assert schema['schema']['required'] == list(properties)
+        assert properties['t']['enum'] == LURE_TYPES
+        batch_entry = response_format(LURE_TYPES, batch=True)['json_schema']['schema']['properties']['results']['items']
+        assert batch_entry['required'][0] == 'i'
+
+
+class TestClassifierStructuredOutput:
+    def test_request_carries_schema_from_lure_database(self, jpeg_bytes, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes())
+
+        body = json.loads(server.requests[0]['body'])
+        enum = body['response_format']['json_schema']['schema']['properties']['t']['enum']
+        assert enum == list(classifier.lure_database) + ['Unknown']
+        assert '"t": ' in body['messages'][0]['content']
+        assert results['chatgpt_analysis'] == DEFAULT_ANALYSIS
+
+    def test_failures_and_completion_tokens_counted(self, jpeg_bytes, make_classifier):
+        script = [
+            (200, completion(DEFAULT_ANALYSIS, completion_tokens=60), {}),
+            (200, completion('Sorry, I cannot tell what this is.', completion_tokens=20), {}),
+        ]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            classifier.analyze_lure('a.jpg', image_bytes=jpeg_bytes())
+            failed = classifier.analyze_lure('b.jpg', image_bytes=jpeg_bytes(color=(10, 10, 10)))
+
+        assert failed['error'].startswith('Failed to parse ChatGPT response')
+        assert classifier.get_stats()['structured_output'] == {
+            'answers': 2, 'parse_failures': 1, 'completion_tokens': 80,
+            'parse_failure_rate': 0.5, 'avg_completion_tokens': 40.0,
+        }
+
+    def test_refusal_reported(self, jpeg_bytes, make_classifier):
+        body = completion('')
+        body['choices'][0]['message'] = {'role': 'assistant', 'content': None, 'refusal': 'I cannot help with that.'}
+        with FakeOpenAIServer(script=[(200, body, {})]) as server:
+            result = make_classifier(server).analyze_lure('a.jpg', image_bytes=jpeg_bytes())
+
+        assert 'I cannot help with that.' in result['error']
@@ -0,0 +1,121 @@
+"""
+Tests for backend/token_cost.py and the header-only /estimate-cost path
+"""
+
+import io
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from token_cost import (
+    TokenCostModel, high_detail_size, image_tokens, optimal_dimensions, tile_count,
+)
+
+GPT_4O = config.MODEL_PRICING['gpt-4o']
+GPT_4O_MINI = config.MODEL_PRICING['gpt-4o-mini']
+
+
+class TestImageTokens:
+    @pytest.mark.parametrize('size, detail, tokens', [
+        ((1024, 1024), 'high', 765),     # 768x768 -> 4 tiles
+        ((2048, 4096), 'high', 1105),    # 768x1536 -> 6 tiles
+        ((4096, 8192), 'low', 85),
+        ((500, 400), 'high', 255),       # 1 tile
+    ])
+    def test_published_examples(self, size, detail, tokens):
+        assert image_tokens(*size, detail, GPT_4O) == tokens
+
+    def test_mini_bills_more_tokens_per_tile(self):
+        assert image_tokens(1024, 1024, 'high', GPT_4O_MINI) == 2833 + 4 * 5667
+
+    def test_high_detail_size(self):
+        assert high_detail_size(4000, 3000) == (1024, 768)
+        assert high_detail_size(600, 400) == (600, 400)
+        assert tile_count(1024, 768) == 4
+
+
+class TestOptimalDimensions:
+    def test_never_sends_more_pixels_than_billed(self):
+        assert optimal_dimensions(1600, 1200, 1200) == (1024, 768)
+
+    def test_snaps_to_fewer_tiles_within_tolerance(self):
+        # 1100x540 covers 3x2 tiles; 7% smaller fits 2x1
+        assert optimal_dimensions(1100, 540, 1200, tolerance=0.1) == (1024, 502)
+        assert tile_count(*optimal_dimensions(1100, 540, 1200, tolerance=0.1)) == 2
+
+    def test_does_not_shrink_beyond_tolerance(self):
+        assert optimal_dimensions(1100, 540, 1200, tolerance=0.0) == (1100, 540)
+
+    def test_low_detail_only_fits_max_dimension(self):
+        assert optimal_dimensions(1600, 1200, 512, 'low') == (512, 384)
+
+
+class TestTokenCostModel:
+    def test_pricing_matches_dated_snapshots(self):
+        model = TokenCostModel(config.MODEL_PRICING, 'prompt')
+        assert model.pricing_for('gpt-4o-mini-2024-07-18') is GPT_4O_MINI
+        assert model.pricing_for('gpt-4o-2024-08-06') is GPT_4O
+        with pytest.raises(KeyError):
+            model.pricing_for('some-other-model')
+
+    def test_prompt_tokens_calibrate_from_usage(self):
+        model = TokenCostModel(config.MODEL_PRICING, 'x' * 400)
+        assert model.prompt_tokens('gpt-4o') == (107, False)
+
+        model.observe('gpt-4o', 'high', (1024, 768), {'prompt_tokens': 765 + 412})
+
+        assert model.prompt_tokens('gpt-4o') == (412, True)
+        assert model.estimate(1024, 768, 'high', 'gpt-4o')['input_tokens'] == 765 + 412
+
+    def test_estimate_costs(self):
+        model = TokenCostModel(config.MODEL_PRICING, 'x' * 400)
+        estimate = model.estimate(4000, 3000, 'high', 'gpt-4o', max_output_tokens=500)
+
+        assert estimate['sent_dimensions'] == [1024, 768]
+        assert estimate['tiles'] == 4
+        assert estimate['input_tokens'] == 765 + 107
+        assert estimate['input_cost_usd'] == pytest.approx(872 * 2.50 / 1e6)
+        assert estimate['max_output_cost_usd'] == pytest.approx(500 * 10.00 / 1e6)
+
+
+class TestEstimateCostEndpoint:
+    def test_header_only_estimate(self, tmp_path, monkeypatch):
+        from PIL import Image
+        import mobile_lure_classifier
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 3000), (10, 120, 90)).save(buffer, 'JPEG')
+        classifier = mobile_lure_classifier.MobileLureClassifier(openai_api_key='k', result_cache=False)
+
+        def no_decode(*args, **kwargs):
+            raise AssertionError('image was decoded')
+
+        monkeypatch.setattr(Image.Image, 'load', no_decode)
+        started = time.perf_counter()
+        for _ in range(20):
+            buffer.seek(0)
+            estimate = classifier.estimate_api_cost(buffer, 'high')
+        per_call = (time.perf_counter() - started) / 20
+
+        assert estimate['sent_dimensions'] == [1024, 768]
+        assert estimate['estimated_tokens'] == estimate['image_tokens'] + estimate['prompt_tokens']
+        assert per_call < 0.005
+
+    def test_endpoint_writes_no_temp_file(self, backend_app, api_client, jpeg_bytes, tmp_path, monkeypatch):
+        import mobile_lure_classifier
+
+        monkeypatch.setattr(backend_app, 'mobile_classifier',
+                            mobile_lure_classifier.MobileLureClassifier(openai_api_key='k', result_cache=False))
+        response = api_client.post(
+            '/estimate-cost?detail=low', data={'file': (io.BytesIO(jpeg_bytes((800, 600))), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['detail'] == 'low'
+        assert response.get_json()['tiles'] == 0
+        assert os.listdir(tmp_path / 'uploads') == []
@@ -0,0 +1,101 @@
+"""
+Tests for backend/upload_image_cache.py and /uploads/<filename>
+"""
+
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from upload_image_cache import UploadImageCache, snap_width
+
+
+@pytest.fixture
+def upload(tmp_path, jpeg_bytes):
+    """A 1600x1200 JPEG in the uploads folder"""
+    path = tmp_path / 'uploads' / 'lure.jpg'
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(jpeg_bytes((1600, 1200)))
+    return path
+
+
+class TestUploadImageCache:
+    def test_renders_once_then_hits(self, tmp_path, upload):
+        cache = UploadImageCache(str(tmp_path / 'renditions'), 10 * 1024 * 1024)
+
+        path, mimetype, etag = cache.get(str(upload), 256, 'webp')
+        again = cache.get(str(upload), 256, 'webp')
+
+        assert again == (path, mimetype, etag)
+        assert mimetype == 'image/webp'
+        assert Image.open(path).size == (256, 192)
+        assert cache.stats()['misses'] == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_replaced_source_gets_a_new_rendition(self, tmp_path, upload, jpeg_bytes):
+        cache = UploadImageCache(str(tmp_path / 'renditions'), 10 * 1024 * 1024)
+        _, _, before = cache.get(str(upload), 256, 'jpeg')
+
+        upload.write_bytes(jpeg_bytes((800, 800)))
+        path, _, after = cache.get(str(upload), 256, 'jpeg')
+
+        assert after != before
+        assert Image.open(path).size == (256, 256)
+
+    def test_least_recently_used_evicted_over_the_bound(self, tmp_path, upload):
+        directory = tmp_path / 'renditions'
+        cache = UploadImageCache(str(directory), 1)  # every write goes over
+        first, _, _ = cache.get(str(upload), 128, 'png')
+        os.utime(first, (0, 0))
+
+        second, _, _ = cache.get(str(upload), 256, 'png')
+
+        assert not os.path.exists(first)
+        assert cache.stats()['evictions'] >= 1
+
+    def test_width_snaps_up(self):
+        assert snap_width(200) == 256
+        assert snap_width(256) == 256
+        assert snap_width(10000) == 2048
+
+
+class TestUploadsEndpoint:
+    def test_original_supports_conditional_and_range(self, backend_app, api_client, upload):
+        response = api_client.get('/uploads/lure.jpg')
+        assert response.status_code == 200
+        assert response.headers['ETag']
+
+        assert api_client.get('/uploads/lure.jpg', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        ranged = api_client.get('/uploads/lure.jpg', headers={'Range': 'bytes=0-9'})
+        assert ranged.status_code == 206
+        assert ranged.data == upload.read_bytes()[:10]
+
+    def test_resized_rendition(self, backend_app, api_client, upload):
+        response = api_client.get('/uploads/lure.jpg?w=200&fmt=webp')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert Image.open(io.BytesIO(response.data)).size == (256, 192)
+        assert response.headers['Last-Modified']
+        assert 'max-age' in response.headers['Cache-Control']
+
+    def test_resized_rendition_304_and_range(self, backend_app, api_client, upload):
+        etag = api_client.get('/uploads/lure.jpg?w=256').headers['ETag']
+
+        assert api_client.get('/uploads/lure.jpg?w=256', headers={'If-None-Match': etag}).status_code == 304
+        ranged = api_client.get('/uploads/lure.jpg?w=256', headers={'Range': 'bytes=0-3'})
+        assert ranged.status_code == 206
+        assert ranged.data[:2] == b'\xff\xd8'
+
+    def test_bad_parameters(self, backend_app, api_client, upload):
+        assert api_client.get('/uploads/lure.jpg?w=abc').status_code == 400
+        assert api_client.get('/uploads/lure.jpg?w=-5').status_code == 400
+        assert api_client.get('/uploads/lure.jpg?fmt=gif').status_code == 400
+
+    def test_missing_and_traversal(self, backend_app, api_client, upload):
+        assert api_client.get('/uploads/nope.jpg?w=256').status_code == 404
+        assert api_client.get('/uploads/..%2Fsecret.jpg').status_code == 404
@@ -0,0 +1,169 @@
+"""
+Tests for streamed classification and /upload?stream=1
+
+The classifier asks the vision API for a streamed answer when given a
+progress callback and reports the lure type as soon as the model has
+written it; /upload?stream=1 forwards those stages as Server-Sent Events.
+"""
+
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DEFAULT_ANALYSIS, FakeOpenAIServer, completion
+
+USER = 'user-1'
+
+
+def recorder():
+    events = []
+
+    def progress(event, data):
+        events.append((event, data, time.monotonic()))
+
+    return events, progress
+
+
+def parse_events(body):
+    """(event, data) pairs of an SSE response body, skipping comments"""
+    events = []
+    for block in body.split('\n\n'):
+        if block.startswith('event:'):
+            event, data = block.split('\n', 1)
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class TestStreamingClassification:
+    def test_stages_reported_and_result_unchanged(self, jpeg_bytes, make_classifier):
+        events, progress = recorder()
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+
+        body = json.loads(server.requests[0]['body'])
+        assert body['stream'] is True
+        assert body['stream_options'] == {'include_usage': True}
+        assert [event for event, _, _ in events] == ['compressed', 'sent', 'model_streaming', 'lure_type']
+        assert events[3][1]['lure_type'] == 'Squarebill Crankbait'
+        assert results['lure_type'] == 'Squarebill Crankbait'
+        assert results['chatgpt_analysis'] == DEFAULT_ANALYSIS
+        assert results['token_usage'] == completion(DEFAULT_ANALYSIS)['usage']
+
+    def test_lure_type_reported_before_the_answer_ends(self, jpeg_bytes, make_classifier):
+        events, progress = recorder()
+        with FakeOpenAIServer(stream_delay=0.05) as server:
+            classifier = make_classifier(server)
+            classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+            finished = time.monotonic()
+
+        reported = next(at for event, _, at in events if event == 'lure_type')
+        assert finished - reported > 0.2
+
+    def test_retried_attempts_reported(self, jpeg_bytes, make_classifier):
+        events, progress = recorder()
+        script = [(503, {'error': 'overloaded'}, {'Retry-After': '0'})]
+        with FakeOpenAIServer(script=script) as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+
+        assert [data['attempt'] for event, data, _ in events if event == 'sent'] == [1, 2]
+        assert results['lure_type'] == 'Squarebill Crankbait'
+
+    def test_error_status_not_streamed(self, jpeg_bytes, make_classifier):
+        events, progress = recorder()
+        with FakeOpenAIServer(script=[(400, {'error': 'bad image'}, {})]) as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+
+        assert 'bad image' in results['error']
+        assert 'model_streaming' not in [event for event, _, _ in events]
+
+    def test_malformed_chunk_falls_back_to_a_plain_request(self, jpeg_bytes, make_classifier):
+        events, progress = recorder()
+        with FakeOpenAIServer(malformed_streams=1) as server:
+            classifier = make_classifier(server)
+            results = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+
+        assert [json.loads(request['body']).get('stream') for request in server.requests] == [True, None]
+        assert results['lure_type'] == 'Squarebill Crankbait'
+        assert 'error' not in results
+
+    def test_malformed_chunk_is_not_cached_as_a_failure(self, tmp_path, jpeg_bytes, make_classifier):
+        from result_cache import ResultCache
+        _, progress = recorder()
+        with FakeOpenAIServer(malformed_streams=1) as server:
+            classifier = make_classifier(server, result_cache=ResultCache(str(tmp_path / 'results.sqlite3'), 60, 5))
+            classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+            again = classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes(), progress=progress)
+
+        assert again['cached'] is True
+        assert again['lure_type'] == 'Squarebill Crankbait'
+        assert classifier.result_cache.stats()['negative_hits'] == 0
+
+    def test_without_progress_the_request_is_not_streamed(self, jpeg_bytes, make_classifier):
+        with FakeOpenAIServer() as server:
+            classifier = make_classifier(server)
+            classifier.analyze_lure('lure.jpg', image_bytes=jpeg_bytes())
+
+        assert 'stream' not in json.loads(server.requests[0]['body'])
+
+
+class TestUploadStream:
+    def post(self, api_client, image, query='?stream=1'):
+        return api_client.post(
+            f'/upload{query}', data={'file': (io.BytesIO(image), 'lure.jpg')},
+            headers={'X-User-ID': USER}, content_type='multipart/form-data',
+        )
+
+    def test_events_in_order_with_timings(self, backend_app, api_client, jpeg_bytes):
+        response = self.post(api_client, jpeg_bytes())
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = parse_events(response.get_data(as_text=True))
+        assert [event for event, _ in events] == ['received', 'parsed', 'stored', 'succeeded']
+        assert all(isinstance(data['elapsed_ms'], int) for _, data in events)
+        assert events[1][1]['lure_type'] == 'Jig'
+        assert events[-1][1]['supabase_id'] == backend_app.supabase_service.updates[0][0]
+
+    def test_lure_type_sent_before_storage(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        classifier = backend_app.mobile_classifier
+        analyze = classifier.analyze_lure
+
+        def streaming(path, **kwargs):
+            kwargs['progress']('lure_type', {'lure_type': 'Jig', 'detail': None})
+            return analyze(path, **kwargs)
+
+        monkeypatch.setattr(classifier, 'analyze_lure', streaming)
+        events = [event for event, _ in parse_events(self.post(api_client, jpeg_bytes()).get_data(as_text=True))]
+
+        assert events.index('lure_type') < events.index('parsed') < events.index('stored')
+
+    def test_failed_scan_ends_with_failed_event(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        monkeypatch.setattr(backend_app.mobile_classifier, 'analyze_lure',
+                            lambda path, **kwargs: {'error': 'Vision API temporarily unavailable',
+                                                    'retryable': True, 'retry_after': 12})
+
+        event, data = parse_events(self.post(api_client, jpeg_bytes()).get_data(as_text=True))[-1]
+
+        assert event == 'failed'
+        assert data['retry_after'] == 12
+
+    def test_refusals_stay_plain_json(self, backend_app, api_client, jpeg_bytes):
+        backend_app.supabase_service.remaining = 0
+
+        response = self.post(api_client, jpeg_bytes())
+
+        assert response.status_code == 403
+        assert response.get_json()['error'] == 'quota_exceeded'
+
+    def test_without_stream_the_response_is_json(self, backend_app, api_client, jpeg_bytes):
+        response = self.post(api_client, jpeg_bytes(), query='')
+
+        assert response.get_json()['lure_type'] == 'Jig'
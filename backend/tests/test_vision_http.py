@@ -0,0 +1,103 @@
+"""
+Tests for backend/vision_http.py
+
+Runs the pooled client against a local stand-in HTTPS server (self-signed
+certificate) to check connection reuse, timeouts and the analyze_lure
+request path end to end.
+"""
+
+import os
+import sys
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import FakeOpenAIServer, make_self_signed_cert
+from vision_http import VisionHTTPClient
+
+
+@pytest.fixture(scope='module')
+def cert(tmp_path_factory):
+    paths = make_self_signed_cert(str(tmp_path_factory.mktemp('tls')))
+    if not paths:
+        pytest.skip('openssl not available to create a test certificate')
+    return paths
+
+
+@pytest.fixture
+def https_server(cert):
+    with FakeOpenAIServer(certfile=cert[0], keyfile=cert[1]) as server:
+        yield server
+
+
+def make_client(server, cert, **kwargs):
+    options = {'connect_timeout': 2, 'read_timeout': 2, 'pool_size': 4}
+    options.update(kwargs)
+    return VisionHTTPClient(server.base_url, verify=cert[0], **options)
+
+
+class TestConnectionReuse:
+    def test_sequential_requests_share_one_connection(self, https_server, cert):
+        client = make_client(https_server, cert)
+        for _ in range(5):
+            response = client.post('/chat/completions', {'Authorization': 'Bearer x'}, json={'n': 1})
+            assert response.status_code == 200
+
+        stats = client.stats()
+        assert stats['requests'] == 5
+        assert stats['connections_opened'] == 1
+        assert stats['connections_reused'] == 4
+        assert https_server.connections == 1
+
+    def test_untrusted_certificate_is_rejected(self, https_server):
+        client = VisionHTTPClient(https_server.base_url, connect_timeout=2, read_timeout=2)
+        with pytest.raises(requests.exceptions.SSLError):
+            client.post('/chat/completions', {}, json={})
+        assert client.stats()['connection_errors'] == 1
+
+
+class TestTimeouts:
+    def test_slow_upstream_hits_read_timeout(self, cert):
+        with FakeOpenAIServer(latency=1.0, certfile=cert[0], keyfile=cert[1]) as server:
+            client = make_client(server, cert, read_timeout=0.2)
+            with pytest.raises(requests.Timeout):
+                client.post('/chat/completions', {}, json={})
+        assert client.stats()['timeouts'] == 1
+
+
+class TestClassifierRequest:
+    def test_analyze_lure_goes_through_pooled_client(self, https_server, cert, tmp_path):
+        from PIL import Image
+        import mobile_lure_classifier
+
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key', result_cache=False, http_client=make_client(https_server, cert)
+        )
+        path = tmp_path / 'lure.jpg'
+        Image.new('RGB', (120, 80), (90, 40, 200)).save(path, 'JPEG')
+
+        first = classifier.analyze_lure(str(path))
+        second = classifier.analyze_lure(str(path))
+
+        assert first['lure_type'] == 'Squarebill Crankbait'
+        assert second['lure_type'] == 'Squarebill Crankbait'
+        assert https_server.requests[0]['path'] == '/v1/chat/completions'
+        assert https_server.requests[0]['headers']['Authorization'] == 'Bearer test-key'
+        assert classifier.get_stats()['http']['connections_reused'] == 1
+
+    def test_timeout_becomes_error_result(self, cert, tmp_path):
+        from PIL import Image
+        import mobile_lure_classifier
+        from vision_resilience import CircuitBreaker, VisionResilience
+
+        with FakeOpenAIServer(latency=1.0, certfile=cert[0], keyfile=cert[1]) as server:
+            classifier = mobile_lure_classifier.MobileLureClassifier(
+                openai_api_key='test-key', result_cache=False,
+                http_client=make_client(server, cert, read_timeout=0.2),
+                resilience=VisionResilience(CircuitBreaker(), max_attempts=1),
+            )
+            path = tmp_path / 'lure.jpg'
+            Image.new('RGB', (120, 80), (90, 40, 200)).save(path, 'JPEG')
+            assert classifier.analyze_lure(str(path)) == {'error': 'API request timed out', 'retryable': True}
@@ -0,0 +1,248 @@
+"""
+Tests for backend/vision_resilience.py
+
+Retries, Retry-After, deadlines and the circuit breaker, driven by the
+fault-injecting fake OpenAI server (scripted statuses, per-request delays
+and dropped connections).
+"""
+
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_openai import DROP, FakeOpenAIServer
+from vision_http import VisionHTTPClient
+from vision_resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, DeadlineExceededError,
+    VisionResilience, deadline_after, parse_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_policy(**kwargs):
+    breaker = kwargs.pop('breaker', None) or CircuitBreaker(min_requests=100)
+    options = {'max_attempts': 3, 'base_delay': 0.01, 'max_delay': 0.05, 'min_attempt_seconds': 0.1}
+    options.update(kwargs)
+    return VisionResilience(breaker, **options)
+
+
+def send_to(server, read_timeout=5):
+    client = VisionHTTPClient(server.base_url, connect_timeout=2, read_timeout=read_timeout)
+    return lambda budget: client.post('/chat/completions', {}, budget=budget, json={})
+
+
+class TestRetries:
+    def test_transient_status_is_retried(self):
+        script = [(503, {}, {}), (500, {}, {})]
+        with FakeOpenAIServer(script=script) as server:
+            policy = make_policy()
+            response = policy.call(send_to(server))
+
+        assert response.status_code == 200
+        assert len(server.requests) == 3
+        assert policy.stats()['retries'] == 2
+
+    def test_gives_up_after_max_attempts(self):
+        with FakeOpenAIServer(script=[(502, {}, {})] * 5) as server:
+            policy = make_policy()
+            response = policy.call(send_to(server))
+
+        assert response.status_code == 502
+        assert len(server.requests) == 3
+        assert policy.stats()['gave_up'] == 1
+
+    def test_client_errors_are_not_retried(self):
+        with FakeOpenAIServer(script=[(400, {}, {})]) as server:
+            policy = make_policy()
+            response = policy.call(send_to(server))
+
+        assert response.status_code == 400
+        assert len(server.requests) == 1
+
+    def test_retry_after_is_honoured(self):
+        with FakeOpenAIServer(script=[(429, {}, {'Retry-After': '0.4'})]) as server:
+            policy = make_policy()
+            started = time.monotonic()
+            response = policy.call(send_to(server))
+            elapsed = time.monotonic() - started
+
+        assert response.status_code == 200
+        assert elapsed >= 0.4
+        assert policy.stats()['retry_after_honoured'] == 1
+
+    def test_excessive_retry_after_gives_up(self):
+        with FakeOpenAIServer(script=[(429, {}, {'Retry-After': '120'})]) as server:
+            policy = make_policy(max_retry_after=5)
+            response = policy.call(send_to(server))
+
+        assert response.status_code == 429
+        assert len(server.requests) == 1
+
+    def test_dropped_connection_is_retried(self):
+        with FakeOpenAIServer(script=[(DROP, None, None)]) as server:
+            policy = make_policy()
+            response = policy.call(send_to(server))
+
+        assert response.status_code == 200
+        assert len(server.requests) == 2
+
+    def test_backoff_grows_exponentially_with_full_jitter(self):
+        policy = make_policy(base_delay=1.0, max_delay=3.0, max_attempts=10, rand=lambda: 1.0)
+        delays = [policy._after_failure(attempt, None, None) for attempt in range(1, 5)]
+        assert delays == [1.0, 2.0, 3.0, 3.0]
+
+        policy.rand = lambda: 0.25
+        assert policy._after_failure(2, None, None) == 0.5
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('2') == 2.0
+        assert parse_retry_after('') is None
+        assert parse_retry_after('soon') is None
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+class TestDeadline:
+    def test_no_retry_that_cannot_finish_in_time(self):
+        script = [(500, {}, {}, 0.3)] * 5
+        with FakeOpenAIServer(script=script) as server:
+            policy = make_policy(min_attempt_seconds=0.5)
+            started = time.monotonic()
+            response = policy.call(send_to(server), deadline_after(1.0))
+            elapsed = time.monotonic() - started
+
+        assert response.status_code == 500
+        assert elapsed < 1.0
+        assert len(server.requests) < 3
+        assert policy.stats()['deadline_exceeded'] == 1
+
+    def test_read_timeout_is_clipped_to_deadline(self):
+        import requests
+
+        with FakeOpenAIServer(script=[(200, {}, {}, 3.0)]) as server:
+            policy = make_policy(max_attempts=1)
+            started = time.monotonic()
+            with pytest.raises(requests.Timeout):
+                policy.call(send_to(server, read_timeout=30), deadline_after(0.5))
+            assert time.monotonic() - started < 1.5
+
+    def test_expired_deadline_fails_before_sending(self):
+        with FakeOpenAIServer() as server:
+            policy = make_policy()
+            with pytest.raises(DeadlineExceededError):
+                policy.call(send_to(server), deadline_after(0.05))
+
+        assert server.requests == []
+
+
+class TestCircuitBreaker:
+    def test_opens_when_failure_rate_crosses_threshold(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, clock=FakeClock())
+        for ok in (True, False, True, False):
+            breaker.record(ok)
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        assert breaker.stats()['short_circuited'] == 1
+
+    def test_needs_min_requests(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, clock=FakeClock())
+        for _ in range(3):
+            breaker.record(False)
+        assert breaker.state == CLOSED
+
+    def test_old_failures_leave_the_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window_seconds=10, clock=clock)
+        for _ in range(3):
+            breaker.record(False)
+        clock.now += 11
+        breaker.record(False)
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_closes_or_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, open_seconds=30, clock=clock)
+        breaker.record(False)
+        breaker.record(False)
+        assert breaker.state == OPEN
+
+        clock.now += 30
+        assert breaker.state == HALF_OPEN
+        breaker.allow()
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()  # only one probe at a time
+        breaker.record(False)
+        assert breaker.state == OPEN
+        assert breaker.stats()['opened'] == 2
+
+        clock.now += 30
+        breaker.allow()
+        breaker.record(True)
+        assert breaker.state == CLOSED
+
+    def test_open_circuit_fails_fast_without_calling_upstream(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=3)
+        with FakeOpenAIServer(script=[(503, {}, {})] * 3) as server:
+            policy = make_policy(breaker=breaker)
+            assert policy.call(send_to(server)).status_code == 503
+
+            started = time.monotonic()
+            with pytest.raises(CircuitOpenError):
+                policy.call(send_to(server))
+            assert time.monotonic() - started < 0.1
+
+        assert len(server.requests) == 3
+        assert policy.stats()['breaker']['state'] == OPEN
+
+
+class TestClassifierIntegration:
+    def test_open_circuit_becomes_retryable_error(self, tmp_path):
+        from PIL import Image
+        import mobile_lure_classifier
+
+        breaker = CircuitBreaker(failure_rate=0.5, min_requests=1)
+        breaker.record(False)
+        classifier = mobile_lure_classifier.MobileLureClassifier(
+            openai_api_key='test-key', result_cache=False, resilience=make_policy(breaker=breaker),
+        )
+        path = tmp_path / 'lure.jpg'
+        Image.new('RGB', (120, 80), (90, 40, 200)).save(path, 'JPEG')
+
+        result = classifier.analyze_lure(str(path))
+
+        assert result['error'] == 'Vision API temporarily unavailable'
+        assert result['retryable'] is True
+        assert result['retry_after'] >= 1
+
+    def test_upload_returns_503_for_retryable_errors(self, backend_app, api_client, jpeg_bytes, monkeypatch):
+        import io
+        import app as app_module
+
+        deadlines = []
+
+        def unavailable(path, deadline=None, image_bytes=None, quality_checked=False, progress=None):
+            deadlines.append(deadline)
+            return {'error': 'Vision API temporarily unavailable', 'retryable': True, 'retry_after': 12}
+
+        monkeypatch.setattr(app_module.mobile_classifier, 'analyze_lure', unavailable)
+        started = time.monotonic()
+        response = api_client.post(
+            '/upload', data={'file': (io.BytesIO(jpeg_bytes()), 'lure.jpg')},
+            headers={'X-User-ID': 'user-1', 'X-Request-Timeout': '8'}, content_type='multipart/form-data',
+        )
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '12'
+        assert started + 7 < deadlines[0] <= time.monotonic() + 8
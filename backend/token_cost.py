@@ -0,0 +1,176 @@
+"""
+Token and cost model for vision API requests.
+
+Image input is billed by geometry, not bytes. A low-detail image costs a
+fixed base token count. For a high-detail image, OpenAI fits it inside
+2048x2048, shrinks it so the short side is at most 768 px, then bills
+base + per-tile tokens for every 512 px tile it covers. So the cost of a
+scan can be computed from the image header alone, and the image we send
+can be sized to the smallest tile count before we ever encode it.
+
+Per-model token and price tables live in config.MODEL_PRICING. Text prompt
+tokens start as a length-based estimate and are replaced by the exact
+figure derived from the first API response's usage for each model.
+"""
+
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+import config
+
+TILE_SIZE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+# Role/message framing the chat format adds around the prompt
+MESSAGE_OVERHEAD_TOKENS = 7
+
+
+def fit_within(width: int, height: int, max_dimension: int) -> Tuple[int, int]:
+    """Scale (width, height) down so the longest side is at most max_dimension"""
+    longest = max(width, height)
+    if longest <= max_dimension:
+        return width, height
+    scale = max_dimension / longest
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def high_detail_size(width: int, height: int) -> Tuple[int, int]:
+    """The size OpenAI actually bills a high-detail image at"""
+    width, height = fit_within(width, height, HIGH_DETAIL_MAX_SIDE)
+    shortest = min(width, height)
+    if shortest > HIGH_DETAIL_SHORT_SIDE:
+        scale = HIGH_DETAIL_SHORT_SIDE / shortest
+        width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    return width, height
+
+
+def tile_count(width: int, height: int) -> int:
+    """512 px tiles covering a high-detail image of this (billed) size"""
+    return math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+
+def image_tokens(width: int, height: int, detail: str, pricing: Dict) -> int:
+    """Input tokens for one image of the given original size"""
+    if detail == "low":
+        return pricing["image_base_tokens"]
+    billed = high_detail_size(width, height)
+    return pricing["image_base_tokens"] + pricing["image_tile_tokens"] * tile_count(*billed)
+
+
+def optimal_dimensions(width: int, height: int, max_dimension: int, detail: str = None,
+                       tolerance: float = None) -> Tuple[int, int]:
+    """
+    Dimensions to send an image at: no larger than max_dimension, no larger
+    than OpenAI will bill it at, and, for high detail, shrunk by up to
+    tolerance (a fraction) when that drops a row or column of tiles.
+    """
+    if tolerance is None:
+        tolerance = config.TILE_SNAP_TOLERANCE
+
+    width, height = fit_within(width, height, max_dimension)
+    if detail == "low":
+        return width, height
+
+    width, height = high_detail_size(width, height)
+    best_scale, best_tiles = 1.0, tile_count(width, height)
+    for side in (width, height):
+        multiple = (side // TILE_SIZE) * TILE_SIZE
+        if multiple == 0 or multiple == side:
+            continue
+        scale = multiple / side
+        if scale < 1 - tolerance:
+            continue
+        tiles = tile_count(*_scaled(width, height, scale))
+        if tiles < best_tiles or (tiles == best_tiles and scale > best_scale):
+            best_scale, best_tiles = scale, tiles
+    return _scaled(width, height, best_scale)
+
+
+def _scaled(width: int, height: int, scale: float) -> Tuple[int, int]:
+    # The epsilon keeps 512 * k / side * side from landing just under 512 * k
+    return max(1, int(width * scale + 1e-9)), max(1, int(height * scale + 1e-9))
+
+
+class TokenCostModel:
+    def __init__(self, pricing: Dict[str, Dict], prompt_text: str):
+        """
+        pricing: model name (or prefix) -> input_per_million, output_per_million,
+                 image_base_tokens, image_tile_tokens
+        prompt_text: the text sent alongside every image
+        """
+        self.pricing = pricing
+        self.estimated_prompt_tokens = math.ceil(len(prompt_text) / 4) + MESSAGE_OVERHEAD_TOKENS
+        self._lock = threading.Lock()
+        self._observed_prompt_tokens = {}
+
+    @classmethod
+    def from_config(cls, prompt_text: str) -> "TokenCostModel":
+        return cls(config.MODEL_PRICING, prompt_text)
+
+    def pricing_for(self, model: str = None) -> Dict:
+        """Price table for model, matching dated snapshots by longest prefix"""
+        model = model or config.CHATGPT_MODEL
+        if model in self.pricing:
+            return self.pricing[model]
+        prefixes = [name for name in self.pricing if model.startswith(name)]
+        if not prefixes:
+            raise KeyError(f"No pricing configured for model {model}")
+        return self.pricing[max(prefixes, key=len)]
+
+    def prompt_tokens(self, model: str = None) -> Tuple[int, bool]:
+        """(text prompt tokens, whether the figure came from real API usage)"""
+        with self._lock:
+            observed = self._observed_prompt_tokens.get(model or config.CHATGPT_MODEL)
+        if observed is not None:
+            return observed, True
+        return self.estimated_prompt_tokens, False
+
+    def observe(self, model: str, detail: Optional[str], sent_size: Tuple[int, int], usage: Dict):
+        """Learn the exact text prompt tokens from an API response's usage block"""
+        if not usage or "prompt_tokens" not in usage:
+            return
+        try:
+            pricing = self.pricing_for(model)
+        except KeyError:
+            return
+        # Cached-prompt discounts don't change the count, only the price
+        text_tokens = usage["prompt_tokens"] - image_tokens(*sent_size, detail, pricing)
+        if text_tokens > 0:
+            with self._lock:
+                self._observed_prompt_tokens[model or config.CHATGPT_MODEL] = text_tokens
+
+    def estimate(self, width: int, height: int, detail: str = None, model: str = None,
+                 max_dimension: int = None, max_output_tokens: int = None) -> Dict:
+        """Token and dollar cost of classifying an image of this original size"""
+        model = model or config.CHATGPT_MODEL
+        pricing = self.pricing_for(model)
+        detail = detail or "high"
+        if max_dimension is None:
+            max_dimension = config.LOW_DETAIL_MAX_DIMENSION if detail == "low" else config.MAX_IMAGE_DIMENSION
+        if max_output_tokens is None:
+            max_output_tokens = config.MAX_TOKENS
+
+        sent = optimal_dimensions(width, height, max_dimension, detail)
+        tiles = 0 if detail == "low" else tile_count(*high_detail_size(*sent))
+        image = image_tokens(*sent, detail, pricing)
+        prompt, calibrated = self.prompt_tokens(model)
+        input_tokens = image + prompt
+
+        input_cost = input_tokens * pricing["input_per_million"] / 1_000_000
+        max_output_cost = max_output_tokens * pricing["output_per_million"] / 1_000_000
+        return {
+            "model": model,
+            "detail": detail,
+            "original_dimensions": [width, height],
+            "sent_dimensions": list(sent),
+            "tiles": tiles,
+            "image_tokens": image,
+            "prompt_tokens": prompt,
+            "prompt_tokens_exact": calibrated,
+            "input_tokens": input_tokens,
+            "max_output_tokens": max_output_tokens,
+            "input_cost_usd": round(input_cost, 8),
+            "max_output_cost_usd": round(max_output_cost, 8),
+            "max_total_cost_usd": round(input_cost + max_output_cost, 8),
+        }
@@ -0,0 +1,166 @@
+"""
+Resized renditions of local uploads, for /uploads/<filename>?w=&fmt=.
+
+The first request for a width/format of an upload renders it and writes it
+to a directory on local disk; later requests (from any worker on the host)
+are served from that file. Widths snap up to one of WIDTHS so clients can't
+fill the cache with one rendition per pixel.
+
+The cache is bounded by size with least-recently-used eviction: a hit
+touches its file's mtime, and when a write takes the directory over
+max_bytes the oldest files are removed until it is back under
+EVICT_TO of the bound. Keys include the source's mtime and size, so a
+replaced upload never serves an old rendition.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+import config
+
+WIDTHS = (64, 128, 256, 512, 1024, 2048)
+FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "jpg": ("JPEG", "image/jpeg"),
+           "webp": ("WEBP", "image/webp"), "png": ("PNG", "image/png")}
+EVICT_TO = 0.9
+
+
+def snap_width(width: int) -> int:
+    """Smallest cached width at least width (the largest for anything bigger)"""
+    return next((allowed for allowed in WIDTHS if allowed >= width), WIDTHS[-1])
+
+
+class UploadImageCache:
+    def __init__(self, directory: str, max_bytes: int, quality: int = 82):
+        """
+        directory: where renditions are kept (created on first write)
+        max_bytes: size bound for the directory
+        quality: JPEG/WebP encode quality
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._rendering: Dict[str, threading.Lock] = {}
+        self._total: Optional[int] = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_config(cls) -> "UploadImageCache":
+        """Build a cache from config values"""
+        return cls(config.UPLOAD_CACHE_DIR, config.UPLOAD_CACHE_MAX_MB * 1024 * 1024, config.IMAGE_RENDITION_QUALITY)
+
+    def get(self, source: str, width: Optional[int], fmt: str) -> Tuple[str, str, str]:
+        """
+        (path, mimetype, etag) of source resized to width (None: original
+        width) in fmt, rendering it on a miss
+        """
+        stat = os.stat(source)
+        pil_format, mimetype = FORMATS[fmt]
+        key = hashlib.sha256(
+            f"{os.path.abspath(source)}:{stat.st_mtime_ns}:{stat.st_size}:{width}:{pil_format}".encode()
+        ).hexdigest()[:32]
+        path = os.path.join(self.directory, f"{key}.{pil_format.lower()}")
+
+        if self._touch(path):
+            return path, mimetype, key
+        # One render per key at a time; the others wait and then find the file
+        with self._key_lock(key):
+            try:
+                if self._touch(path):
+                    return path, mimetype, key
+                self._write(path, self._render(source, width, pil_format))
+                with self._lock:
+                    self._stats["misses"] += 1
+            finally:
+                with self._lock:
+                    self._rendering.pop(key, None)
+        return path, mimetype, key
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)  # mtime is the LRU clock
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._stats["hits"] += 1
+        return True
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._rendering.setdefault(key, threading.Lock())
+
+    def _render(self, source: str, width: Optional[int], pil_format: str) -> bytes:
+        with Image.open(source) as img:
+            if width and img.format == 'JPEG':
+                # Square request: the upright width may be either stored side
+                img.draft('RGB', (width, width))
+            img = ImageOps.exif_transpose(img)
+            if width and width < img.size[0]:
+                img = img.resize((width, max(1, round(img.size[1] * width / img.size[0]))),
+                                 Image.Resampling.LANCZOS)
+            keep_alpha = pil_format != 'JPEG' and img.mode in ('RGBA', 'LA', 'P')
+            img = img.convert('RGBA' if keep_alpha else 'RGB')
+            buffer = io.BytesIO()
+            options = {} if pil_format == 'PNG' else {"quality": self.quality}
+            img.save(buffer, pil_format, optimize=True, **options)
+        return buffer.getvalue()
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees half a file
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._directory_bytes()
+            else:
+                self._total += len(data)
+            over = self._total > self.max_bytes
+        if over:
+            self._evict(keep=path)
+
+    def _directory_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def _evict(self, keep: str):
+        """
+        Remove least recently used renditions until the directory is under
+        EVICT_TO of the bound, sparing keep (the rendition about to be served)
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.path == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._total = total
+            self._stats["evictions"] += evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, bytes=self._total, max_bytes=self.max_bytes)
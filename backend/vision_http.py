@@ -0,0 +1,179 @@
+"""
+Pooled, keep-alive HTTP client for the OpenAI vision API.
+
+One client per MobileLureClassifier (so one per gunicorn worker). The
+underlying requests.Session keeps TLS connections to the API open between
+scans, so only the first scan on a worker pays the TCP + TLS handshake.
+Every request carries a connect and a read timeout, so a stuck upstream
+can no longer pin a worker indefinitely.
+
+AsyncVisionHTTPClient is the httpx-based equivalent used by
+analyze_lure_async, with the same timeouts and pool size.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+
+class _TrackingAdapter(HTTPAdapter):
+    """HTTPAdapter that remembers its urllib3 pools so reuse can be measured"""
+
+    def __init__(self, *args, **kwargs):
+        self.pools = weakref.WeakSet()
+        self._pools_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _track(self, pool):
+        with self._pools_lock:
+            self.pools.add(pool)
+        return pool
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        return self._track(super().get_connection_with_tls_context(*args, **kwargs))
+
+    def get_connection(self, *args, **kwargs):
+        # requests < 2.32
+        return self._track(super().get_connection(*args, **kwargs))
+
+
+class VisionHTTPClient:
+    def __init__(self, base_url: str, connect_timeout: float, read_timeout: float,
+                 pool_size: int = 10, verify=True):
+        """
+        base_url: API root, e.g. https://api.openai.com/v1
+        connect_timeout / read_timeout: seconds, applied to every request
+        pool_size: max keep-alive connections held open per host
+        verify: TLS verification (True, False or a CA bundle path)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+
+        self._adapter = _TrackingAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "timeouts": 0, "connection_errors": 0}
+
+    @classmethod
+    def from_config(cls) -> "VisionHTTPClient":
+        """Build a client from config values"""
+        return cls(
+            base_url=config.OPENAI_API_BASE,
+            connect_timeout=config.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=config.OPENAI_READ_TIMEOUT_SECONDS,
+            pool_size=config.OPENAI_POOL_SIZE,
+        )
+
+    def post(self, path: str, headers: Dict, budget: float = None, **kwargs) -> requests.Response:
+        """
+        POST to base_url + path over a pooled connection.
+        budget: seconds left before the caller's deadline; clips both timeouts.
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+        timeout = self.timeout
+        if budget is not None:
+            timeout = tuple(min(limit, budget) for limit in self.timeout)
+        try:
+            # verify is passed per request: a session-level value loses to REQUESTS_CA_BUNDLE
+            return self.session.post(f"{self.base_url}{path}", headers=headers, timeout=timeout,
+                                     verify=self.verify, **kwargs)
+        except requests.Timeout:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+        except requests.ConnectionError:
+            with self._lock:
+                self._stats["connection_errors"] += 1
+            raise
+
+    def stats(self) -> Dict:
+        """Request counters plus how many requests reused an open connection"""
+        with self._lock:
+            stats = dict(self._stats)
+
+        with self._adapter._pools_lock:
+            pools = list(self._adapter.pools)
+        connections_opened = sum(pool.num_connections for pool in pools)
+        pool_requests = sum(pool.num_requests for pool in pools)
+
+        stats["connections_opened"] = connections_opened
+        stats["connections_reused"] = max(0, pool_requests - connections_opened)
+        stats["reuse_rate"] = round(stats["connections_reused"] / pool_requests, 4) if pool_requests else 0.0
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncVisionHTTPClient:
+    def __init__(self, base_url: str, connect_timeout: float, read_timeout: float,
+                 pool_size: int = 10, verify=True):
+        """Same settings as VisionHTTPClient; the httpx client is created per event loop"""
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.verify = verify
+
+        # httpx connections belong to the loop that opened them
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "timeouts": 0, "connection_errors": 0}
+
+    @classmethod
+    def from_config(cls) -> "AsyncVisionHTTPClient":
+        """Build a client from config values"""
+        return cls(
+            base_url=config.OPENAI_API_BASE,
+            connect_timeout=config.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=config.OPENAI_READ_TIMEOUT_SECONDS,
+            pool_size=config.OPENAI_POOL_SIZE,
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, verify=self.verify)
+            self._clients[loop] = client
+        return client
+
+    async def post(self, path: str, headers: Dict, budget: float = None, **kwargs) -> httpx.Response:
+        """POST to base_url + path over the current loop's pooled client; budget as in VisionHTTPClient.post"""
+        with self._lock:
+            self._stats["requests"] += 1
+        if budget is not None:
+            kwargs["timeout"] = httpx.Timeout(min(self.timeout.read, budget), connect=min(self.timeout.connect, budget))
+        try:
+            return await self._client().post(f"{self.base_url}{path}", headers=headers, **kwargs)
+        except httpx.TimeoutException:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+        except httpx.TransportError:
+            with self._lock:
+                self._stats["connection_errors"] += 1
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["event_loops"] = len(self._clients)
+        return stats
+
+    async def aclose(self):
+        """Close the client belonging to the running loop"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
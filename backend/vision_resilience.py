@@ -0,0 +1,313 @@
+"""
+Retry, deadline and circuit breaker policy for the vision API call.
+
+- 429 and 5xx responses, timeouts and connection errors are retried with
+  full-jitter exponential backoff; a Retry-After header from the API wins
+  over the computed delay (we give up if it asks for more than
+  max_retry_after).
+- Every call can carry a deadline (a time.monotonic() timestamp). No
+  attempt or backoff sleep is started that can't finish before it, and each
+  attempt's read timeout is clipped to the time remaining.
+- A per-process circuit breaker opens when the failure rate over a sliding
+  window crosses a threshold. While it is open, calls fail immediately
+  instead of queueing behind a struggling upstream. After open_seconds one
+  probe request is let through, and its outcome closes or reopens it.
+
+Shared by the sync (requests) and async (httpx) classification paths.
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import httpx
+import requests
+
+import config
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the request deadline leaves no time for another attempt"""
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """Absolute deadline seconds from now, or None for no deadline"""
+    if seconds is None:
+        return None
+    return time.monotonic() + seconds
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) in seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    def __init__(self, failure_rate: float = 0.5, min_requests: int = 10,
+                 window_seconds: float = 60, open_seconds: float = 30, clock=time.monotonic):
+        """
+        failure_rate: fraction of failed calls in the window that opens the circuit
+        min_requests: calls needed in the window before the rate is trusted
+        window_seconds: sliding window the failure rate is measured over
+        open_seconds: how long the circuit stays open before a probe is allowed
+        """
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._window = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "short_circuited": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._stats["short_circuited"] += 1
+            retry_after = max(0.0, self._opened_at + self.open_seconds - self.clock())
+            raise CircuitOpenError(retry_after)
+
+    def record(self, success: bool):
+        """Report the outcome of a call that allow() let through"""
+        with self._lock:
+            now = self.clock()
+            if self._current_state() == HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self._state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._window.append((now, success))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._window if not ok)
+            if (self._state == CLOSED and len(self._window) >= self.min_requests
+                    and failures / len(self._window) >= self.failure_rate):
+                self._open(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._trim(self.clock())
+            calls = len(self._window)
+            failures = sum(1 for _, ok in self._window if not ok)
+            stats = dict(self._stats)
+            stats["state"] = self._current_state()
+        stats["window_calls"] = calls
+        stats["window_failure_rate"] = round(failures / calls, 4) if calls else 0.0
+        return stats
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+        return self._state
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._window.clear()
+        self._stats["opened"] += 1
+        print(f"[WARNING] Vision API circuit breaker opened for {self.open_seconds:.0f}s")
+
+    def _trim(self, now: float):
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+
+class VisionResilience:
+    def __init__(self, breaker: CircuitBreaker, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, max_retry_after: float = 30.0, min_attempt_seconds: float = 1.0,
+                 rand=random.random):
+        """
+        max_attempts: total tries per call, including the first
+        base_delay / max_delay: backoff before retry n is uniform in [0, min(max_delay, base_delay * 2^(n-1))]
+        max_retry_after: longest Retry-After we are prepared to wait
+        min_attempt_seconds: don't start an attempt with less than this left before the deadline
+        """
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.min_attempt_seconds = min_attempt_seconds
+        self.rand = rand
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "attempts": 0, "retries": 0, "retry_after_honoured": 0,
+            "gave_up": 0, "deadline_exceeded": 0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "VisionResilience":
+        """Build the policy and breaker from config values"""
+        breaker = CircuitBreaker(
+            failure_rate=config.VISION_BREAKER_FAILURE_RATE,
+            min_requests=config.VISION_BREAKER_MIN_REQUESTS,
+            window_seconds=config.VISION_BREAKER_WINDOW_SECONDS,
+            open_seconds=config.VISION_BREAKER_OPEN_SECONDS,
+        )
+        return cls(
+            breaker,
+            max_attempts=config.VISION_RETRY_MAX_ATTEMPTS,
+            base_delay=config.VISION_RETRY_BASE_SECONDS,
+            max_delay=config.VISION_RETRY_MAX_SECONDS,
+            max_retry_after=config.VISION_RETRY_AFTER_MAX_SECONDS,
+        )
+
+    def call(self, send: Callable[[Optional[float]], object], deadline: Optional[float] = None):
+        """
+        Run send(budget) with retries; budget is the seconds left before the
+        deadline (None without one). Returns the last response; re-raises the
+        last transient error once retries are exhausted.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            budget = self._start_attempt(deadline)
+            try:
+                response = send(budget)
+            except TRANSIENT_ERRORS as e:
+                delay = self._after_failure(attempt, None, deadline)
+                if delay is None:
+                    raise
+                print(f"[WARNING] Vision API attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            except Exception:
+                # Still report the outcome so a half-open probe slot is never leaked
+                self.breaker.record(False)
+                raise
+            else:
+                delay = self._after_response(attempt, response, deadline)
+                if delay is None:
+                    return response
+                print(f"[WARNING] Vision API attempt {attempt} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    async def call_async(self, send, deadline: Optional[float] = None):
+        """call() for a coroutine function send(budget)"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            budget = self._start_attempt(deadline)
+            try:
+                response = await send(budget)
+            except TRANSIENT_ERRORS as e:
+                delay = self._after_failure(attempt, None, deadline)
+                if delay is None:
+                    raise
+                print(f"[WARNING] Vision API attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            except Exception:
+                # Still report the outcome so a half-open probe slot is never leaked
+                self.breaker.record(False)
+                raise
+            else:
+                delay = self._after_response(attempt, response, deadline)
+                if delay is None:
+                    return response
+                print(f"[WARNING] Vision API attempt {attempt} returned {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _start_attempt(self, deadline: Optional[float]) -> Optional[float]:
+        """Check the deadline and the breaker; returns the attempt's time budget"""
+        budget = None
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            if budget < self.min_attempt_seconds:
+                self._count("deadline_exceeded")
+                raise DeadlineExceededError()
+        self.breaker.allow()
+        self._count("attempts")
+        return budget
+
+    def _after_response(self, attempt: int, response, deadline: Optional[float]) -> Optional[float]:
+        """Record a response; returns the delay before retrying, or None to return it"""
+        if response.status_code not in RETRYABLE_STATUSES:
+            # 4xx other than 429 is a problem with our request, not upstream health
+            self.breaker.record(True)
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        return self._after_failure(attempt, retry_after, deadline)
+
+    def _after_failure(self, attempt: int, retry_after: Optional[float],
+                       deadline: Optional[float]) -> Optional[float]:
+        """Record a failed attempt; returns the delay before retrying, or None to give up"""
+        self.breaker.record(False)
+        if attempt >= self.max_attempts:
+            self._count("gave_up")
+            return None
+
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                self._count("gave_up")
+                return None
+            delay = retry_after
+        else:
+            delay = self.rand() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+        if deadline is not None and time.monotonic() + delay + self.min_attempt_seconds > deadline:
+            self._count("deadline_exceeded")
+            self._count("gave_up")
+            return None
+
+        with self._lock:
+            self._stats["retries"] += 1
+            if retry_after is not None:
+                self._stats["retry_after_honoured"] += 1
+        return delay
@@ -0,0 +1,16 @@
+-- Add display rendition URLs to lure_analyses
+-- Scans now store a 256px thumbnail and a 1024px image instead of the original
+-- upload; image_url keeps pointing at the largest stored image for older clients.
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE public.lure_analyses
+ADD COLUMN IF NOT EXISTS image_thumb_url TEXT;
+
+ALTER TABLE public.lure_analyses
+ADD COLUMN IF NOT EXISTS image_medium_url TEXT;
+
+-- Success message
+DO $$
+BEGIN
+  RAISE NOTICE '✓ Added image_thumb_url and image_medium_url columns to lure_analyses table!';
+END $$;
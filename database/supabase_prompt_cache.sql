@@ -0,0 +1,14 @@
+-- Add cached_tokens to lure_analyses
+-- The vision request now starts with a fixed system prompt that the API can
+-- serve from its prompt cache; cached_tokens records how many of a scan's
+-- prompt tokens were cached (billed at the discounted rate).
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE public.lure_analyses
+ADD COLUMN IF NOT EXISTS cached_tokens INTEGER;
+
+-- Success message
+DO $$
+BEGIN
+  RAISE NOTICE '✓ Added cached_tokens column to lure_analyses table!';
+END $$;
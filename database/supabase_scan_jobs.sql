@@ -0,0 +1,53 @@
+-- Scan job queue for the classifier worker fleet
+-- The web tier inserts queued jobs; classifier_worker.py processes claim them
+-- with FOR UPDATE SKIP LOCKED so any number of workers can share the table.
+-- Run this in Supabase SQL Editor
+
+-- ============================================================================
+-- SCAN JOBS TABLE
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS public.scan_jobs (
+  id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id UUID NOT NULL,
+
+  -- queued -> running -> succeeded / failed
+  status TEXT NOT NULL DEFAULT 'queued',
+  stage TEXT NOT NULL DEFAULT 'queued',
+
+  -- Input (image bytes are cleared once the job finishes)
+  image_name TEXT,
+  image_data BYTEA,
+  meta JSONB NOT NULL DEFAULT '{}'::jsonb,
+
+  -- Output
+  result JSONB,
+  error TEXT,
+
+  -- Claim bookkeeping
+  attempts INTEGER NOT NULL DEFAULT 0,
+  locked_by TEXT,
+  locked_at TIMESTAMP WITH TIME ZONE,
+
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Workers only ever look for the oldest queued job
+CREATE INDEX IF NOT EXISTS scan_jobs_queued_idx
+  ON public.scan_jobs(created_at)
+  WHERE status = 'queued';
+
+-- Stale-claim sweep
+CREATE INDEX IF NOT EXISTS scan_jobs_running_idx
+  ON public.scan_jobs(locked_at)
+  WHERE status = 'running';
+
+-- Backend-only table: RLS on with no policies, so only the service role can touch it
+ALTER TABLE public.scan_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Success message
+DO $$
+BEGIN
+  RAISE NOTICE '✓ Scan job queue created!';
+  RAISE NOTICE 'Set SCAN_JOB_BACKEND=postgres and DATABASE_URL, then start classifier_worker.py';
+END $$;
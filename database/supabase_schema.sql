@@ -57,6 +57,8 @@ CREATE TABLE IF NOT EXISTS public.lure_analyses (
   
   -- Image information
   image_url TEXT,
+  image_thumb_url TEXT,   -- 256px list thumbnail
+  image_medium_url TEXT,  -- 1024px detail image
   image_name TEXT,
   image_path TEXT,  -- For backward compatibility with local files
   
@@ -73,6 +75,7 @@ CREATE TABLE IF NOT EXISTS public.lure_analyses (
   -- Cost tracking
   api_cost_usd DECIMAL(10, 6),
   tokens_used INTEGER,
+  cached_tokens INTEGER,  -- prompt tokens served from the API's prompt cache
   
   -- Timestamps
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
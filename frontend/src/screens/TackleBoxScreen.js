@@ -288,8 +288,8 @@ export default function TackleBoxScreen({ navigation }) {
   }, [searchQuery, selectedFilters, lures]);
 
   const renderLureItem = ({ item }) => {
-    // Get lure image URL (supports both local and Supabase formats)
-    const imageUri = item.image_url || item.imageUri || item.image_path;
+    // Get lure image URL (supports both local and Supabase formats); lists only need the thumbnail
+    const imageUri = item.image_thumb_url || item.image_url || item.imageUri || item.image_path;
     
     if (viewMode === 'grid') {
       return (